@@ -0,0 +1,167 @@
+"""
+Benchmark: loading the yearly price history inside Analysis().
+
+Compares the old pattern (every coin iteration re-reads every coin's full
+history from one-collection-per-coin databases) against the current one (one
+indexed query on the time-series store for the portfolio coins, then a single
+groupby). Reports wall time and the BSON bytes returned by Mongo.
+
+Runs against mongomock by default, or against a local mongod when MONGO_URI is set:
+
+    python -m Benchmarks.Analysis_History_Load
+    MONGO_URI=mongodb://localhost:27017 python -m Benchmarks.Analysis_History_Load --sizes 5 50 500
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+import bson
+import pandas as pd
+
+from Functions.TimeSeriesStore import BUCKET_WINDOWS, TIMESTAMP_FORMAT, ensure_indexes, read_points, write_points
+
+DATASET = "Yearly_MarketChartData"
+DAYS = 365
+
+
+def get_client():
+    uri = os.getenv("MONGO_URI")
+    if uri:
+        from pymongo import MongoClient
+        return MongoClient(uri)
+
+    import mongomock
+    return mongomock.MongoClient()
+
+
+# Seed N coins x 365 daily prices in both layouts
+def seed(client, coin_ids):
+    client.drop_database("Bench_Legacy_Yearly")
+    client.drop_database("Bench_MarketData")
+
+    legacy_db = client["Bench_Legacy_Yearly"]
+    store = client["Bench_MarketData"][DATASET]
+    ensure_indexes(store)
+
+    start = datetime(2024, 1, 1, 5, 30)
+    for n, coin_id in enumerate(coin_ids):
+        records = [
+            {"timestamp": (start + timedelta(days=day)).strftime(TIMESTAMP_FORMAT), "price": 100.0 + n + day * 0.01}
+            for day in range(DAYS)
+        ]
+        legacy_db[coin_id].insert_many([{**record, "coin_id": coin_id} for record in records])
+        write_points(store, coin_id, records, BUCKET_WINDOWS[DATASET])
+
+    return legacy_db, store
+
+
+# Old Yearly_MarketChartData_Data(): list + full scan of every per-coin collection
+def legacy_full_read(legacy_db, counter):
+    all_dataframes = []
+    for collection_name in legacy_db.list_collection_names():
+        data = list(legacy_db[collection_name].find())
+        counter[0] += sum(len(bson.encode(doc)) for doc in data)
+        if not data:
+            continue
+        df = pd.DataFrame(data).drop(columns=["_id"])
+        df.columns = [col[0].upper() + col[1:] for col in df.columns]
+        all_dataframes.append(df)
+    return pd.concat(all_dataframes, ignore_index=True)
+
+
+# Old Analysis() loop: one full read per coin, then a boolean filter
+def legacy_analysis(legacy_db, coin_ids):
+    counter = [0]
+    series = {}
+    for coin_id in coin_ids:
+        full = legacy_full_read(legacy_db, counter)
+        coin_data = full[full["Coin_id"] == coin_id].copy()
+        coin_data["Timestamp"] = pd.to_datetime(coin_data["Timestamp"])
+        series[coin_id] = coin_data.set_index("Timestamp")[["Price"]].sort_index()
+    return series, counter[0]
+
+
+# Current Analysis(): one indexed query for all coins, then a single groupby
+def store_analysis(store, coin_ids):
+    counter = [0]
+    rows = list(read_points(_CountingCollection(store, counter), coin_ids=coin_ids, fields=["price"], window=BUCKET_WINDOWS[DATASET]))
+
+    full = pd.DataFrame(rows)
+    full["timestamp"] = pd.to_datetime(full["timestamp"])
+    series = {
+        coin_id: coin_data.set_index("timestamp")[["price"]].sort_index()
+        for coin_id, coin_data in full.groupby("coin_id", sort=False)
+    }
+    return series, counter[0]
+
+
+# Counts the BSON bytes of every document the server returns
+class _CountingCollection:
+    def __init__(self, collection, counter):
+        self.collection = collection
+        self.counter = counter
+
+    def find(self, *args, **kwargs):
+        return _CountingCursor(self.collection.find(*args, **kwargs), self.counter)
+
+
+class _CountingCursor:
+    def __init__(self, cursor, counter):
+        self.cursor = cursor
+        self.counter = counter
+
+    def sort(self, *args, **kwargs):
+        self.cursor = self.cursor.sort(*args, **kwargs)
+        return self
+
+    def batch_size(self, size):
+        self.cursor = self.cursor.batch_size(size)
+        return self
+
+    def __iter__(self):
+        for doc in self.cursor:
+            self.counter[0] += len(bson.encode(doc))
+            yield doc
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 50, 100, 250, 500])
+    parser.add_argument("--legacy-max", type=int, default=100,
+                        help="largest portfolio the O(N^2) legacy loop is actually run for; "
+                             "larger sizes are extrapolated from one full read (marked with ~)")
+    args = parser.parse_args()
+
+    client = get_client()
+    print(f"{'coins':>6} | {'legacy time':>12} | {'legacy MB read':>14} | {'store time':>10} | {'store MB read':>13}")
+    print("-" * 68)
+
+    for size in args.sizes:
+        coin_ids = [f"coin-{i:04d}" for i in range(size)]
+        legacy_db, store = seed(client, coin_ids)
+
+        if size <= args.legacy_max:
+            legacy_time, (_, legacy_bytes) = timed(legacy_analysis, legacy_db, coin_ids)
+            mark = " "
+        else:
+            one_pass_time, (_, one_pass_bytes) = timed(legacy_analysis, legacy_db, coin_ids[:1])
+            legacy_time, legacy_bytes = one_pass_time * size, one_pass_bytes * size
+            mark = "~"
+
+        store_time, (_, store_bytes) = timed(store_analysis, store, coin_ids)
+
+        print(
+            f"{size:>6} | {mark}{legacy_time:>10.2f}s | {mark}{legacy_bytes / 1e6:>12.1f} | "
+            f"{store_time:>9.2f}s | {store_bytes / 1e6:>13.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
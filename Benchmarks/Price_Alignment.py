@@ -0,0 +1,80 @@
+"""
+Benchmark: matching news / Reddit posts to the nearest price points.
+
+Compares the original per-article lookup (a full argsort of the price series
+for the publish time and again for +6h) against PriceAlignment.align_prices
+(one sort, then np.searchsorted for the whole batch), and checks that both
+pick the same prices.
+
+The per-article loop is far too slow at full size, so it is timed on a sample
+of articles and extrapolated to the full batch:
+
+    python -m Benchmarks.Price_Alignment
+    python -m Benchmarks.Price_Alignment --articles 10000 --prices 100000 --legacy-sample 200
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from Functions.PriceAlignment import align_prices
+
+HORIZON_HOURS = 6
+
+
+def make_data(n_articles, n_prices, seed=7):
+    rng = np.random.default_rng(seed)
+    start = 1_700_000_000
+    # Roughly one price every 5 minutes, slightly irregular like CoinGecko ranges
+    price_ts = np.sort(start + rng.integers(0, n_prices * 300, n_prices))
+    prices = 100 + np.cumsum(rng.normal(0, 0.5, n_prices))
+    article_ts = start + rng.integers(0, n_prices * 300, n_articles)
+    return pd.DataFrame({"timestamp": price_ts, "price": prices}), article_ts
+
+
+# Original lookup from News.get_all_news_with_analysis / Analysis.prepare_reddit_post_df
+def legacy(df, article_ts):
+    results = []
+    for t_news in article_ts:
+        t_later = t_news + 3600 * HORIZON_HOURS
+        price_now = df.iloc[(df["timestamp"] - t_news).abs().argsort()[:1]]["price"].values[0]
+        price_later = df.iloc[(df["timestamp"] - t_later).abs().argsort()[:1]]["price"].values[0]
+        results.append((price_now, price_later))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=10000)
+    parser.add_argument("--prices", type=int, default=100000)
+    parser.add_argument("--legacy-sample", type=int, default=200)
+    args = parser.parse_args()
+
+    df, article_ts = make_data(args.articles, args.prices)
+    sample = article_ts[:args.legacy_sample]
+
+    started = time.perf_counter()
+    old = legacy(df, sample)
+    legacy_seconds = (time.perf_counter() - started) * len(article_ts) / len(sample)
+
+    started = time.perf_counter()
+    columns = align_prices(article_ts, df["timestamp"].to_numpy(), df["price"].to_numpy(), horizons=(HORIZON_HOURS,))
+    vectorized_seconds = time.perf_counter() - started
+
+    # Two equally distant points may resolve differently, so a handful of mismatches is possible
+    mismatches = sum(
+        1 for n, (now, later) in enumerate(old)
+        if now != columns["price_at_news"][n] or later != columns[f"price_{HORIZON_HOURS}hr_after"][n]
+    )
+
+    print(f"{args.articles} articles x {args.prices} price points")
+    print(f"{'strategy':>12} | {'time':>10} | {'articles/s':>12}")
+    print("-" * 41)
+    print(f"{'argsort':>12} | {legacy_seconds:>9.2f}s | {args.articles / legacy_seconds:>12.0f}  (extrapolated from {len(sample)})")
+    print(f"{'searchsorted':>12} | {vectorized_seconds:>9.4f}s | {args.articles / vectorized_seconds:>12.0f}")
+    print(f"speedup: {legacy_seconds / vectorized_seconds:.0f}x, mismatches on sample: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
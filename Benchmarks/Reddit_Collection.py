@@ -0,0 +1,152 @@
+"""
+Benchmark: Reddit sentiment collection for all portfolio coins, without network.
+
+Posts are replayed from generated fixtures (REDDIT_FIXTURE_MODE=replay) with a
+simulated latency per search page; the shared Reddit limiter still paces every page.
+Compares:
+
+  sequential   the original flow: one coin at a time, titles scored one by one,
+               one delete + insert into Mongo per coin
+  collected    Reddit.collect_reddit_sentiment: coins fetched concurrently, one
+               sentiment batch, one bulk write for all coins
+
+Writes go to mongomock by default, or to a local mongod when MONGO_URI is set.
+Fixtures recorded from live searches (REDDIT_FIXTURE_MODE=record) can be replayed
+with --fixture-dir instead of the generated ones:
+
+    python -m Benchmarks.Reddit_Collection
+    python -m Benchmarks.Reddit_Collection --coins 20 --latency 0.5 --workers 8
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pymongo import DeleteMany, InsertOne
+
+import Functions.Reddit as Reddit
+import Functions.Sentiment as Sentiment
+from Functions.RateLimit import TokenBucket
+
+WORDS = ["moon", "dump", "bullish", "bearish", "great", "scam", "hodl", "crash", "pump", "love", "fear", "buy", "sell"]
+
+
+def get_client():
+    uri = os.getenv("MONGO_URI")
+    if uri:
+        from pymongo import MongoClient
+        return MongoClient(uri)
+
+    import mongomock
+    return mongomock.MongoClient()
+
+
+def write_fixtures(directory, coins, posts_per_coin, seed=5):
+    rng = random.Random(seed)
+    now = int(time.time())
+    for coin in coins:
+        records = [
+            {
+                "id": f"{coin[:3]}{i}",
+                "title": f"{coin} {' '.join(rng.choice(WORDS) for _ in range(6))}",
+                "score": rng.randint(0, 5000),
+                "num_comments": rng.randint(0, 800),
+                "created_utc": now - rng.randint(0, 30 * 86400),
+                "permalink": f"/r/CryptoCurrency/comments/{coin[:3]}{i}/",
+                "url": f"https://i.redd.it/{coin[:3]}{i}.png",
+                "selftext": "",
+                "author": f"user{rng.randint(1, 999)}",
+                "subreddit": "CryptoCurrency",
+            }
+            for i in range(posts_per_coin)
+        ]
+        with open(Reddit.fixture_path(coin), "w", encoding="utf-8") as f:
+            json.dump(records, f)
+
+
+# Stands in for PriceHistory.price_series: one synthetic price every 5 minutes over the posts' range
+def price_lookup(coin_id, timestamps):
+    start, end = min(timestamps) - 3600, max(timestamps) + 7 * 3600
+    points = np.arange(start, end, 300)
+    return pd.DataFrame({"timestamp": points, "price": 100 + np.sin(points / 86400)})
+
+
+def per_coin_write(collection, df):
+    records = df.replace({np.nan: None}).to_dict(orient="records")
+    collection.delete_many({"coin": records[0]["coin"]})
+    collection.insert_many(records)
+
+
+def bulk_write(collection, df):
+    records = df.replace({np.nan: None}).to_dict(orient="records")
+    coins = sorted({record["coin"] for record in records})
+    collection.bulk_write([DeleteMany({"coin": {"$in": coins}})] + [InsertOne(record) for record in records], ordered=True)
+
+
+# Original flow of Analysis(): get_reddit_sentiment_with_pagination per coin
+def sequential(coins, collection, total_posts):
+    for coin in coins:
+        posts = Reddit.fetch_reddit_posts(coin, total_posts)
+        sentiments = [Sentiment.score_uncached([post.title])[0] for post in posts]
+        metrics, df = Reddit.summarize_reddit_posts(coin, posts, sentiments, price_lookup, coin.lower())
+        if not df.empty:
+            per_coin_write(collection, df)
+
+
+def collected(coins, collection, total_posts):
+    Reddit.collect_reddit_sentiment([(coin, coin.lower()) for coin in coins], price_lookup=price_lookup, write_posts=lambda df: bulk_write(collection, df), total_posts=total_posts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--coins", type=int, default=10)
+    parser.add_argument("--posts", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated seconds per search page")
+    parser.add_argument("--calls-per-minute", type=int, default=600)
+    parser.add_argument("--workers", type=int, default=Reddit.REDDIT_WORKERS)
+    parser.add_argument("--fixture-dir", help="replay recorded fixtures instead of generated ones")
+    args = parser.parse_args()
+
+    Reddit.REDDIT_FIXTURE_MODE = "replay"
+    Reddit.REDDIT_FIXTURE_LATENCY = args.latency
+    Reddit.reddit_pool = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="reddit")
+    Sentiment.SENTIMENT_CACHE_BACKEND = "memory"
+
+    if args.fixture_dir:
+        Reddit.REDDIT_FIXTURE_DIR = args.fixture_dir
+        coins = [name[:-5] for name in sorted(os.listdir(args.fixture_dir)) if name.endswith(".json")]
+    else:
+        Reddit.REDDIT_FIXTURE_DIR = tempfile.mkdtemp(prefix="reddit-fixtures-")
+        coins = [f"Coin{i:03d}" for i in range(args.coins)]
+        write_fixtures(Reddit.REDDIT_FIXTURE_DIR, coins, args.posts)
+
+    client = get_client()
+    collection = client["Bench_Reddit"]["Reddit_Post_Data"]
+    pages = len(coins) * -(-args.posts // 100)
+
+    runs = [("sequential", sequential), ("collected", collected)]
+
+    print(f"{len(coins)} coins x {args.posts} posts, {args.latency}s per page, "
+          f"{args.calls_per_minute} pages/min, {args.workers} workers")
+    print(f"{'strategy':>10} | {'time':>8} | {'pages/s':>8} | {'posts/s':>8}")
+    print("-" * 45)
+    for name, run in runs:
+        # Same starting point for every strategy: empty collection, cold sentiment cache, fresh limiter
+        client.drop_database("Bench_Reddit")
+        with Sentiment.sentiment_lock:
+            Sentiment.sentiment_cache.clear()
+        Reddit.reddit_limiter = TokenBucket.per_minute(args.calls_per_minute)
+
+        started = time.perf_counter()
+        run(coins, collection, args.posts)
+        elapsed = time.perf_counter() - started
+        print(f"{name:>10} | {elapsed:>7.2f}s | {pages / elapsed:>8.1f} | {collection.count_documents({}) / elapsed:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark: sentiment scoring throughput in texts per second.
+
+Compares the original per-title scoring (a new SentimentIntensityAnalyzer per
+call site, VADER then TextBlob one string at a time) against
+Sentiment.score_texts:
+
+  per-text     VADER + TextBlob per title (the original get_sentiment)
+  batch        score_texts on a cold cache, scored in-process
+  process      score_texts on a cold cache, spread over the process pool
+  cached       score_texts again on the same titles (LRU hits)
+
+Titles are generated from a small crypto headline vocabulary, with a share of
+repeated titles as seen when the same stories are re-fetched every cycle:
+
+    python -m Benchmarks.Sentiment_Throughput
+    python -m Benchmarks.Sentiment_Throughput --texts 50000 --workers 8
+"""
+import argparse
+import random
+import time
+
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+from textblob import TextBlob
+
+import Functions.Sentiment as Sentiment
+
+COINS = ["Bitcoin", "Ethereum", "Solana", "Dogecoin", "XRP", "Cardano", "Pepe", "Tron"]
+VERBS = ["surges", "crashes", "rallies", "plunges", "holds steady", "rebounds", "slumps", "soars"]
+REASONS = [
+    "after ETF approval", "amid fears of regulation", "as whales accumulate", "on strong demand",
+    "despite market panic", "after exchange hack", "as traders lose confidence", "on bullish outlook",
+]
+TAILS = ["", " - analysts are optimistic", " - investors worried", " - great news for holders", " - is this the bottom?"]
+
+
+def make_titles(n, repeat_share, seed=11):
+    rng = random.Random(seed)
+    unique = [
+        f"{rng.choice(COINS)} {rng.choice(VERBS)} {rng.randint(2, 40)}% {rng.choice(REASONS)}{rng.choice(TAILS)}"
+        for _ in range(int(n * (1 - repeat_share)) or 1)
+    ]
+    return unique + [rng.choice(unique) for _ in range(n - len(unique))]
+
+
+# Original scoring: one analyzer per call site, VADER + TextBlob per title
+def per_text(titles):
+    sid = SentimentIntensityAnalyzer()
+    for text in titles:
+        compound = sid.polarity_scores(text or "")["compound"]
+        TextBlob(text).sentiment.polarity
+
+
+def reset_cache():
+    with Sentiment.sentiment_lock:
+        Sentiment.sentiment_cache.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=20000)
+    parser.add_argument("--repeat-share", type=float, default=0.3)
+    parser.add_argument("--workers", type=int, default=Sentiment.SENTIMENT_PROCESS_WORKERS)
+    args = parser.parse_args()
+
+    titles = make_titles(args.texts, args.repeat_share)
+    Sentiment.SENTIMENT_CACHE_BACKEND = "memory"
+    Sentiment.SENTIMENT_CACHE_SIZE = max(Sentiment.SENTIMENT_CACHE_SIZE, args.texts)
+    Sentiment.SENTIMENT_PROCESS_WORKERS = args.workers
+
+    def batch():
+        reset_cache()
+        Sentiment.SENTIMENT_PROCESS_THRESHOLD = args.texts + 1
+        Sentiment.score_texts(titles)
+
+    def process():
+        reset_cache()
+        Sentiment.SENTIMENT_PROCESS_THRESHOLD = 1
+        Sentiment.score_texts(titles)
+
+    runs = [
+        ("per-text", lambda: per_text(titles)),
+        ("batch", batch),
+        ("process", process),
+        ("cached", lambda: Sentiment.score_texts(titles)),
+    ]
+
+    # Start the pool outside the timings
+    Sentiment.SENTIMENT_PROCESS_THRESHOLD = 1
+    Sentiment.score_batch(["warm up"] * args.workers * 2)
+
+    print(f"{args.texts} titles, {args.repeat_share:.0%} repeated, {args.workers} process workers")
+    print(f"{'strategy':>10} | {'time':>8} | {'texts/s':>10}")
+    print("-" * 35)
+    for name, run in runs:
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+        print(f"{name:>10} | {elapsed:>7.2f}s | {args.texts / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark: write throughput of the yearly market chart refresh.
+
+Compares three ways of upserting a year of daily prices per coin:
+
+  per-row      one update_one(upsert=True) per price row (the original refresh)
+  per-bucket   one round-trip per month bucket (write_points with batch_size=1)
+  bulk         write_points with unordered bulk_write batches (current refresh)
+
+Indexes are created once before timing, as the app now does at startup.
+Reports rows written per second. mongomock has no network round-trips, so it
+only shows the per-row cost; the per-bucket vs bulk gap needs a real mongod.
+Runs against mongomock by default, or against a local mongod when MONGO_URI is set:
+
+    python -m Benchmarks.Yearly_Upsert_Throughput
+    MONGO_URI=mongodb://localhost:27017 python -m Benchmarks.Yearly_Upsert_Throughput --coins 200
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING
+
+from Functions.TimeSeriesStore import BUCKET_WINDOWS, TIMESTAMP_FORMAT, WRITE_BATCH_SIZE, ensure_indexes, write_points
+
+DATASET = "Yearly_MarketChartData"
+DAYS = 365
+
+
+def get_client():
+    uri = os.getenv("MONGO_URI")
+    if uri:
+        from pymongo import MongoClient
+        return MongoClient(uri)
+
+    import mongomock
+    return mongomock.MongoClient()
+
+
+def make_records(n):
+    start = datetime(2024, 1, 1, 5, 30)
+    return [
+        {"timestamp": (start + timedelta(days=day)).strftime(TIMESTAMP_FORMAT), "price": 100.0 + n + day * 0.01}
+        for day in range(DAYS)
+    ]
+
+
+# Original refresh: one upsert per row into a per-coin collection
+def per_row(client, coin_ids, payload):
+    db = client["Bench_Upsert_Legacy"]
+    for coin_id in coin_ids:
+        collection = db[coin_id]
+        collection.create_index([("timestamp", ASCENDING)], unique=True)
+    started = time.perf_counter()
+    for coin_id in coin_ids:
+        collection = db[coin_id]
+        for record in payload[coin_id]:
+            collection.update_one({"timestamp": record["timestamp"]}, {"$set": {**record, "coin_id": coin_id}}, upsert=True)
+    return time.perf_counter() - started
+
+
+def bucketed(client, coin_ids, payload, batch_size):
+    collection = client["Bench_Upsert_Store"][DATASET]
+    ensure_indexes(collection)
+    started = time.perf_counter()
+    for coin_id in coin_ids:
+        write_points(collection, coin_id, payload[coin_id], BUCKET_WINDOWS[DATASET], batch_size=batch_size)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--coins", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=WRITE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    client = get_client()
+    coin_ids = [f"coin-{i:04d}" for i in range(args.coins)]
+    payload = {coin_id: make_records(n) for n, coin_id in enumerate(coin_ids)}
+    rows = args.coins * DAYS
+
+    runs = [
+        ("per-row", lambda: per_row(client, coin_ids, payload)),
+        ("per-bucket", lambda: bucketed(client, coin_ids, payload, 1)),
+        ("bulk", lambda: bucketed(client, coin_ids, payload, args.batch_size)),
+    ]
+
+    print(f"{args.coins} coins x {DAYS} days = {rows} rows")
+    print(f"{'strategy':>10} | {'time':>8} | {'rows/s':>10}")
+    print("-" * 35)
+    for name, run in runs:
+        # Fresh collections for each strategy so every run inserts the same data
+        client.drop_database("Bench_Upsert_Legacy")
+        client.drop_database("Bench_Upsert_Store")
+        elapsed = run()
+        print(f"{name:>10} | {elapsed:>7.2f}s | {rows / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,17 +5,20 @@ import requests
 import os
 import time
 import tweepy
-import praw
 from textblob import TextBlob
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
 from datetime import datetime
 import requests
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import random
+import threading
 from cachetools import TTLCache
 from Functions.Fetch_Data import get_specific_coin_data
 from Functions.MongoDB import get_coin_ids, UserPortfolio_Data, refresh_reddit_post_data
 from Functions.BlockMindsStatusBot import send_status_message
+from Functions.RateLimit import limited_get
+from Functions.CoinGecko import coingecko_get
+from Functions.PriceHistory import price_series
+from Functions.Reddit import collect_reddit_sentiment
 import pytz
 from Functions.MongoDB import Yearly_MarketChartData_Data
 
@@ -36,18 +39,15 @@ TWITTER_ACCESS_TOKEN = os.getenv("TWITTER_ACCESS_TOKEN")
 TWITTER_ACCESS_SECRET = os.getenv("TWITTER_ACCESS_SECRET")
 TWITTER_BEARER_TOKEN = os.getenv("TWITTER_BEARER_TOKEN")
 
-# Reddit API credentials
-reddit = praw.Reddit(
-    client_id = "XQaZSF7aFd169cXHuQs4uA",
-    client_secret = "NCF7iHpFDgkSpwYOESMVRlcrHRx3_Q",
-    user_agent = "meme-coin-sentiment"
-)
-
 # Initialize Twitter Client
 twitter_client = tweepy.Client(bearer_token=TWITTER_BEARER_TOKEN)
 
 # Cache responses to avoid repeated API calls
 cache = TTLCache(maxsize=500, ttl=900)  # Store 100 results for 5 minutes
+cache_lock = threading.Lock()  # TTLCache is not thread-safe
+
+# Max concurrent HTTP lookups in the enrichment stage (each host is still rate limited on its own)
+ENRICHMENT_WORKERS = int(os.getenv("ENRICHMENT_WORKERS", "8"))
 
 # Fetched Crypto Data from CoinGecko using get_specific_coin_data function
 def load_data():
@@ -79,13 +79,17 @@ def calculate_return_multiple(price_change):
 
 # Contract Address
 def get_contract_address(coin_id, symbol):
-    # 1️⃣ Try CoinGecko API first
-    coingecko_url = f"https://api.coingecko.com/api/v3/coins/{coin_id}"
-    
+    # 1️⃣ Try CoinGecko API first (only the platforms are needed, skip the heavy sections)
+    params = {
+        "localization": "false",
+        "tickers": "false",
+        "market_data": "false",
+        "community_data": "false",
+        "developer_data": "false",
+        "sparkline": "false"
+    }
     try:
-        response = requests.get(coingecko_url)
-        response.raise_for_status()
-        data = response.json()
+        data = coingecko_get(f"/coins/{coin_id}", params=params)
         
         platforms = data.get("platforms", {})
 
@@ -103,7 +107,7 @@ def get_contract_address(coin_id, symbol):
     dexscreener_url = f"https://api.dexscreener.com/latest/dex/search/?q={symbol}"
     
     try:
-        response = requests.get(dexscreener_url)
+        response = limited_get(dexscreener_url)
         response.raise_for_status()
         data = response.json()
         
@@ -119,7 +123,7 @@ def get_contract_address(coin_id, symbol):
 # Exponential Backoff for handling rate limits
 def fetch_with_retries(url, retries=7, base_delay=3):
     for attempt in range(retries):
-        response = requests.get(url)
+        response = limited_get(url)
         if response.status_code == 429:
             wait_time = base_delay * (2 ** attempt) + random.uniform(0, 1)
             time.sleep(wait_time)
@@ -137,35 +141,36 @@ def get_dex_liquidity(contract_address):
     if not contract_address.startswith("0x"):  # DexScreener only supports Ethereum-style addresses
         return None
 
-    if contract_address in cache:
-        return cache[contract_address]  # Return cached result
+    with cache_lock:
+        if contract_address in cache:
+            return cache[contract_address]  # Return cached result
 
     url = f"https://api.dexscreener.com/latest/dex/tokens/{contract_address}"
-    data = fetch_with_retries(url)
+    data = fetch_with_retries(url)  # Paced by the DexScreener rate limiter
 
     if data and "pairs" in data and isinstance(data["pairs"], list) and len(data["pairs"]) > 0:
         liquidity = data["pairs"][0].get("liquidity", {}).get("usd", 0)
-        cache[contract_address] = liquidity  # Cache the result
-        time.sleep(random.uniform(1, 2))
+        with cache_lock:
+            cache[contract_address] = liquidity  # Cache the result
         return liquidity
 
     return 0  # Default to 0 if no data found
 
 # Fetch market volume from CoinGecko for native coins
 def get_native_coin_liquidity(coin_id):
-    if coin_id in cache:
-        return cache[coin_id]  # Return cached result
+    with cache_lock:
+        if coin_id in cache:
+            return cache[coin_id]  # Return cached result
 
-    url = f"https://api.coingecko.com/api/v3/coins/{coin_id}"
-    data = fetch_with_retries(url)
+    try:
+        data = coingecko_get(f"/coins/{coin_id}")  # Paced and retried by the shared CoinGecko client
+    except requests.exceptions.RequestException:
+        data = None
 
     if data:
         liquidity = data.get("market_data", {}).get("total_volume", {}).get("usd", 0)
-        cache[coin_id] = liquidity  # Cache the result
-
-        # Sleep for 1-2 seconds before the next request
-        time.sleep(random.uniform(1, 2))
-
+        with cache_lock:
+            cache[coin_id] = liquidity  # Cache the result
         return liquidity
 
     return 0  # Default to 0 if no data found
@@ -176,226 +181,6 @@ def get_liquidity(contract_address, coin_id):
         return get_native_coin_liquidity(coin_id)  # Use CoinGecko for native coins
     return get_dex_liquidity(contract_address)  # Use DexScreener for tokens
 
-def prepare_reddit_post_df(posts, query):
-    sia = SentimentIntensityAnalyzer()
-    records = []
-
-    # Get timestamps for CoinGecko
-    timestamps = [datetime.utcfromtimestamp(p.created_utc) for p in posts]
-    if not timestamps:
-        return pd.DataFrame()
-
-    start_ts = int(min(timestamps).timestamp())
-    end_ts = int(max(timestamps).timestamp()) + 3600 * 6
-
-    # Fetch CoinGecko Price Data
-    url = f"https://api.coingecko.com/api/v3/coins/{query.lower()}/market_chart/range"
-    params = {"vs_currency": "usd", "from": start_ts, "to": end_ts}
-    try:
-        resp = requests.get(url, params=params, timeout=15)
-        data = resp.json()
-        price_df = pd.DataFrame(data.get("prices", []), columns=["timestamp", "price"])
-        price_df["timestamp"] = price_df["timestamp"] // 1000
-    except:
-        price_df = pd.DataFrame()
-
-    # Loop through posts and collect data
-    for post in posts:
-        sentiment = sia.polarity_scores(post.title)
-        compound = sentiment['compound']
-
-        t_post = datetime.utcfromtimestamp(post.created_utc)
-        t_now = int(t_post.timestamp())
-        t_later = t_now + 3600 * 6
-
-        try:
-            price_now_df = price_df.iloc[(price_df["timestamp"] - t_now).abs().argsort()[:1]]
-            price_later_df = price_df.iloc[(price_df["timestamp"] - t_later).abs().argsort()[:1]]
-
-            price_now = price_now_df["price"].values[0] if not price_now_df.empty else None
-            price_later = price_later_df["price"].values[0] if not price_later_df.empty else None
-            pct_change = ((price_later - price_now) / price_now * 100) if price_now and price_later else None
-        except:
-            price_now = price_later = pct_change = None
-
-        records.append({
-            "coin": query.lower(),
-            "title": post.title,
-            "created_utc": t_post.isoformat(),
-            "permalink": f"https://www.reddit.com{post.permalink}",
-            "author": str(post.author),
-            "subreddit": str(post.subreddit),
-            "url": post.url,
-            "upvotes": post.score,
-            "comments": post.num_comments,
-            "sentiment_score": compound,
-            "price_at_post": price_now,
-            "price_6hr_after": price_later,
-            "price_change_pct": pct_change
-        })
-
-    return pd.DataFrame(records)
-
-# Function to get sentiment score & engagement metrics
-def get_reddit_sentiment_with_pagination(query, total_posts=500, batch_size=100):
-    sia = SentimentIntensityAnalyzer()
-    posts = []
-    after = None
-    fetched_posts = 0
-
-    # For most upvoted post (full metadata)
-    top_post_data = {
-        "title": "",
-        "score": 0,
-        "num_comments": 0,
-        "created_utc": "",
-        "permalink": "",
-        "author": "",
-        "subreddit": "",
-        "url": "",
-        "selftext": "",
-        "sentiment_score": 0,
-        "image_url": ""
-    }
-
-    created_times = []
-
-    while fetched_posts < total_posts:
-        search_results = reddit.subreddit("cryptocurrency+CryptoMarkets").search(
-            query, limit=batch_size, params={'after': after}
-        )
-        batch_posts = list(search_results)
-
-        if not batch_posts:
-            break
-
-        posts.extend(batch_posts)
-        fetched_posts += len(batch_posts)
-        after = batch_posts[-1].id
-
-        if len(batch_posts) < batch_size:
-            break
-
-    # Aggregation variables
-    sentiment_score = 0
-    total_upvotes = 0
-    total_comments = 0
-    post_volumes = 0
-    sentiment_trends = []
-    positive_mentions = 0
-    neutral_mentions = 0
-    negative_mentions = 0
-
-    for post in posts:
-        sentiment = sia.polarity_scores(post.title)
-        compound = sentiment['compound']
-        sentiment_score += compound
-        sentiment_trends.append(compound)
-
-        upvotes = post.score
-        comments = post.num_comments
-        total_upvotes += upvotes
-        total_comments += comments
-        post_volumes += 1
-
-        # Save the most upvoted post with full metadata
-        if upvotes > top_post_data["score"]:
-            # Try to extract image URL
-            image_url = ""
-            if post.url.lower().endswith((".jpg", ".jpeg", ".png", ".gif")):
-                image_url = post.url
-            elif hasattr(post, "preview"):
-                try:
-                    image_url = post.preview["images"][0]["source"]["url"].replace("&amp;", "&")
-                except:
-                    image_url = ""
-            elif hasattr(post, "thumbnail") and post.thumbnail.startswith("http"):
-                image_url = post.thumbnail
-
-            top_post_data = {
-                "title": post.title,
-                "score": upvotes,
-                "num_comments": comments,
-                "created_utc": datetime.utcfromtimestamp(post.created_utc).strftime("%Y-%m-%d %H:%M:%S"),
-                "permalink": f"https://www.reddit.com{post.permalink}",
-                "author": str(post.author),
-                "subreddit": str(post.subreddit),
-                "url": post.url,
-                "selftext": post.selftext[:500] if hasattr(post, "selftext") else "",
-                "sentiment_score": compound,
-                "image_url": image_url
-            }
-
-        # Sentiment breakdown
-        if compound >= 0.05:
-            positive_mentions += 1
-        elif compound <= -0.05:
-            negative_mentions += 1
-        else:
-            neutral_mentions += 1
-
-        # Mention date tracking
-        if hasattr(post, "created_utc"):
-            created_times.append(datetime.utcfromtimestamp(post.created_utc))
-
-    # Basic metrics
-    count = max(post_volumes, 1)
-    avg_sentiment = sentiment_score / count
-    avg_upvotes = total_upvotes / count
-    avg_comments = total_comments / count
-    sentiment_trend = np.mean(sentiment_trends) if sentiment_trends else 0
-    engagement_rate = (total_upvotes + total_comments) / count
-    positive_pct = positive_mentions / count
-    negative_pct = negative_mentions / count
-
-    # Mentions per day
-    if created_times:
-        days_range = max((max(created_times) - min(created_times)).days, 1)
-        mentions_per_day = post_volumes / days_range
-    else:
-        mentions_per_day = 0
-
-    # Trending logic
-    trending = "Yes" if sentiment_trend > 0.2 or engagement_rate > 10 else "No"
-    
-    # Prepare DataFrame from posts
-    df = prepare_reddit_post_df(posts, query)
-    if not df.empty:
-        refresh_reddit_post_data(df)
-
-    # Return the aggregated metrics
-    return {
-        # Base metrics
-        "Avg Sentiment": avg_sentiment,
-        "Post Volume": post_volumes,
-        "Avg Upvotes": avg_upvotes,
-        "Avg Comments": avg_comments,
-        "Sentiment Trend": sentiment_trend,
-        "Positive Mentions": positive_mentions,
-        "Neutral Mentions": neutral_mentions,
-        "Negative Mentions": negative_mentions,
-
-        # Engagement & trend insights
-        "Engagement Rate": engagement_rate,
-        "Positive %": positive_pct,
-        "Negative %": negative_pct,
-        "Mentions per Day": mentions_per_day,
-        "Trending": trending,
-
-        # Top post metadata
-        "Top Post Title": top_post_data["title"],
-        "Top Post Upvotes": top_post_data["score"],
-        "Top Post Comments": top_post_data["num_comments"],
-        "Top Post Date": top_post_data["created_utc"],
-        "Top Post Link": top_post_data["permalink"],
-        "Top Post Author": top_post_data["author"],
-        "Top Post Subreddit": top_post_data["subreddit"],
-        "Top Post URL": top_post_data["url"],
-        "Top Post Body": top_post_data["selftext"],
-        "Top Post Sentiment": top_post_data["sentiment_score"],
-        "Top Post Image URL": top_post_data["image_url"]
-    }
-
 # Get Price on the Purchase Date from CoinGecko
 def get_crypto_price_on_purchase_date(symbol: str, date_str: str) -> float:
     try:
@@ -404,13 +189,61 @@ def get_crypto_price_on_purchase_date(symbol: str, date_str: str) -> float:
         headers = {
             "Accept": "application/json",
         }
-        response = requests.get(url, headers=headers)
+        response = limited_get(url, headers=headers)
         data = response.json()
         return data[symbol.upper()]["USD"]
     except Exception as e:
         print(f"Error fetching price: {e}")
         return None
 
+# Enrichment stage: contract address, liquidity and purchase-date price for every coin.
+# Lookups run concurrently, each host is paced by its own token bucket (see RateLimit.py)
+# and identical lookups shared by several coins are only requested once.
+# Native coins reuse the 24h volume of the markets snapshot instead of another CoinGecko call.
+def enrich_coin_data(df, purchase_dates):
+    futures = {}
+    contract_addresses, liquidity, purchase_prices = {}, {}, {}
+
+    with ThreadPoolExecutor(max_workers=ENRICHMENT_WORKERS) as executor:
+
+        # Submit each distinct lookup once, whichever coin asks for it
+        def submit(fn, *args):
+            key = (fn.__name__, *args)
+            if key not in futures:
+                futures[key] = executor.submit(fn, *args)
+            return futures[key]
+
+        contract_futures = {}
+        price_futures = {}
+        total_volumes = dict(zip(df["Coin ID"], df["Total Volume"])) if "Total Volume" in df.columns else {}
+        for coin_id, symbol in zip(df["Coin ID"], df["Symbol"]):
+            contract_futures.setdefault(submit(get_contract_address, coin_id, symbol), []).append(coin_id)
+            if symbol in purchase_dates:
+                price_futures[coin_id] = submit(get_crypto_price_on_purchase_date, symbol, purchase_dates[symbol])
+
+        # Liquidity depends on the contract address, so it is queued as soon as that resolves
+        liquidity_futures = {}
+        for future in as_completed(contract_futures):
+            contract = future.result()
+            for coin_id in contract_futures[future]:
+                contract_addresses[coin_id] = contract
+                if (not contract or contract == "Native Coin (No Contract)") and pd.notna(total_volumes.get(coin_id)):
+                    liquidity[coin_id] = total_volumes[coin_id]
+                else:
+                    liquidity_futures[coin_id] = submit(get_liquidity, contract, coin_id)
+
+        for coin_id, future in liquidity_futures.items():
+            try:
+                liquidity[coin_id] = future.result()
+            except Exception as e:
+                print(f"⚠️ Liquidity lookup failed for {coin_id}: {e}")
+                liquidity[coin_id] = None
+
+        for coin_id, future in price_futures.items():
+            purchase_prices[coin_id] = future.result()
+
+    return contract_addresses, liquidity, purchase_prices
+
 # Full Analysis
 def Analysis():
     
@@ -424,44 +257,50 @@ def Analysis():
     # Dictionary to store Sharpe Ratios and technical indicators for each Crypto_Id
     crypto_analysis_dict = {}
 
-    # Coin loop
-    for Crypto_Id in crypto_Ids:
-        try:
-            # ✅ Fetch all market chart data from MongoDB once
-            full_market_data = pd.DataFrame(Yearly_MarketChartData_Data())
-        
-            # ✅ Filter data for this coin
-            coin_data = full_market_data[full_market_data['Coin_id'] == Crypto_Id].copy()
+    # ✅ Fetch the yearly price history of all portfolio coins with one indexed query
+    yearly_prices = {}
+    try:
+        full_market_data = pd.DataFrame(Yearly_MarketChartData_Data(coin_ids=crypto_Ids, fields=["price"]))
 
-            if coin_data.empty:
-                send_status_message(Status_TELEGRAM_CHAT_ID, f"⚠️ No historical market data found for {Crypto_Id}. Skipping.")
-                continue
+        # ✅ Split it into one sorted price series per coin with a single groupby
+        if not full_market_data.empty:
+            full_market_data['Timestamp'] = pd.to_datetime(full_market_data['Timestamp'])
+            for Crypto_Id, coin_data in full_market_data.groupby('Coin_id', sort=False):
+                yearly_prices[Crypto_Id] = coin_data.set_index('Timestamp')[['Price']].rename(columns={'Price': 'price'}).sort_index()
 
-            # ✅ Convert timestamp and prepare price series
-            coin_data['Timestamp'] = pd.to_datetime(coin_data['Timestamp'])
-            coin_data.set_index('Timestamp', inplace=True)
-            prices = coin_data[['Price']].rename(columns={'Price': 'price'}).sort_index()
+    except Exception as e:
+        send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error processing market chart data: {e}")
 
-        except Exception as e:
-            send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error processing market chart data for {Crypto_Id}: {e}")
+    # ✅ Load the user portfolio once: first purchase date per coin symbol
+    Assets_df = pd.DataFrame(UserPortfolio_Data())
+    purchase_dates = Assets_df.drop_duplicates('coin_symbol').set_index('coin_symbol')['purchase_date'].to_dict()
+
+    # ✅ Contract address, liquidity and purchase-date price for all coins, concurrently
+    contract_addresses, liquidity, purchase_prices = enrich_coin_data(df, purchase_dates)
+
+    # Coin loop
+    for Crypto_Id in crypto_Ids:
+        prices = yearly_prices.get(Crypto_Id)
+
+        if prices is None or prices.empty:
+            send_status_message(Status_TELEGRAM_CHAT_ID, f"⚠️ No historical market data found for {Crypto_Id}. Skipping.")
             continue
-        
+
         # Price on Purchase Date
-        Assets = UserPortfolio_Data()
-        Assets_df = pd.DataFrame(Assets)
-        symbol = df[df['Coin ID'] == Crypto_Id]['Symbol'].iloc[0]
-        purchase_date =  Assets_df[Assets_df['coin_symbol'] == symbol]['purchase_date'].iloc[0]
-        
-        prices['Price on Puchase Date'] = get_crypto_price_on_purchase_date(symbol=symbol, date_str=purchase_date)
+        prices['Price on Puchase Date'] = purchase_prices.get(Crypto_Id)
 
         # Store data in dictionary
         crypto_analysis_dict[Crypto_Id] = prices
         
-    reddit_data = df["Coin Name"].apply(get_reddit_sentiment_with_pagination)
+    # ✅ Reddit posts of all coins: fetched concurrently, scored in one batch, written once
+    # (name, CoinGecko ID) per coin: posts are searched by name and priced by ID
+    reddit_coins = list(zip(df["Coin Name"], df["Coin ID"]))
+    reddit_metrics = collect_reddit_sentiment(reddit_coins, price_lookup=price_series, write_posts=refresh_reddit_post_data)
+    reddit_data = pd.Series([reddit_metrics[coin] for coin in reddit_coins], index=df.index)
 
     # --------- Update Main DataFrame ---------
-    df["Contract Address"] = df.apply(lambda row: get_contract_address(row["Coin ID"], row["Symbol"]), axis=1)
-    df["Liquidity"] = df.apply(lambda row: get_liquidity(row["Contract Address"], row["Coin ID"]), axis=1)
+    df["Contract Address"] = df["Coin ID"].map(contract_addresses)
+    df["Liquidity"] = df["Coin ID"].map(liquidity)
     
     # Fetch Reddit Sentiment Data
     df["Reddit Sentiment"] = reddit_data.apply(lambda x: x["Avg Sentiment"])
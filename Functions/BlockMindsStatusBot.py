@@ -1,7 +1,11 @@
 import os
+import atexit
+import queue
+import threading
 import requests
 from dotenv import load_dotenv
 import time
+from Functions.RateLimit import TokenBucket, REQUEST_TIMEOUT
 start_time = time.time()
 
 # Load environment variables
@@ -13,15 +17,170 @@ Status_TELEGRAM_CHAT_ID = os.getenv("Status_TELEGRAM_CHAT_ID")
 
 # https://api.telegram.org/bot7625246763:AAFO5qjmuEV-c1ZHkwT6KavpSegPqrG7xVg/getupdates
 
-def send_status_message(chat_id, message):
-    """Sends a message to a specific Telegram user."""
+# Telegram API base URL (override to point at a local stub)
+STATUS_TELEGRAM_API_URL = os.getenv("STATUS_TELEGRAM_API_URL", "https://api.telegram.org")
+
+# Messages waiting to be sent; when full, new messages are counted and reported in the next digest
+STATUS_QUEUE_SIZE = int(os.getenv("STATUS_QUEUE_SIZE", "1000"))
+
+# Messages arriving within this window (seconds) are coalesced into one digest per chat
+STATUS_DIGEST_SECONDS = float(os.getenv("STATUS_DIGEST_SECONDS", "2"))
+
+# Telegram allows about 20 messages per minute into one chat
+STATUS_MESSAGES_PER_MINUTE = int(os.getenv("STATUS_MESSAGES_PER_MINUTE", "20"))
+
+# Telegram rejects messages longer than 4096 characters
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+status_queue = queue.Queue(maxsize=STATUS_QUEUE_SIZE)
+status_limiter = TokenBucket.per_minute(STATUS_MESSAGES_PER_MINUTE)
+status_lock = threading.Lock()
+status_worker = None
+dropped_messages = {}  # chat_id -> messages dropped while the queue was full
+status_metrics = {"queued": 0, "dropped": 0, "sent": 0, "digests": 0, "errors": 0}
+
+
+# Queue a status message for a Telegram chat; returns immediately.
+# Extra arguments are appended to the message (e.g. an exception).
+def send_status_message(chat_id, message, *details):
+    text = " ".join(str(part) for part in (message, *details))
+    ensure_status_worker()
+
     try:
-        url = f"https://api.telegram.org/bot{Status_TELEGRAM_BOT_TOKEN}/sendMessage"
-        data = {"chat_id": chat_id, "text": message, "parse_mode": "Markdown"}
-        response = requests.post(url, data=data)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Telegram API Error: {e}")
-        return {"error": str(e)}
+        status_queue.put_nowait((chat_id, text))
+        with status_lock:
+            status_metrics["queued"] += 1
+        return {"queued": True}
+    except queue.Full:
+        with status_lock:
+            dropped_messages[chat_id] = dropped_messages.get(chat_id, 0) + 1
+            status_metrics["dropped"] += 1
+        return {"queued": False, "dropped": True}
+
+# Start the background sender once per process
+def ensure_status_worker():
+    global status_worker
+    if status_worker is not None and status_worker.is_alive():
+        return
+    with status_lock:
+        if status_worker is None or not status_worker.is_alive():
+            status_worker = threading.Thread(target=status_worker_loop, daemon=True)
+            status_worker.start()
+
+# Send everything that is queued, as one digest per chat
+def status_worker_loop():
+    while True:
+        batch = [status_queue.get()]
+
+        # Coalesce the rest of the burst
+        deadline = time.monotonic() + STATUS_DIGEST_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(status_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        try:
+            for chat_id, text in build_digests(batch):
+                post_status_message(chat_id, text)
+        except Exception as e:
+            print(f"❌ Status notifier error: {e}")
+        finally:
+            for _ in batch:
+                status_queue.task_done()
+
+# Group queued messages per chat, fold repeats into "(×N)" and split at Telegram's size limit
+def build_digests(batch):
+    per_chat = {}
+    for chat_id, text in batch:
+        counts = per_chat.setdefault(chat_id, {})
+        counts[text] = counts.get(text, 0) + 1
+
+    with status_lock:
+        dropped = dict(dropped_messages)
+        dropped_messages.clear()
+    for chat_id in dropped:
+        per_chat.setdefault(chat_id, {})
+
+    digests = []
+    for chat_id, counts in per_chat.items():
+        lines = [text if count == 1 else f"{text} (×{count})" for text, count in counts.items()]
+        if dropped.get(chat_id):
+            lines.append(f"⚠️ {dropped[chat_id]} more status messages were dropped (queue full).")
+
+        chunk = ""
+        for line in lines:
+            line = line[:TELEGRAM_MESSAGE_LIMIT]
+            if chunk and len(chunk) + 1 + len(line) > TELEGRAM_MESSAGE_LIMIT:
+                digests.append((chat_id, chunk))
+                chunk = ""
+            chunk = f"{chunk}\n{line}" if chunk else line
+        if chunk:
+            digests.append((chat_id, chunk))
+
+    return digests
+
+# Seconds to wait after a 429: Telegram's JSON "retry_after", else the Retry-After header, else 5
+def retry_after_seconds(response, default=5):
+    try:
+        return float(response.json()["parameters"]["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        pass
+    try:
+        return float(response.headers.get("Retry-After", default))
+    except (TypeError, ValueError):
+        return default
+
+# POST one message to Telegram within the rate limit
+def post_status_message(chat_id, text):
+    url = f"{STATUS_TELEGRAM_API_URL}/bot{Status_TELEGRAM_BOT_TOKEN}/sendMessage"
+    data = {"chat_id": chat_id, "text": text, "parse_mode": "Markdown"}
+
+    for _ in range(3):
+        status_limiter.acquire()
+        try:
+            response = requests.post(url, data=data, timeout=REQUEST_TIMEOUT)
+
+            if response.status_code == 429:
+                status_limiter.pause(retry_after_seconds(response))
+                continue
+
+            # Coalesced messages can break Markdown entities; resend as plain text
+            if response.status_code == 400 and "parse_mode" in data:
+                data.pop("parse_mode")
+                continue
+
+            response.raise_for_status()
+            with status_lock:
+                status_metrics["sent"] += 1
+                if "\n" in text:
+                    status_metrics["digests"] += 1
+            return response.json()
+
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Telegram API Error: {e}")
+            break
+
+    with status_lock:
+        status_metrics["errors"] += 1
+    return {"error": "Status message could not be delivered."}
+
+# Wait until the queued messages are sent (used on shutdown); returns False on timeout
+def flush_status_messages(timeout=10):
+    deadline = time.monotonic() + timeout
+    while status_queue.unfinished_tasks:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+# Counters of the background notifier
+def status_notifier_metrics():
+    with status_lock:
+        return {**status_metrics, "queue_depth": status_queue.qsize()}
 
+# Deliver what is still queued when a script exits
+atexit.register(flush_status_messages, 5)
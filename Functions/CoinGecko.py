@@ -0,0 +1,105 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+from Functions.RateLimit import limiter_for
+
+# Load environment variables
+load_dotenv()
+
+# CoinGecko API URL
+COINGECKO_API_URL = os.getenv("COINGECKO_API_URL") or "https://api.coingecko.com/api/v3"
+
+# Retry policy
+MAX_RETRIES = 5
+BASE_DELAY = 2  # base delay for backoff on network errors / 5xx (seconds)
+REQUEST_TIMEOUT = 15
+HEADERS = {"Accept": "application/json"}
+
+# -------------------------- Process-wide CoinGecko Client -------------------------- #
+# Every module (Fetch_Data, Analysis, News, MongoDB, RealTimeUpdate) goes through this
+# client, so the hourly, 6-hourly and nightly loaders share one keep-alive connection
+# pool and one token bucket instead of racing each other for the same quota.
+
+session = requests.Session()
+session.headers.update(HEADERS)
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+# One token bucket for every thread and background loader
+limiter = limiter_for(COINGECKO_API_URL)
+
+# Call metrics
+_metrics = {"calls": 0, "rate_limited": 0, "retries": 0, "errors": 0, "wait_seconds": 0.0}
+_metrics_lock = threading.Lock()
+
+def _record(**increments):
+    with _metrics_lock:
+        for key, value in increments.items():
+            _metrics[key] += value
+
+# Snapshot of the client metrics (calls, 429s, retries, errors, seconds spent waiting)
+def coingecko_metrics():
+    with _metrics_lock:
+        return dict(_metrics, wait_seconds=round(_metrics["wait_seconds"], 2))
+
+# Seconds to wait according to a Retry-After header (delta-seconds or HTTP date)
+def _retry_after_seconds(response, attempt):
+    value = response.headers.get("Retry-After")
+    if value:
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    # No usable header: CoinGecko's free tier resets per minute
+    return min(60.0, BASE_DELAY * (2 ** attempt)) + random.uniform(0, 1)
+
+# GET a CoinGecko path (e.g. "/coins/bitcoin") and return the final Response.
+# 429s pause the shared bucket for Retry-After, network errors and 5xx back off exponentially.
+def coingecko_request(path, params=None, max_retries=MAX_RETRIES):
+    url = path if path.startswith("http") else f"{COINGECKO_API_URL}{path}"
+
+    for attempt in range(max_retries):
+        waited = limiter.acquire()
+        _record(calls=1, wait_seconds=waited)
+
+        try:
+            response = session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+        except requests.exceptions.RequestException:
+            _record(errors=1)
+            if attempt == max_retries - 1:
+                raise
+            backoff = BASE_DELAY * (2 ** attempt) + random.uniform(0, 1)
+            _record(retries=1, wait_seconds=backoff)
+            time.sleep(backoff)
+            continue
+
+        if response.status_code == 429:
+            # Every caller in the process waits out the same quota window
+            _record(rate_limited=1, retries=1)
+            limiter.pause(_retry_after_seconds(response, attempt))
+            continue
+
+        if response.status_code >= 500 and attempt < max_retries - 1:
+            backoff = BASE_DELAY * (2 ** attempt) + random.uniform(0, 1)
+            _record(errors=1, retries=1, wait_seconds=backoff)
+            time.sleep(backoff)
+            continue
+
+        return response
+
+    return response
+
+# GET a CoinGecko path and return the decoded JSON (raises requests.HTTPError on failure)
+def coingecko_get(path, params=None, max_retries=MAX_RETRIES):
+    response = coingecko_request(path, params=params, max_retries=max_retries)
+    response.raise_for_status()
+    return response.json()
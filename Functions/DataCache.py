@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from functools import wraps
+
+# -------------------------- Read-Through Dataset Cache -------------------------- #
+#
+# The whole-collection accessors of MongoDB.py (UserPortfolio_Data, CryptoCoins_Data,
+# ...) are called several times per request and per analysis run. Each dataset keeps
+# its last result for `ttl` seconds; writers (and the change stream watcher in
+# MongoDB.py) drop it as soon as the collection changes.
+
+# (ttl seconds, max documents kept) per cached dataset, TTLs overridable through .env
+DATASET_CACHE_SETTINGS = {
+    "UserPortfolio": (int(os.getenv("CACHE_TTL_USER_PORTFOLIO", "300")), 50000),
+    "UserMetadata": (int(os.getenv("CACHE_TTL_USER_METADATA", "300")), 50000),
+    "Analyzed_CryptoCurrency_Data": (int(os.getenv("CACHE_TTL_ANALYZED_DATA", "900")), 50000),
+    "CoinsList": (int(os.getenv("CACHE_TTL_COINS_LIST", "86400")), 100000),
+    "Reddit_Post_Data": (int(os.getenv("CACHE_TTL_REDDIT_POSTS", "900")), 50000),
+    "Crypto_News_Data": (int(os.getenv("CACHE_TTL_NEWS", "900")), 50000),
+}
+
+
+# Thread-safe cache holding one result per dataset
+class DatasetCache:
+    def __init__(self, settings):
+        self.settings = settings
+        self.entries = {}  # dataset -> (expires_at, generation, documents)
+        self.generations = {dataset: 0 for dataset in settings}
+        self.lock = threading.Lock()
+        self.metrics = {dataset: {"hits": 0, "misses": 0, "invalidations": 0, "skipped": 0} for dataset in settings}
+
+    def get(self, dataset):
+        with self.lock:
+            entry = self.entries.get(dataset)
+            if entry and entry[0] > time.monotonic():
+                self.metrics[dataset]["hits"] += 1
+                return entry[2]
+            self.entries.pop(dataset, None)
+            self.metrics[dataset]["misses"] += 1
+            return None
+
+    # Generation to pass to put(); a result loaded before an invalidation is not stored
+    def generation(self, dataset):
+        with self.lock:
+            return self.generations[dataset]
+
+    def put(self, dataset, documents, generation):
+        ttl, max_documents = self.settings[dataset]
+        with self.lock:
+            if generation != self.generations[dataset]:
+                return
+            # Oversized results are served uncached instead of pinning them in memory
+            if len(documents) > max_documents:
+                self.metrics[dataset]["skipped"] += 1
+                return
+            self.entries[dataset] = (time.monotonic() + ttl, generation, documents)
+
+    def invalidate(self, *datasets):
+        with self.lock:
+            for dataset in datasets or list(self.settings):
+                if dataset in self.settings:
+                    self.generations[dataset] += 1
+                    self.entries.pop(dataset, None)
+                    self.metrics[dataset]["invalidations"] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                dataset: {**counts, "cached": dataset in self.entries}
+                for dataset, counts in self.metrics.items()
+            }
+
+
+dataset_cache = DatasetCache(DATASET_CACHE_SETTINGS)
+
+# Serve an accessor from the cache; only list results are cached (errors return {})
+def cached_dataset(dataset):
+    def decorator(func):
+        @wraps(func)
+        def wrapper():
+            documents = dataset_cache.get(dataset)
+            if documents is not None:
+                return list(documents)
+
+            generation = dataset_cache.generation(dataset)
+            documents = func()
+            if isinstance(documents, list):
+                dataset_cache.put(dataset, documents, generation)
+                return list(documents)
+            return documents
+        return wrapper
+    return decorator
+
+# Drop the cached result of the given datasets (all of them when none is given)
+def invalidate_cache(*datasets):
+    dataset_cache.invalidate(*datasets)
+
+# Hit / miss / invalidation counters per dataset
+def cache_metrics():
+    return dataset_cache.snapshot()
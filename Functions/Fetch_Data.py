@@ -4,10 +4,9 @@ import os
 import pandas as pd
 import time
 import concurrent.futures
-import threading
 from Functions.BlockMindsStatusBot import send_status_message 
-from Functions.MongoDB import get_coin_ids, Refresh_Hourly_MarketChart_Data, Refresh_Hourly_CandlestickData_Data, Refresh_Yearly_CandlestickData_Data, Refresh_Yearly_MarketChartData_Data
-import random
+from Functions.CoinGecko import coingecko_get, coingecko_request, coingecko_metrics
+from Functions.MongoDB import get_coin_ids, Refresh_Hourly_MarketChart_Data, Refresh_Hourly_CandlestickData_Data, Refresh_Yearly_CandlestickData_Data, Refresh_Yearly_MarketChartData_Data, MarketData_Watermark
 from datetime import datetime
 import pytz
 
@@ -22,118 +21,143 @@ COINGECKO_API_URL = os.getenv("COINGECKO_API_URL")
 # Status TELEGRAM CHAT I'D
 Status_TELEGRAM_CHAT_ID = os.getenv("Status_TELEGRAM_CHAT_ID")
 
-# Lock for shared timing (if needed)
-lock = threading.Lock()
-next_available_time = time.time()
+# Persistent worker pool for coin snapshots. Workers dispatch as fast as the shared
+# CoinGecko token bucket allows and only back off on an actual 429 / Retry-After.
+COIN_FETCH_WORKERS = int(os.getenv("COIN_FETCH_WORKERS", "4"))
+coin_fetch_pool = concurrent.futures.ThreadPoolExecutor(max_workers=COIN_FETCH_WORKERS, thread_name_prefix="coin-fetch")
 
-# Parameters
-CHUNK_SIZE = 4
-WAIT_BETWEEN_CHUNKS = 50  # based on observed reset time
-THREADS_PER_CHUNK = 2
-MAX_RETRIES = 5
+# Max coin IDs per /coins/markets request (CoinGecko's per_page limit)
+MARKETS_PAGE_SIZE = 250
 
-# Constants
-MAX_RETRIES = 5
-BASE_DELAY = 3  # base delay for backoff in seconds
-HEADERS = {"Accept": "application/json"}
+# Weekday (0 = Monday) on which the nightly yearly refresh re-downloads all 365 days
+YEARLY_FULL_RECONCILE_WEEKDAY = int(os.getenv("YEARLY_FULL_RECONCILE_WEEKDAY", "6"))
 
+# Smallest /ohlc "days" value that still returns the 4-day candles of the 365 day series
+YEARLY_OHLC_DELTA_DAYS = "90"
+
+# Pacing, 429 / Retry-After handling and retries are done by the shared CoinGecko client
 def fetch_coin_data(coin_id):
-    global next_available_time
-    url = f"{COINGECKO_API_URL}/coins/{coin_id}"
-    headers = {
-        "Accept": "application/json"
+    try:
+        data = coingecko_get(f"/coins/{coin_id}")
+
+        market_data = data.get("market_data", {})
+        return {
+            "Coin ID": data.get("id"),
+            "Symbol": data.get("symbol"),
+            "Coin Name": data.get("name"),
+            "Image URL": data.get("image", {}).get("large"),
+            "Current Price": market_data.get("current_price", {}).get("usd"),
+            "Market Cap Rank": data.get("market_cap_rank"),
+            "Market Cap": market_data.get("market_cap", {}).get("usd"),
+            "Fully Diluted Valuation": market_data.get("fully_diluted_valuation", {}).get("usd"),
+            "Total Volume": market_data.get("total_volume", {}).get("usd"),
+            "24h High Price": market_data.get("high_24h", {}).get("usd"),
+            "24h Low Price": market_data.get("low_24h", {}).get("usd"),
+            "24h Price Change": market_data.get("price_change_24h"),
+            "24h Price Change Percentage (%)": market_data.get("price_change_percentage_24h"),
+            "24h Market Cap Change": market_data.get("market_cap_change_24h"),
+            "24h Market Cap Change Percentage (%)": market_data.get("market_cap_change_percentage_24h"),
+            "Circulating Supply": market_data.get("circulating_supply"),
+            "Total Supply": market_data.get("total_supply"),
+            "Max Supply": market_data.get("max_supply"),
+            "All-Time High Price": market_data.get("ath", {}).get("usd"),
+            "All-Time High Change Percentage (%)": market_data.get("ath_change_percentage", {}).get("usd"),
+            "All-Time High Date": market_data.get("ath_date", {}).get("usd"),
+            "All-Time Low Price": market_data.get("atl", {}).get("usd"),
+            "All-Time Low Change Percentage (%)": market_data.get("atl_change_percentage", {}).get("usd"),
+            "All-Time Low Date": market_data.get("atl_date", {}).get("usd"),
+            "Last Updated": data.get("last_updated")
+        }
+
+    except requests.exceptions.RequestException as e:
+        send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Final failure: Could not fetch data for {coin_id}: {e}")
+        return None
+
+# Map one /coins/markets entry onto the same columns fetch_coin_data produces
+def market_entry_to_row(entry):
+    return {
+        "Coin ID": entry.get("id"),
+        "Symbol": entry.get("symbol"),
+        "Coin Name": entry.get("name"),
+        "Image URL": entry.get("image"),
+        "Current Price": entry.get("current_price"),
+        "Market Cap Rank": entry.get("market_cap_rank"),
+        "Market Cap": entry.get("market_cap"),
+        "Fully Diluted Valuation": entry.get("fully_diluted_valuation"),
+        "Total Volume": entry.get("total_volume"),
+        "24h High Price": entry.get("high_24h"),
+        "24h Low Price": entry.get("low_24h"),
+        "24h Price Change": entry.get("price_change_24h"),
+        "24h Price Change Percentage (%)": entry.get("price_change_percentage_24h"),
+        "24h Market Cap Change": entry.get("market_cap_change_24h"),
+        "24h Market Cap Change Percentage (%)": entry.get("market_cap_change_percentage_24h"),
+        "Circulating Supply": entry.get("circulating_supply"),
+        "Total Supply": entry.get("total_supply"),
+        "Max Supply": entry.get("max_supply"),
+        "All-Time High Price": entry.get("ath"),
+        "All-Time High Change Percentage (%)": entry.get("ath_change_percentage"),
+        "All-Time High Date": entry.get("ath_date"),
+        "All-Time Low Price": entry.get("atl"),
+        "All-Time Low Change Percentage (%)": entry.get("atl_change_percentage"),
+        "All-Time Low Date": entry.get("atl_date"),
+        "Last Updated": entry.get("last_updated")
     }
 
-    wait_time = 1.0  # initial wait time for exponential backoff
-
-    for attempt in range(MAX_RETRIES):
-        with lock:
-            now = time.time()
-            if now < next_available_time:
-                time.sleep(next_available_time - now)
-            next_available_time = time.time() + 1.0  # pacing between threads
-
+# Snapshot many coins at once: ceil(N / 250) requests to /coins/markets instead of N to /coins/{id}
+def fetch_markets_snapshot(coin_ids):
+    snapshots = {}
+    for i in range(0, len(coin_ids), MARKETS_PAGE_SIZE):
+        batch = coin_ids[i:i + MARKETS_PAGE_SIZE]
+        params = {
+            "vs_currency": "usd",
+            "ids": ",".join(batch),
+            "per_page": MARKETS_PAGE_SIZE,
+            "page": 1
+        }
         try:
-            response = requests.get(url, headers=headers)
-
-            if response.status_code == 429:
-                rate_limit_hit_time = time.time()
-
-                while True:
-                    time.sleep(1)
-                    retry_response = requests.get(url, headers=headers)
-                    if retry_response.status_code != 429:
-                        actual_wait = time.time() - rate_limit_hit_time
-                        response = retry_response
-                        break
-
-            response.raise_for_status()
-            data = response.json()
-
-            market_data = data.get("market_data", {})
-            return {
-                "Coin ID": data.get("id"),
-                "Symbol": data.get("symbol"),
-                "Coin Name": data.get("name"),
-                "Image URL": data.get("image", {}).get("large"),
-                "Current Price": market_data.get("current_price", {}).get("usd"),
-                "Market Cap Rank": data.get("market_cap_rank"),
-                "Market Cap": market_data.get("market_cap", {}).get("usd"),
-                "Fully Diluted Valuation": market_data.get("fully_diluted_valuation", {}).get("usd"),
-                "Total Volume": market_data.get("total_volume", {}).get("usd"),
-                "24h High Price": market_data.get("high_24h", {}).get("usd"),
-                "24h Low Price": market_data.get("low_24h", {}).get("usd"),
-                "24h Price Change": market_data.get("price_change_24h"),
-                "24h Price Change Percentage (%)": market_data.get("price_change_percentage_24h"),
-                "24h Market Cap Change": market_data.get("market_cap_change_24h"),
-                "24h Market Cap Change Percentage (%)": market_data.get("market_cap_change_percentage_24h"),
-                "Circulating Supply": market_data.get("circulating_supply"),
-                "Total Supply": market_data.get("total_supply"),
-                "Max Supply": market_data.get("max_supply"),
-                "All-Time High Price": market_data.get("ath", {}).get("usd"),
-                "All-Time High Change Percentage (%)": market_data.get("ath_change_percentage", {}).get("usd"),
-                "All-Time High Date": market_data.get("ath_date", {}).get("usd"),
-                "All-Time Low Price": market_data.get("atl", {}).get("usd"),
-                "All-Time Low Change Percentage (%)": market_data.get("atl_change_percentage", {}).get("usd"),
-                "All-Time Low Date": market_data.get("atl_date", {}).get("usd"),
-                "Last Updated": data.get("last_updated")
-            }
-
+            for entry in coingecko_get("/coins/markets", params=params):
+                snapshots[entry.get("id")] = market_entry_to_row(entry)
         except requests.exceptions.RequestException as e:
-            send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error fetching data for {coin_id}: {e}")
-            time.sleep(wait_time)
-            wait_time *= 1  # exponential backoff
+            send_status_message(Status_TELEGRAM_CHAT_ID, f"⚠️ Bulk markets snapshot failed for {len(batch)} coins, using per-coin fetch: {e}")
 
-    send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Final failure: Could not fetch data for {coin_id} after {MAX_RETRIES} attempts.")
-    return None
-
-def chunkify(lst, size):
-    return [lst[i:i + size] for i in range(0, len(lst), size)]
+    return snapshots
 
 def get_specific_coin_data(coin_ids):
     all_data = []
-    chunks = chunkify(coin_ids, CHUNK_SIZE)
-
-    for i, chunk in enumerate(chunks, 1):
-        try:
-            with concurrent.futures.ThreadPoolExecutor(max_workers=THREADS_PER_CHUNK) as executor:
-                results = list(executor.map(fetch_coin_data, chunk))
-        except RuntimeError as e:
-            if "cannot schedule new futures" in str(e).lower():
-                print("⚠️ Thread creation blocked — falling back to sequential fetching.")
-                send_status_message(Status_TELEGRAM_CHAT_ID, f"⚠️ Fallback: ThreadPool blocked. Using sequential fetch.")
-                results = [fetch_coin_data(coin_id) for coin_id in chunk]  # 🔁 SEQUENTIAL fallback
-            else:
-                raise
-
-        for coin_id, result in zip(chunk, results):
-            if result:
-                all_data.append(result)
-            else:
-                print(f"❌ Failed to fetch: {coin_id}")
-
-        if i < len(chunks):
-            time.sleep(WAIT_BETWEEN_CHUNKS)
+    started = time.monotonic()
+    metrics_before = coingecko_metrics()
+
+    # Unique, valid IDs in portfolio order
+    coin_ids = list(dict.fromkeys(coin_id for coin_id in coin_ids if coin_id))
+
+    # 1️⃣ Bulk snapshot for every coin
+    snapshots = fetch_markets_snapshot(coin_ids)
+
+    # 2️⃣ Per-coin detail only for coins the bulk endpoint did not return
+    missing = [coin_id for coin_id in coin_ids if coin_id not in snapshots]
+    try:
+        results = list(coin_fetch_pool.map(fetch_coin_data, missing))
+    except RuntimeError as e:
+        if "cannot schedule new futures" in str(e).lower():
+            print("⚠️ Thread creation blocked — falling back to sequential fetching.")
+            send_status_message(Status_TELEGRAM_CHAT_ID, f"⚠️ Fallback: ThreadPool blocked. Using sequential fetch.")
+            results = [fetch_coin_data(coin_id) for coin_id in missing]  # 🔁 SEQUENTIAL fallback
+        else:
+            raise
+    snapshots.update({coin_id: result for coin_id, result in zip(missing, results) if result})
+
+    for coin_id in coin_ids:
+        if snapshots.get(coin_id):
+            all_data.append(snapshots[coin_id])
+        else:
+            print(f"❌ Failed to fetch: {coin_id}")
+
+    # Achieved CoinGecko throughput during this refresh (process-wide, all loaders included)
+    elapsed = max(time.monotonic() - started, 1e-6)
+    metrics_after = coingecko_metrics()
+    calls = metrics_after["calls"] - metrics_before["calls"]
+    rate_limited = metrics_after["rate_limited"] - metrics_before["rate_limited"]
+    print(f"📈 Fetched {len(all_data)}/{len(coin_ids)} coins in {elapsed:.1f}s — {calls / elapsed * 60:.1f} requests/min, {rate_limited} rate-limited (429) responses.")
 
     df = pd.DataFrame(all_data)
     df["Return on Investment"] = ((df["Current Price"] - df["All-Time Low Price"]) / df["All-Time Low Price"]) * 100
@@ -142,25 +166,14 @@ def get_specific_coin_data(coin_ids):
 
 
 
-# Tackel Rate-limit 
+# Tackel Rate-limit (through the shared CoinGecko client)
 def fetch_with_backoff(url, params):
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            response = requests.get(url, params=params, headers=HEADERS)
-
-            if response.status_code == 429:
-                wait_time = BASE_DELAY * (2 ** attempt) + random.uniform(0, 1)
-                time.sleep(wait_time)
-                continue
-
-            response.raise_for_status()
-            return response
-
-        except requests.exceptions.RequestException as e:
-            wait_time = BASE_DELAY * (2 ** attempt) + random.uniform(0.5, 2)
-            time.sleep(wait_time)
+    try:
+        response = coingecko_request(url, params=params)
+    except requests.exceptions.RequestException:
+        return None
 
-    return None
+    return response if response.ok else None
 
 # Fetch and Store  
 def fetch_and_store_hourly_data():
@@ -168,7 +181,7 @@ def fetch_and_store_hourly_data():
     for crypto_id in coin_ids:
         # 🔹 Hourly Market Chart Data (interval=hourly)
         try:
-            url_hourly = f"https://api.coingecko.com/api/v3/coins/{crypto_id}/market_chart"
+            url_hourly = f"/coins/{crypto_id}/market_chart"
             params_hourly = {
                 "vs_currency": "usd",
                 "days": "1",
@@ -196,7 +209,7 @@ def fetch_and_store_hourly_data():
 
         # 🔹 OHLC Data (interval=5 min)
         try:
-            url_ohlc = f"https://api.coingecko.com/api/v3/coins/{crypto_id}/ohlc"
+            url_ohlc = f"/coins/{crypto_id}/ohlc"
             params_ohlc = {"vs_currency": "usd", "days": "1"}
 
             response = fetch_with_backoff(url_ohlc, params_ohlc)
@@ -212,53 +225,86 @@ def fetch_and_store_hourly_data():
         except Exception as e:
             send_status_message(Status_TELEGRAM_CHAT_ID, f"⚠️ Error fetching candlestick data for {crypto_id}: {e}")
 
-        # ⏳ Small pause between coins to avoid bursts
-        time.sleep(random.uniform(1.5, 3.0))
+# Convert CoinGecko millisecond timestamps to the IST strings stored in MongoDB
+def to_ist_strings(ms_timestamps):
+    return pd.to_datetime(ms_timestamps, unit="ms").dt.tz_localize("UTC").dt.tz_convert("Asia/Kolkata").dt.strftime("%Y-%m-%d %H:%M:%S")
+
+# Watermark (IST string) -> epoch seconds
+def watermark_to_epoch(watermark):
+    return int(pd.Timestamp(watermark).tz_localize("Asia/Kolkata").timestamp())
+
+# market_chart/range returns 5-minute or hourly points for short ranges; keep only the first
+# point of each UTC day after the watermark's day, so every night appends one point per new
+# day and the series keeps the one-point-per-day shape of the 365 day download
+def to_daily_points(prices_df, watermark):
+    day = prices_df["timestamp"] // 86_400_000
+    new_days = prices_df[day > watermark_to_epoch(watermark) // 86_400]
+    return new_days.groupby(day[new_days.index]).head(1).sort_values("timestamp")
+
+# Nightly yearly refresh. By default only the points newer than each coin's watermark are
+# fetched and appended; a full 365 day re-download runs on YEARLY_FULL_RECONCILE_WEEKDAY,
+# for coins without stored data, or when full_reconcile=True.
+def fetch_and_store_yearly_data(full_reconcile=None):
+    if full_reconcile is None:
+        full_reconcile = datetime.now(ist).weekday() == YEARLY_FULL_RECONCILE_WEEKDAY
 
-def fetch_and_store_yearly_data():
     coin_ids = get_coin_ids()
     for crypto_id in coin_ids:
-        # 🔹 Yearly Market Chart Data for 365 days
+        # 🔹 Yearly Market Chart Data
         try:
-            url_hourly = f"https://api.coingecko.com/api/v3/coins/{crypto_id}/market_chart"
-            params_hourly = {
-                "vs_currency": "usd",
-                "days": "365",  # 1 year
-            }
+            watermark = None if full_reconcile else MarketData_Watermark("Yearly_MarketChartData", crypto_id)
+
+            if watermark is None:
+                # Full 365 days
+                response = fetch_with_backoff(f"/coins/{crypto_id}/market_chart", {"vs_currency": "usd", "days": "365"})
+            else:
+                # Only the missing range since the watermark
+                params_range = {"vs_currency": "usd", "from": watermark_to_epoch(watermark), "to": int(time.time())}
+                response = fetch_with_backoff(f"/coins/{crypto_id}/market_chart/range", params_range)
 
-            response = fetch_with_backoff(url_hourly, params_hourly)
             if response and response.status_code == 200:
                 data = response.json()
-                hourly_df = pd.DataFrame(data["prices"], columns=["timestamp", "price"])
-                hourly_df["timestamp"] = pd.to_datetime(hourly_df["timestamp"], unit="ms").dt.tz_localize("UTC").dt.tz_convert("Asia/Kolkata")
-                hourly_df["timestamp"] = hourly_df["timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S")
+                prices_df = pd.DataFrame(data["prices"], columns=["timestamp", "price"])
 
-                Refresh_Yearly_MarketChartData_Data(hourly_df, crypto_id)
+                if watermark is not None and not prices_df.empty:
+                    prices_df = to_daily_points(prices_df, watermark)
+                prices_df["timestamp"] = to_ist_strings(prices_df["timestamp"])
+
+                if not prices_df.empty:
+                    # A full download replaces the stored series (clears intra-day points of earlier runs)
+                    Refresh_Yearly_MarketChartData_Data(prices_df, crypto_id, replace=watermark is None)
+                else:
+                    print(f"⏭️ Yearly Market Chart Data for '{crypto_id}' is already up to date.")
             else:
                 send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ 1-Year Market Chart Data failed for '{crypto_id}' after retries.")
 
         except Exception as e:
             send_status_message(Status_TELEGRAM_CHAT_ID, f"⚠️ Error fetching 1-Year Market Chart for {crypto_id}: {e}")
         
-        # 🔹 OHLC Data for 365 days
+        # 🔹 Yearly OHLC Data
+        # /ohlc only accepts fixed "days" windows (the range variant is paid-only), so the delta
+        # asks for the smallest window with the same 4-day candles and appends the new ones
         try:
-            url_ohlc = f"https://api.coingecko.com/api/v3/coins/{crypto_id}/ohlc"
-            params_ohlc = {"vs_currency": "usd", "days": "365"}
+            watermark = None if full_reconcile else MarketData_Watermark("Yearly_CandlestickData", crypto_id)
+            delta_days = YEARLY_OHLC_DELTA_DAYS
+            if watermark is not None and time.time() - watermark_to_epoch(watermark) > int(delta_days) * 86400:
+                watermark = None
 
-            response = fetch_with_backoff(url_ohlc, params_ohlc)
+            params_ohlc = {"vs_currency": "usd", "days": "365" if watermark is None else delta_days}
+            response = fetch_with_backoff(f"/coins/{crypto_id}/ohlc", params_ohlc)
             if response and response.status_code == 200:
                 data = response.json()
                 ohlc_df = pd.DataFrame(data, columns=["timestamp", "open", "high", "low", "close"])
-                ohlc_df["timestamp"] = pd.to_datetime(ohlc_df["timestamp"], unit="ms").dt.tz_localize("UTC").dt.tz_convert("Asia/Kolkata")
-                ohlc_df["timestamp"] = ohlc_df["timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S")
-
-                Refresh_Yearly_CandlestickData_Data(ohlc_df, crypto_id)
+                ohlc_df["timestamp"] = to_ist_strings(ohlc_df["timestamp"])
+                if watermark is not None:
+                    ohlc_df = ohlc_df[ohlc_df["timestamp"] > watermark]
+
+                if not ohlc_df.empty:
+                    Refresh_Yearly_CandlestickData_Data(ohlc_df, crypto_id)
+                else:
+                    print(f"⏭️ Yearly OHLC Data for '{crypto_id}' is already up to date.")
             else:
                 send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ 1-Year OHLC data failed for '{crypto_id}' after retries.")
 
         except Exception as e:
             send_status_message(Status_TELEGRAM_CHAT_ID, f"⚠️ Error fetching 1-Year OHLC data for {crypto_id}: {e}")
-        
-        # ⏳ Small pause between coins to avoid bursts
-        time.sleep(random.uniform(1.5, 3.0))  # Prevent rate limit burst
-
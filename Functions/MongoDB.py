@@ -6,9 +6,16 @@ import requests
 import re
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
+from pymongo import UpdateOne, DeleteMany, InsertOne
 import numpy as np
 import sys
+import time
+import threading
+from pymongo.errors import OperationFailure
 from Functions.BlockMindsStatusBot import send_status_message
+from Functions.CoinGecko import coingecko_request
+from Functions.DataCache import DATASET_CACHE_SETTINGS, cached_dataset, invalidate_cache
+from Functions.TimeSeriesStore import BUCKET_WINDOWS, ensure_indexes, write_points, replace_points, read_points, to_store_timestamp, latest_timestamp
 
 # Load environment variables
 load_dotenv()
@@ -49,6 +56,85 @@ if client is None:
     print("Failed to connect to MongoDB. Exiting...")
     sys.exit(1)
 
+# Case-insensitive collation shared by the CoinsList name index and its lookups
+COIN_NAME_COLLATION = {"locale": "en", "strength": 2}
+
+# Create the market data indexes once at startup instead of on every write
+def ensure_market_data_indexes():
+    try:
+        for dataset in BUCKET_WINDOWS:
+            ensure_indexes(client["MarketData"][dataset])
+        client["CryptoCoins"]["CoinsList"].create_index("name", collation=COIN_NAME_COLLATION, name="name_ci")
+        # Portfolio lookups by email (/subscribe) and by Telegram username (/bestcoin)
+        client["CryptoCoins"]["UserPortfolio"].create_index("user_mail", name="user_mail")
+        client["CryptoCoins"]["UserPortfolio"].create_index("telegram_usernames", name="telegram_usernames")
+    except Exception as e:
+        send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error creating market data indexes: {e}")
+
+ensure_market_data_indexes()
+
+# Replace a whole collection without a delete-then-insert gap: the records are written
+# to a staging collection which is then renamed over the live one (dropTarget drops the
+# old generation in the same step), so readers see either the old or the new data
+def swap_in_collection(db, name, records):
+    staging = db[f"{name}_staging"]
+    staging.drop()  # leftovers of an interrupted refresh
+    staging.insert_many(records)
+    staging.rename(name, dropTarget=True)
+
+# Consecutive change stream failures before the watcher gives up, and the longest wait between retries
+CACHE_WATCH_MAX_FAILURES = int(os.getenv("CACHE_WATCH_MAX_FAILURES", "10"))
+CACHE_WATCH_MAX_BACKOFF_SECONDS = int(os.getenv("CACHE_WATCH_MAX_BACKOFF_SECONDS", "60"))
+
+# Change stream error codes: not a replica set, and resume token no longer in the oplog
+CHANGE_STREAM_UNSUPPORTED_CODES = {40573}
+CHANGE_STREAM_HISTORY_LOST_CODES = {280, 286}
+
+# Invalidate cached datasets whenever their collection changes (needs a replica set, e.g. Atlas).
+# The stream is reopened with backoff after errors (elections, network blips) and resumes after
+# the last change it saw. Without change streams the cache still gets invalidated by the writers
+# here and expires by TTL.
+def watch_cache_invalidations():
+    pipeline = [{"$match": {"$or": [
+        {"ns.coll": {"$in": list(DATASET_CACHE_SETTINGS)}},
+        {"to.coll": {"$in": list(DATASET_CACHE_SETTINGS)}},
+    ]}}]
+    resume_token = None
+    failures = 0
+
+    while True:
+        try:
+            with client["CryptoCoins"].watch(pipeline, resume_after=resume_token) as stream:
+                if resume_token is None:
+                    # Anything written before the stream opened may be cached already
+                    invalidate_cache()
+                failures = 0
+                for change in stream:
+                    resume_token = stream.resume_token
+                    invalidate_cache(change.get("ns", {}).get("coll"), change.get("to", {}).get("coll"))
+        except Exception as e:
+            code = e.code if isinstance(e, OperationFailure) else None
+            if isinstance(e, NotImplementedError) or code in CHANGE_STREAM_UNSUPPORTED_CODES:
+                invalidate_cache()
+                print(f"⚠️ Change stream unavailable, cache falls back to TTL expiry: {e}")
+                return
+            if code in CHANGE_STREAM_HISTORY_LOST_CODES:
+                # Changes since the token are gone; a fresh stream starts by invalidating everything
+                resume_token = None
+            print(f"⚠️ Change stream error, retrying: {e}")
+
+        # Reached on errors and on a stream that was closed (e.g. an invalidate event)
+        failures += 1
+        if failures >= CACHE_WATCH_MAX_FAILURES:
+            # Cached results may have missed changes; drop them and rely on writer invalidation and TTL
+            invalidate_cache()
+            send_status_message(Status_TELEGRAM_CHAT_ID, f"⚠️ Cache change stream stopped after {failures} failures, cache falls back to TTL expiry")
+            return
+        time.sleep(min(2 ** failures, CACHE_WATCH_MAX_BACKOFF_SECONDS))
+
+if os.getenv("CACHE_CHANGE_STREAM", "true").lower() == "true":
+    threading.Thread(target=watch_cache_invalidations, daemon=True).start()
+
 
 # -------------------------- Accessing MongoDB Collections -------------------------- #
 
@@ -92,6 +178,36 @@ def CryptoData_Collection():
         print("MongoDB client is None. Cannot access crypto data collection.")
         return None
 
+# Access Payment Orders DB Collection (Razorpay order status store) and return the collection
+def PaymentOrders_Collection():
+    if client:
+        CryptoCoinsdb = client['CryptoCoins']
+        PaymentOrdersCollection = CryptoCoinsdb['PaymentOrders']
+        return PaymentOrdersCollection
+    else:
+        print("MongoDB client is None. Cannot access payment orders collection.")
+        return None
+
+# Access Payment Sessions DB Collection (pending checkout sessions) and return the collection
+def PaymentSessions_Collection():
+    if client:
+        CryptoCoinsdb = client['CryptoCoins']
+        PaymentSessionsCollection = CryptoCoinsdb['PaymentSessions']
+        return PaymentSessionsCollection
+    else:
+        print("MongoDB client is None. Cannot access payment sessions collection.")
+        return None
+
+# Access Sentiment Cache DB Collection (scores keyed by text hash) and return the collection
+def SentimentCache_Collection():
+    if client:
+        CryptoCoinsdb = client['CryptoCoins']
+        SentimentCacheCollection = CryptoCoinsdb['SentimentCache']
+        return SentimentCacheCollection
+    else:
+        print("MongoDB client is None. Cannot access sentiment cache collection.")
+        return None
+
 # Access Price History DB Collection and return the collection
 def PriceHistory_Collection():
     if client:
@@ -101,9 +217,19 @@ def PriceHistory_Collection():
         print("MongoDB client is None. Cannot access price history collection.")
         return None
 
+# Access Market Data (time-series buckets) DB Collection and return the collection
+def MarketData_Collection(dataset):
+    if client:
+        MarketDataDB = client["MarketData"]
+        return MarketDataDB[dataset]
+    else:
+        print("MongoDB client is None. Cannot access market data collection.")
+        return None
+
 # -------------------------- Getting Data from MongoDB -------------------------- # 
 
 # Function to get coin list from MongoDB
+@cached_dataset("CoinsList")
 def CryptoCoinList_Data():
     try:
         if client:
@@ -127,6 +253,7 @@ def CryptoCoinList_Data():
         return {}
 
 # Get User Portfolio Coins DB Collection Data in JSON format
+@cached_dataset("UserPortfolio")
 def UserPortfolio_Data():
     try:
         if client:
@@ -150,6 +277,7 @@ def UserPortfolio_Data():
         return {}
 
 # Get User Meta Data in JSON format
+@cached_dataset("UserMetadata")
 def UserMetadata_Data():
     try:
         if client:
@@ -173,6 +301,7 @@ def UserMetadata_Data():
         return {}
 
 # Get User Portfolio Based Crypto Data Collection Data in JSON format
+@cached_dataset("Analyzed_CryptoCurrency_Data")
 def CryptoCoins_Data():
     try:
         if client:
@@ -202,10 +331,8 @@ def CryptoCoins_Data():
 
 # Fetch and update all coins list in MongoDB
 def fetch_and_store_all_coin_ids():
-    url = "https://api.coingecko.com/api/v3/coins/list"
-
     try:
-        response = requests.get(url)
+        response = coingecko_request("/coins/list")
         response.raise_for_status()
         coins_data = response.json()
 
@@ -223,83 +350,133 @@ def fetch_and_store_all_coin_ids():
 
             # Insert new data
             collection.insert_many(coins_data)
+            invalidate_cache("CoinsList")
             print(f"Inserted {len(coins_data)} new coin documents into MongoDB.")
+
+            # Rebuild the validation and ID indexes from the list we just stored
+            build_coin_list_index(coins_data)
         else:
             print("Collection not accessible.")
 
     except requests.exceptions.RequestException as e:
         print(f"Error fetching coins list from CoinGecko: {e}")
 
-# Get Coin IDs based on Portfolio Assets
-def get_coin_ids():
-    user_df = pd.DataFrame(UserPortfolio_Data())
-    crypto_list_df = pd.DataFrame(CryptoCoinList_Data())
-
-    # Unique coin names and symbols from user portfolio
-    coin_names = user_df['coin_name'].unique().tolist()
-    coin_symbols = user_df['coin_symbol'].unique().tolist()
-
-    coin_ids = []
-
-    # Match symbol and name to find the correct ID from crypto list
-    for symbol, name in zip(coin_symbols, coin_names):
-        match = crypto_list_df[
-            (crypto_list_df['symbol'] == symbol) & 
-            (crypto_list_df['name'] == name)
-        ]
-        if not match.empty:
-            coin_ids.append(match['id'].iloc[0])
-        else:
-            coin_ids.append(None)  # Or handle differently
+# Last resolved portfolio mapping, keyed on the portfolio pairs and the coin index it was joined with
+resolved_portfolio_coins = (None, None, {})
+
+# Resolve the portfolio coins to CoinGecko IDs: { 'bitcoin': ('Bitcoin', 'bitcoin'), ('spx6900', 'spx'): ('SPX6900', None), ... }
+# One hash join of the unique (name, symbol) pairs of the portfolio against coin_id_index, in
+# portfolio order. Matched coins are keyed by their CoinGecko ID and carry the CoinGecko name,
+# unmatched ones are keyed by their (name, symbol) pair and carry the portfolio name with a None
+# ID, so coins sharing a display name stay separate. The result is reused until the portfolio
+# or the coin list changes.
+def resolve_portfolio_coins():
+    global resolved_portfolio_coins
+    portfolio = UserPortfolio_Data()
+    if not isinstance(portfolio, list):
+        return {}
 
-    return coin_ids
+    pairs = {}
+    for asset in portfolio:
+        name, symbol = asset.get("coin_name"), asset.get("coin_symbol")
+        if isinstance(name, str) and isinstance(symbol, str):
+            pairs.setdefault((name.strip().lower(), symbol.strip().lower()), name.strip())
+    pairs_key = tuple(pairs)
 
-# Get Coin Names Based on Portfolio Assets
-def get_coin_names():
-    user_df = pd.DataFrame(UserPortfolio_Data())
-    crypto_list_df = pd.DataFrame(CryptoCoinList_Data())
-
-    # Unique coin names and symbols from user portfolio
-    coin_names = user_df['coin_name'].unique().tolist()
-    coin_symbols = user_df['coin_symbol'].unique().tolist()
-
-    matched_names = []
-
-    # Match by both symbol and name
-    for symbol, name in zip(coin_symbols, coin_names):
-        match = crypto_list_df[
-            (crypto_list_df['symbol'].str.lower() == symbol.lower()) &
-            (crypto_list_df['name'].str.lower() == name.lower())
-        ]
-        if not match.empty:
-            matched_names.append(match['name'].iloc[0])  # Add matched coin name
-        else:
-            matched_names.append(name)  # Use original name if no match found
+    if not coin_id_index:
+        build_coin_list_index()
+
+    cached_pairs, cached_index, mapping = resolved_portfolio_coins
+    if cached_pairs == pairs_key and cached_index is coin_id_index:
+        return mapping
+
+    index = coin_id_index
+    mapping = {}
+    for pair, portfolio_name in pairs.items():
+        coin_id, coin_name = index.get(pair, (None, portfolio_name))
+        mapping.setdefault(coin_id or pair, (coin_name, coin_id))
+
+    resolved_portfolio_coins = (pairs_key, index, mapping)
+    return mapping
 
-    return matched_names
+# Get Coin IDs based on Portfolio Assets (None for coins missing from the coin list)
+def get_coin_ids():
+    return [coin_id for _, coin_id in resolve_portfolio_coins().values()]
+
+# Get Coin Names Based on Portfolio Assets (CoinGecko name when matched, portfolio name otherwise)
+def get_coin_names():
+    return [coin_name for coin_name, _ in resolve_portfolio_coins().values()]
 
 # Insert the Newly Analyzed CryptoData 
 def refersh_analyzed_data(df):
     try:
         if client:
             CryptoDataDB = client["CryptoCoins"]
-            CryptoDataCollection = CryptoDataDB["Analyzed_CryptoCurrency_Data"]
 
             # Replace NaN with None for MongoDB compatibility
             df = df.replace({np.nan: None})
             records = df.to_dict(orient='records')
 
-            if CryptoDataCollection.count_documents({}) > 0:
-                print(Status_TELEGRAM_CHAT_ID, "🗑️ Old Crypto Data found in 'CryptoAnalysis' Collection.So We are going to Delete it.")
-                CryptoDataCollection.delete_many({})
-                
-            print(Status_TELEGRAM_CHAT_ID, "📤 Inserting New Analyzed Crypto Data into 'CryptoAnalysis' collection.")
-            CryptoDataCollection.insert_many(records)
+            if not records:
+                print("⚠️ No Analyzed Crypto Data to upload. Keeping the current 'CryptoAnalysis' collection.")
+                return
+
+            print(Status_TELEGRAM_CHAT_ID, "📤 Swapping New Analyzed Crypto Data into 'CryptoAnalysis' collection.")
+            swap_in_collection(CryptoDataDB, "Analyzed_CryptoCurrency_Data", records)
+            invalidate_cache("Analyzed_CryptoCurrency_Data")
             print(Status_TELEGRAM_CHAT_ID, "✅ MongoDB 'CryptoAnalysis' collection uploaded successfully.")
 
     except Exception as e:
         send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error while uploading to MongoDB: {e}")
 
+# In-memory CoinsList indexes:
+#   coin_symbol_index: lowercased coin name -> set of lowercased symbols (validation)
+#   coin_id_index: (lowercased name, lowercased symbol) -> (CoinGecko id, CoinGecko name) (ID resolution)
+coin_symbol_index = {}
+coin_id_index = {}
+
+# Build both indexes from CoinGecko coin documents (read from CoinsList when none are given)
+def build_coin_list_index(coins=None):
+    global coin_symbol_index, coin_id_index
+    if coins is None:
+        collection = CoinsList_Collection()
+        if collection is None:
+            return coin_symbol_index
+        coins = collection.find({}, {"_id": 0, "id": 1, "name": 1, "symbol": 1})
+
+    symbol_index, id_index = {}, {}
+    for coin in coins:
+        name, symbol = coin.get("name"), coin.get("symbol")
+        if name and symbol:
+            symbol_index.setdefault(name.lower(), set()).add(symbol.lower())
+            # First listing wins, as with the old iloc[0] match
+            id_index.setdefault((name.lower(), symbol.lower()), (coin.get("id"), name))
+
+    # Swap whole dicts so concurrent readers never see a half-built index
+    coin_symbol_index, coin_id_index = symbol_index, id_index
+    return symbol_index
+
+# Symbols listed for a coin name (empty set when the name is unknown)
+def coin_symbols_for_name(coin_name):
+    if coin_symbol_index:
+        return coin_symbol_index.get(coin_name, set())
+
+    # Index not built yet: single lookup served by the case-insensitive name index
+    collection = CoinsList_Collection()
+    if collection is None:
+        return set()
+    return {
+        coin["symbol"].lower()
+        for coin in collection.find({"name": coin_name}, {"_id": 0, "symbol": 1}).collation(COIN_NAME_COLLATION)
+        if coin.get("symbol")
+    }
+
+# Load the CoinsList indexes once at startup (nightly refreshes rebuild them in fetch_and_store_all_coin_ids)
+try:
+    build_coin_list_index()
+except Exception as e:
+    send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error building coin list index: {e}")
+
 # Function to validate crypto symbol and name
 def is_valid_crypto_symbol(symbol, coin_name=None):
     if not symbol or not isinstance(symbol, str):
@@ -309,21 +486,16 @@ def is_valid_crypto_symbol(symbol, coin_name=None):
     coin_name = coin_name.lower().strip() if coin_name and isinstance(coin_name, str) else None
 
     try:
-        CoinsList = CryptoCoinList_Data()
-
-        if not CoinsList:
-            return "local_data_empty"
-
         # Match coin by name
-        name_matched_coins = [coin for coin in CoinsList if coin.get('name', '').lower() == coin_name]
-
-        if not name_matched_coins:
+        symbols = coin_symbols_for_name(coin_name)
+        if not symbols:
+            if not coin_symbol_index and CoinsList_Collection().estimated_document_count() == 0:
+                return "local_data_empty"
             return "name_not_found"
 
         # Check for matching symbol among name-matched coins
-        for coin in name_matched_coins:
-            if coin.get('symbol', '').lower() == symbol:
-                return "valid"
+        if symbol in symbols:
+            return "valid"
 
         return "symbol_mismatch"
 
@@ -390,22 +562,47 @@ def is_user_portfolio_exist(user_mail, coin_name):
 
 # --- Hourly MarketChart and Cabdlestick Data ---
 
+# Capitalize the first letter of each column name (shape expected by Power BI)
+def _capitalize_keys(row):
+    return {(key[0].upper() + key[1:] if key else key): value for key, value in row.items()}
+
+# Stream rows of a market dataset straight from the Mongo cursor.
+# coin_ids, start/end and fields are pushed down into the Mongo filter and projection,
+# batch_size bounds how many buckets are pulled from the server per round-trip.
+def stream_market_data(dataset, coin_ids=None, start=None, end=None, fields=None, batch_size=None):
+    collection = MarketData_Collection(dataset)
+
+    if fields is not None:
+        fields = [field.strip().lower() for field in fields if field and field.strip().lower() not in ("timestamp", "coin_id")]
+
+    rows = read_points(
+        collection,
+        coin_ids=coin_ids,
+        start=to_store_timestamp(start),
+        end=to_store_timestamp(end, end_of_day=True),
+        fields=fields,
+        window=BUCKET_WINDOWS[dataset],
+        batch_size=batch_size
+    )
+    for row in rows:
+        yield _capitalize_keys(row)
+
+# Read all rows of a market dataset from the time-series store
+def _market_data_rows(dataset, coin_ids=None, start=None, end=None, fields=None):
+    return list(stream_market_data(dataset, coin_ids=coin_ids, start=start, end=end, fields=fields))
+
 # Refresh Hourly Candlestick Data
 def Refresh_Hourly_CandlestickData_Data(df, crypto_id):
     try:
         if client:
-            db = client["Hourly_CandlestickData"]
-            collection_name = crypto_id.lower()
-
-            collection = db[collection_name]
-            collection.delete_many({})  # clear previous records
+            collection = MarketData_Collection("Hourly_CandlestickData")
 
-            df["coin_id"] = crypto_id
             df = df.replace({np.nan: None})
             records = df.to_dict(orient="records")
 
-            if records:
-                collection.insert_many(records)
+            # Swap in the new buckets of this coin and drop the stale ones
+            inserted = replace_points(collection, crypto_id, records, BUCKET_WINDOWS["Hourly_CandlestickData"])
+            if inserted:
                 print(f"✅ Hourly Candlestick Data for '{crypto_id}' updated successfully.")
             else:
                 print(f"⚠️ No candlestick data to insert for '{crypto_id}'.")
@@ -414,39 +611,10 @@ def Refresh_Hourly_CandlestickData_Data(df, crypto_id):
         send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error inserting OHLC data for '{crypto_id}': {e}")
 
 # Get Hourly Candlestick Data in JSON format
-def Hourly_CandlestickData_Data():
+def Hourly_CandlestickData_Data(coin_ids=None, start=None, end=None, fields=None):
     try:
         if client:
-            CandlestickDatadb = client['Hourly_CandlestickData']
-
-            # List to hold all DataFrames
-            all_dataframes = []
-
-            # Iterate through all collections
-            for collection_name in CandlestickDatadb.list_collection_names():
-                collection = CandlestickDatadb[collection_name]
-                
-                data = list(collection.find())
-                if not data:
-                    continue  # Skip empty collections
-
-                df = pd.DataFrame(data)
-
-                # Remove MongoDB default _id column
-                if "_id" in df.columns:
-                    df.drop(columns=["_id"], inplace=True)
-
-                # Capitalize the first letter of each column name
-                df.columns = [col[0].upper() + col[1:] if col else col for col in df.columns]
-
-                all_dataframes.append(df)
-
-            # Combine all DataFrames
-            if all_dataframes:
-                final_df = pd.concat(all_dataframes, ignore_index=True)
-                return final_df.to_dict(orient="records")
-            else:
-                return []
+            return _market_data_rows("Hourly_CandlestickData", coin_ids=coin_ids, start=start, end=end, fields=fields)
         else:
             send_status_message(Status_TELEGRAM_CHAT_ID, "MongoDB client is None. Cannot access market chart data.")
             return []
@@ -458,18 +626,14 @@ def Hourly_CandlestickData_Data():
 def Refresh_Hourly_MarketChart_Data(df, crypto_id):
     try:
         if client:
-            db = client["Hourly_MarketChartData"]
-            collection_name = crypto_id.lower()
+            collection = MarketData_Collection("Hourly_MarketChartData")
 
-            collection = db[collection_name]
-            collection.delete_many({})  # clear previous records
-
-            df["coin_id"] = crypto_id
             df = df.replace({np.nan: None})
             records = df.to_dict(orient="records")
 
-            if records:
-                collection.insert_many(records)
+            # Swap in the new buckets of this coin and drop the stale ones
+            inserted = replace_points(collection, crypto_id, records, BUCKET_WINDOWS["Hourly_MarketChartData"])
+            if inserted:
                 print(f"✅ Hourly Market Chart Data for '{crypto_id}' inserted successfully.")
             else:
                 print(f"⚠️ No hourly data to insert for '{crypto_id}'.")
@@ -478,39 +642,10 @@ def Refresh_Hourly_MarketChart_Data(df, crypto_id):
         send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error inserting hourly market chart data for '{crypto_id}': {e}")
 
 # Get Hourly MarketChart Data in JSON format
-def Hourly_MarketChartData_Data():
+def Hourly_MarketChartData_Data(coin_ids=None, start=None, end=None, fields=None):
     try:
         if client:
-            HourlyMarketChartDatadb = client['Hourly_MarketChartData']
-
-            # List to hold all DataFrames
-            all_dataframes = []
-
-            # Iterate through all collections
-            for collection_name in HourlyMarketChartDatadb.list_collection_names():
-                collection = HourlyMarketChartDatadb[collection_name]
-                
-                data = list(collection.find())
-                if not data:
-                    continue  # Skip empty collections
-
-                df = pd.DataFrame(data)
-
-                # Remove MongoDB default _id column
-                if "_id" in df.columns:
-                    df.drop(columns=["_id"], inplace=True)
-
-                # Capitalize the first letter of each column name
-                df.columns = [col[0].upper() + col[1:] if col else col for col in df.columns]
-
-                all_dataframes.append(df)
-
-            # Combine all DataFrames
-            if all_dataframes:
-                final_df = pd.concat(all_dataframes, ignore_index=True)
-                return final_df.to_dict(orient="records")
-            else:
-                return []
+            return _market_data_rows("Hourly_MarketChartData", coin_ids=coin_ids, start=start, end=end, fields=fields)
         else:
             send_status_message(Status_TELEGRAM_CHAT_ID, "MongoDB client is None. Cannot access market chart data.")
             return []
@@ -525,23 +660,13 @@ def Hourly_MarketChartData_Data():
 def Refresh_Yearly_CandlestickData_Data(df, crypto_id):
     try:
         if client:
-            db = client["Yearly_CandlestickData"]
-            collection = db[crypto_id.lower()]
-
-            # Ensure timestamp uniqueness
-            collection.create_index("timestamp", unique=True)
+            collection = MarketData_Collection("Yearly_CandlestickData")
 
-            df["coin_id"] = crypto_id
             df = df.replace({np.nan: None})
             records = df.to_dict(orient="records")
 
             if records:
-                for record in records:
-                    collection.update_one(
-                        {"timestamp": record["timestamp"]},
-                        {"$set": record},
-                        upsert=True
-                    )
+                write_points(collection, crypto_id, records, BUCKET_WINDOWS["Yearly_CandlestickData"])
                 print(f"✅ Yearly Candlestick Data for '{crypto_id}' updated successfully.")
             else:
                 print(f"⚠️ No candlestick data to insert for '{crypto_id}'.")
@@ -550,32 +675,10 @@ def Refresh_Yearly_CandlestickData_Data(df, crypto_id):
         send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error inserting OHLC data for '{crypto_id}': {e}")
 
 # Get Yearly Candlestick Data in JSON format
-def Yearly_CandlestickData_Data():
+def Yearly_CandlestickData_Data(coin_ids=None, start=None, end=None, fields=None):
     try:
         if client:
-            db = client['Yearly_CandlestickData']
-            all_dataframes = []
-
-            for collection_name in db.list_collection_names():
-                collection = db[collection_name]
-                data = list(collection.find())
-
-                if not data:
-                    continue
-
-                df = pd.DataFrame(data)
-
-                if "_id" in df.columns:
-                    df.drop(columns=["_id"], inplace=True)
-
-                df.columns = [col[0].upper() + col[1:] if col else col for col in df.columns]
-                all_dataframes.append(df)
-
-            if all_dataframes:
-                final_df = pd.concat(all_dataframes, ignore_index=True)
-                return final_df.to_dict(orient="records")
-            else:
-                return []
+            return _market_data_rows("Yearly_CandlestickData", coin_ids=coin_ids, start=start, end=end, fields=fields)
         else:
             send_status_message(Status_TELEGRAM_CHAT_ID, "MongoDB client is None. Cannot access Yearly Candlestick data.")
             return []
@@ -584,66 +687,132 @@ def Yearly_CandlestickData_Data():
         return []
 
 # Refresh Yearly MarketChart Data
-def Refresh_Yearly_MarketChartData_Data(df, crypto_id):
+# replace=True swaps in the full 365 day series, dropping points no longer in it; otherwise records are merged in
+def Refresh_Yearly_MarketChartData_Data(df, crypto_id, replace=False):
     try:
         if client:
-            db = client["Yearly_MarketChartData"]
-            collection = db[crypto_id.lower()]
-
-            # Ensure timestamp uniqueness
-            collection.create_index("timestamp", unique=True)
+            collection = MarketData_Collection("Yearly_MarketChartData")
 
-            df["coin_id"] = crypto_id
             df = df.replace({np.nan: None})
             records = df.to_dict(orient="records")
 
-            if records:
-                for record in records:
-                    collection.update_one(
-                        {"timestamp": record["timestamp"]},
-                        {"$set": record},
-                        upsert=True
-                    )
+            if records and replace:
+                replace_points(collection, crypto_id, records, BUCKET_WINDOWS["Yearly_MarketChartData"])
+                print(f"✅ Yearly market chart for '{crypto_id}' replaced successfully.")
+            elif records:
+                write_points(collection, crypto_id, records, BUCKET_WINDOWS["Yearly_MarketChartData"])
                 print(f"✅ Yearly market chart for '{crypto_id}' updated successfully.")
             else:
-                print(f"⚠️ No hourly data to insert for '{crypto_id}'.")
+                print(f"⚠️ No yearly data to insert for '{crypto_id}'.")
 
     except Exception as e:
-        send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error inserting hourly market chart data for '{crypto_id}': {e}")
+        send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error inserting yearly market chart data for '{crypto_id}': {e}")
 
 # Get Yearly MarketChart Data in JSON format
-def Yearly_MarketChartData_Data():
+def Yearly_MarketChartData_Data(coin_ids=None, start=None, end=None, fields=None):
     try:
         if client:
-            db = client['Yearly_MarketChartData']
-            all_dataframes = []
+            return _market_data_rows("Yearly_MarketChartData", coin_ids=coin_ids, start=start, end=end, fields=fields)
+        else:
+            send_status_message(Status_TELEGRAM_CHAT_ID, "MongoDB client is None. Cannot access Yearly Market Chart data.")
+            return []
+    except Exception as e:
+        send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error retrieving Yearly Market Chart data: {e}")
+        return []
 
-            for collection_name in db.list_collection_names():
-                collection = db[collection_name]
-                data = list(collection.find())
+# Last stored timestamp of a coin in a market dataset (watermark for incremental refreshes)
+def MarketData_Watermark(dataset, crypto_id):
+    try:
+        if client:
+            return latest_timestamp(MarketData_Collection(dataset), crypto_id)
+    except Exception as e:
+        send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error reading '{dataset}' watermark for '{crypto_id}': {e}")
+    return None
+
+# Subscribe a Telegram username to every portfolio entry of an email.
+# Returns (portfolio entries of the email, entries the username was newly added to).
+def subscribe_telegram_username(email, username):
+    result = UserPortfolioCoin_Collection().update_many(
+        {"user_mail": email},
+        {"$addToSet": {"telegram_usernames": username}}
+    )
+    if result.modified_count:
+        invalidate_cache("UserPortfolio")
+    return result.matched_count, result.modified_count
+
+# Coin names a Telegram username is subscribed to (served by the telegram_usernames index)
+def telegram_username_coins(username):
+    collection = UserPortfolioCoin_Collection()
+    if collection is None:
+        return []
+    return [doc["coin_name"] for doc in collection.find({"telegram_usernames": username}, {"_id": 0, "coin_name": 1})]
 
-                if not data:
-                    continue
+# Marker documents of one-shot migrations that already ran (CryptoCoins.Migrations)
+def migration_done(name):
+    return client["CryptoCoins"]["Migrations"].find_one({"_id": name}, {"_id": 1}) is not None
 
-                df = pd.DataFrame(data)
+def mark_migration_done(name):
+    client["CryptoCoins"]["Migrations"].update_one(
+        {"_id": name}, {"$setOnInsert": {"done_at": int(time.time())}}, upsert=True
+    )
 
-                if "_id" in df.columns:
-                    df.drop(columns=["_id"], inplace=True)
+# Move the old telegram_username_1, telegram_username_2, ... fields into the indexed telegram_usernames array.
+# Runs once per database: the marker skips the full portfolio scan on every later start.
+def migrate_telegram_usernames():
+    try:
+        collection = UserPortfolioCoin_Collection()
+        if collection is None or migration_done("telegram_usernames_v1"):
+            return
 
-                df.columns = [col[0].upper() + col[1:] if col else col for col in df.columns]
-                all_dataframes.append(df)
+        operations = []
+        for doc in collection.find():
+            fields = [key for key in doc if key.startswith("telegram_username_")]
+            if not fields:
+                continue
+            usernames = [doc[key] for key in fields if doc[key]]
+            operations.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$addToSet": {"telegram_usernames": {"$each": usernames}}, "$unset": {key: "" for key in fields}}
+            ))
+
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+            invalidate_cache("UserPortfolio")
+            print(f"✅ Migrated Telegram usernames of {len(operations)} portfolio entries.")
+        mark_migration_done("telegram_usernames_v1")
 
-            if all_dataframes:
-                final_df = pd.concat(all_dataframes, ignore_index=True)
-                return final_df.to_dict(orient="records")
-            else:
-                return []
-        else:
-            send_status_message(Status_TELEGRAM_CHAT_ID, "MongoDB client is None. Cannot access Yearly Market Chart data.")
-            return []
     except Exception as e:
-        send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error retrieving Yearly Market Chart data: {e}")
-        return []
+        send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error migrating Telegram usernames: {e}")
+
+migrate_telegram_usernames()
+
+# Copy the old one-collection-per-coin market data into the time-series store.
+# Runs once per database at startup, so the readers of the store find the existing history.
+def migrate_legacy_market_data(drop_legacy=False):
+    try:
+        if client and not migration_done("legacy_market_data_v1"):
+            for dataset, window in BUCKET_WINDOWS.items():
+                legacy_db = client[dataset]
+                collection = MarketData_Collection(dataset)
+
+                for collection_name in legacy_db.list_collection_names():
+                    records = list(legacy_db[collection_name].find({}, {"_id": 0}))
+                    if not records:
+                        continue
+
+                    coin_id = records[0].get("coin_id") or collection_name
+                    migrated = write_points(collection, coin_id, records, window)
+                    print(f"✅ Migrated {migrated} '{dataset}' points for '{coin_id}'.")
+
+                    if drop_legacy:
+                        legacy_db.drop_collection(collection_name)
+
+            mark_migration_done("legacy_market_data_v1")
+
+    except Exception as e:
+        send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error migrating legacy market data: {e}")
+
+migrate_legacy_market_data()
 
 
 # --- Reddit Post Data ---
@@ -658,18 +827,22 @@ def refresh_reddit_post_data(df):
             # Replace NaN with None
             df = df.replace({np.nan: None})
             records = df.to_dict(orient='records')
-            
-            # Safely delete only for this coin
-            coin_name = df["coin"].iloc[0].lower()
-            if RedditCollection.count_documents({"coin": coin_name}) > 0:
-                RedditCollection.delete_many({"coin": coin_name})
+            if not records:
+                return
 
-            RedditCollection.insert_many(records)
+            # Replace the posts of every coin in the frame (other coins are kept) with one
+            # ordered bulk write: the delete runs first, then the inserts
+            coin_names = sorted({str(coin).lower() for coin in df["coin"]})
+            operations = [DeleteMany({"coin": {"$in": coin_names}})]
+            operations += [InsertOne(record) for record in records]
+            RedditCollection.bulk_write(operations, ordered=True)
+            invalidate_cache("Reddit_Post_Data")
 
     except Exception as e:
         send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error while uploading Reddit data to MongoDB: {e}")
 
 # Get Reddit Post Data Collection in JSON format
+@cached_dataset("Reddit_Post_Data")
 def Reddit_Post_Data():
     try:
         if client:
@@ -700,21 +873,23 @@ def refresh_crypto_news_data(df):
     try:
         if client:
             NewsDB = client["CryptoCoins"]
-            NewsCollection = NewsDB["Crypto_News_Data"]
 
             # Replace NaN with None
             df = df.replace({np.nan: None})
             records = df.to_dict(orient='records')
 
-            if NewsCollection.count_documents({}) > 0:
-                NewsCollection.delete_many({})
+            if not records:
+                print("⚠️ No News data to upload. Keeping the current 'Crypto_News_Data' collection.")
+                return
 
-            NewsCollection.insert_many(records)
+            swap_in_collection(NewsDB, "Crypto_News_Data", records)
+            invalidate_cache("Crypto_News_Data")
 
     except Exception as e:
         send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error while uploading News data to MongoDB: {e}")
 
 # Get NewsAPI Crypto Data Collection in JSON format
+@cached_dataset("Crypto_News_Data")
 def Crypto_News_Data():
     try:
         if client:
@@ -1,14 +1,17 @@
 import os
 import time
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-import nltk
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
-from textblob import TextBlob
-from Functions.MongoDB import get_coin_ids, get_coin_names
+from Functions.MongoDB import resolve_portfolio_coins
+from Functions.PriceHistory import price_series
+from Functions.RateLimit import limited_get, limiter_for
+from Functions.PriceAlignment import attach_prices
+from Functions.Sentiment import score_texts
 from dateutil import parser
 import pytz
 
@@ -16,7 +19,6 @@ from pymongo import MongoClient  # only if MongoDB is used
 
 # === Load Environment ===
 load_dotenv()
-nltk.download("vader_lexicon")
 
 # === MongoDB Client ===
 client = MongoClient(os.getenv("MONGO_URI"))  # Mongo URI from .env
@@ -32,8 +34,14 @@ newdata_key = os.getenv("NEWSDATA_API_KEY")
 mediastack_key = os.getenv("MEDIASTACK_API_KEY")
 contextual_key = os.getenv("CONTEXTUAL_API_KEY")
 
-# === VADER ===
-sid = SentimentIntensityAnalyzer()
+# === Concurrency ===
+# Coins are processed in parallel, and every provider of a coin is queried at the same time.
+# Per-provider request rates come from RateLimit.HOST_CALLS_PER_MINUTE; each call has a timeout.
+NEWS_COIN_WORKERS = int(os.getenv("NEWS_COIN_WORKERS", "8"))
+NEWS_PROVIDER_WORKERS = int(os.getenv("NEWS_PROVIDER_WORKERS", "16"))
+NEWS_PROVIDER_TIMEOUT = int(os.getenv("NEWS_PROVIDER_TIMEOUT", "10"))
+news_coin_pool = ThreadPoolExecutor(max_workers=NEWS_COIN_WORKERS, thread_name_prefix="news-coin")
+news_provider_pool = ThreadPoolExecutor(max_workers=NEWS_PROVIDER_WORKERS, thread_name_prefix="news-provider")
 
 # === Utility to auto-clean coin names for news search ===
 def build_coin_name_map(coin_ids):
@@ -49,37 +57,27 @@ def build_coin_name_map(coin_ids):
         name_map[coin_id] = readable.lower().strip()
     return name_map
 
-def get_sentiment(text):
-    # VADER Sentiment Analysis
-    scores = sid.polarity_scores(text or "")
-    compound = scores["compound"]
-    vader_sentiment = "positive" if compound > 0.05 else "negative" if compound < -0.05 else "neutral"
-    
-    # TextBlob Sentiment Analysis
-    blob = TextBlob(text)
-    textblob_sentiment = "positive" if blob.sentiment.polarity > 0 else "negative" if blob.sentiment.polarity < 0 else "neutral"
-    
-    # Combine both results for better accuracy (Take the majority sentiment or mixed)
-    final_sentiment = vader_sentiment if vader_sentiment == textblob_sentiment else "mixed"
-    return final_sentiment, compound
-
 # === News Fetchers ===
-def get_newsapi_articles(coin_name, coin, from_date, to_date, min_articles, max_retries=3, delay=1.5):
+def get_newsapi_articles(coin_name, coin, from_date, to_date, min_articles, max_retries=3, delay=1.5, stop=None):
     articles = []
     for key in api_keys:
         attempt = 0
         while attempt < max_retries:
+            # Other providers already delivered enough articles for this coin
+            if stop is not None and stop.is_set():
+                return articles[:min_articles]
             try:
                 url = (
                     f"https://newsapi.org/v2/everything?q={coin}"
                     f"&from={from_date}&to={to_date}&language=en"
                     f"&sortBy=popularity&pageSize=10&apiKey={key}"
                 )
-                res = requests.get(url, timeout=10)
+                res = limited_get(url, timeout=NEWS_PROVIDER_TIMEOUT)
                 data = res.json()
 
                 if res.status_code == 429 or data.get("code") == "rateLimited":
-                    time.sleep(delay * (2 ** attempt))  # exponential backoff
+                    # Hold every NewsAPI call back, not just this one
+                    limiter_for(url).pause(delay * (2 ** attempt))  # exponential backoff
                     attempt += 1
                     continue
 
@@ -105,7 +103,8 @@ def get_newsapi_articles(coin_name, coin, from_date, to_date, min_articles, max_
 
             except requests.exceptions.RequestException as e:
                 print(f"⚠️ NewsAPI network error for {coin}: {e}")
-                time.sleep(delay * (2 ** attempt))
+                if stop is not None and stop.wait(delay * (2 ** attempt)):
+                    break
                 attempt += 1
 
         if len(articles) >= min_articles:
@@ -115,7 +114,7 @@ def get_newsapi_articles(coin_name, coin, from_date, to_date, min_articles, max_
 
 def get_newsdata_articles(coin_name, coin, min_needed):
     url = f"https://newsdata.io/api/1/news?apikey={newdata_key}&q={coin}&language=en&category=business"
-    res = requests.get(url)
+    res = limited_get(url, timeout=NEWS_PROVIDER_TIMEOUT)
     articles = []
     if res.status_code == 200:
         for a in res.json().get("results", []):
@@ -138,7 +137,7 @@ def get_newsdata_articles(coin_name, coin, min_needed):
 
 def get_mediastack_articles(coin_name, coin, min_needed):
     url = f"http://api.mediastack.com/v1/news?access_key={mediastack_key}&keywords={coin}&languages=en"
-    res = requests.get(url)
+    res = limited_get(url, timeout=NEWS_PROVIDER_TIMEOUT)
     articles = []
     if res.status_code == 200:
         for a in res.json().get("data", []):
@@ -166,7 +165,7 @@ def get_contextual_articles(coin_name, coin, min_needed):
         "X-RapidAPI-Key": contextual_key,
         "X-RapidAPI-Host": "contextualwebsearch-websearch-v1.p.rapidapi.com"
     }
-    res = requests.get(url, headers=headers, params=querystring)
+    res = limited_get(url, headers=headers, params=querystring, timeout=NEWS_PROVIDER_TIMEOUT)
     articles = []
     if res.status_code == 200:
         for a in res.json().get("value", []):
@@ -187,155 +186,122 @@ def get_contextual_articles(coin_name, coin, min_needed):
                 break
     return articles
 
-# === All-In-One Fetch + Sentiment + Price ===
-def get_all_news_with_analysis(min_articles=100):
-    today = datetime.today().date()
-    yesterday = today - timedelta(days=1)
-    all_results = []
-
-    # Coin names for news, CoinGecko IDs for price
-    coin_names = get_coin_names()
-    coin_ids = get_coin_ids()
-    coin_map = dict(zip(coin_names, coin_ids))  # { 'Bitcoin': 'bitcoin', 'SPX6900': None, ... }
-
-    for coin in coin_names:
-        search_term = coin.lower().strip()
-
-        # Add "coin" if too short or has digits (to improve search quality)
-        if len(search_term) < 4 or any(char.isdigit() for char in search_term):
-            search_term += " coin"
-
-        articles = []
-        try:
-            articles = get_newsapi_articles(coin_name=coin, coin = search_term, from_date = yesterday, to_date =today, min_articles= min_articles)
-        except Exception as e:
-            print(f"❌ NewsAPI failed for {coin}: {e}")
-
-        if len(articles) < min_articles:
-            try:
-                remaining = min_articles - len(articles)
-                articles += get_newsdata_articles(coin_name=coin, coin=search_term, min_needed=remaining)
-            except Exception as e:
-                print(f"❌ NewsData.io failed: {e}")
-
-        if len(articles) < min_articles:
+# === Parallel provider fan-out ===
+# Query every provider for a coin at once and keep them in priority order (NewsAPI, NewsData,
+# MediaStack, ContextualWeb). Once `min_articles` are in, outstanding calls are cancelled
+# (queued ones never start, NewsAPI stops between keys / retries).
+def fetch_provider_articles(coin, search_term, from_date, to_date, min_articles):
+    stop = threading.Event()
+    providers = [
+        ("NewsAPI", lambda: get_newsapi_articles(coin_name=coin, coin=search_term, from_date=from_date, to_date=to_date, min_articles=min_articles, stop=stop)),
+        ("NewsData.io", lambda: get_newsdata_articles(coin_name=coin, coin=search_term, min_needed=min_articles)),
+        ("MediaStack", lambda: get_mediastack_articles(coin_name=coin, coin=search_term, min_needed=min_articles)),
+        ("ContextualWeb", lambda: get_contextual_articles(coin_name=coin, coin=search_term, min_needed=min_articles)),
+    ]
+    futures = {news_provider_pool.submit(fetch): name for name, fetch in providers}
+    results = {}
+
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = futures[future]
             try:
-                remaining = min_articles - len(articles)
-                articles += get_mediastack_articles(coin_name=coin,coin=search_term, min_needed=remaining)
+                results[name] = future.result()
             except Exception as e:
-                print(f"❌ MediaStack failed: {e}")
+                print(f"❌ {name} failed for {coin}: {e}")
+                results[name] = []
 
-        if len(articles) < min_articles:
-            try:
-                remaining = min_articles - len(articles)
-                articles += get_contextual_articles(coin_name=coin, coin=search_term, min_needed=remaining)
-            except Exception as e:
-                print(f"❌ ContextualWeb failed: {e}")
-
-        # === Clean and enrich articles ===
-        valid_articles = []
-        for article in articles:
-            try:
-                if not article.get("title"):
-                    continue
-                sentiment, score = get_sentiment(article["title"])
-                article["sentiment"] = sentiment
-                article["sentiment_score"] = score
-
-                creator = article.get("creator")
-                if isinstance(creator, list):
-                    article["author"] = creator[0] if creator else None
-                elif isinstance(creator, str):
-                    article["author"] = creator
-                else:
-                    article["author"] = None
-
-                published = article.get("published")
-                dt = parser.parse(published)
-                if dt.tzinfo is None:
-                    dt = pytz.utc.localize(dt)
-                else:
-                    dt = dt.astimezone(pytz.utc)
-
-                article["published_dt"] = dt
-                article["published"] = dt.isoformat()
-                valid_articles.append(article)
-            except Exception as e:
-                print(f"⚠️ Skipping article due to date parse error: {e}")
+        if sum(len(articles) for articles in results.values()) >= min_articles:
+            stop.set()
+            for future in pending:
+                future.cancel()
+            break
 
-        if not valid_articles:
-            continue
+    articles = []
+    for name, _ in providers:
+        articles += results.get(name, [])
+    return articles[:min_articles]
 
-        # === Use valid CoinGecko ID for price fetching ===
-        cg_id = coin_map.get(coin)
-        if not cg_id:
-            for a in valid_articles:
-                a["price_at_news"] = None
-                a["price_6hr_after"] = None
-                a["price_change_pct"] = None
-            all_results.extend(valid_articles)
-            continue
+# === News, sentiment and price impact of one coin ===
+def get_coin_news_with_analysis(coin, cg_id, yesterday, today, min_articles):
+    search_term = coin.lower().strip()
 
-        # === Fetch price range for coin ===
-        timestamps = [a["published_dt"] for a in valid_articles]
-        base_start = int(min(timestamps).timestamp())
-        base_end = int(max(timestamps).timestamp()) + 3600 * 6
+    # Add "coin" if too short or has digits (to improve search quality)
+    if len(search_term) < 4 or any(char.isdigit() for char in search_term):
+        search_term += " coin"
 
-        df = None
-        for attempt in range(5):
-            delta = attempt * 300  # 5 mins per retry
-            start_ts = base_start - delta
-            end_ts = base_end + delta
+    articles = fetch_provider_articles(coin, search_term, yesterday, today, min_articles)
 
-            url = f"https://api.coingecko.com/api/v3/coins/{cg_id}/market_chart/range"
-            params = {"vs_currency": "usd", "from": start_ts, "to": end_ts}
+    # === Clean and enrich articles ===
+    # Every title of the coin is scored in one batch (cached titles are not rescored)
+    articles = [article for article in articles if article.get("title")]
+    sentiments = score_texts([article["title"] for article in articles])
 
-            try:
-                resp = requests.get(url, params=params, timeout=15)
-                data = resp.json()
-                if "prices" in data and data["prices"]:
-                    df = pd.DataFrame(data["prices"], columns=["timestamp", "price"])
-                    df["timestamp"] = df["timestamp"] // 1000
-                    break
-                else:
-                    time.sleep(50)
-            except Exception as e:
-                print(f"❌ API error on attempt {attempt + 1}: {e}")
-                time.sleep(50)
+    valid_articles = []
+    for article, sentiment in zip(articles, sentiments):
+        try:
+            article["sentiment"] = sentiment["label"]
+            article["sentiment_score"] = sentiment["compound"]
+
+            creator = article.get("creator")
+            if isinstance(creator, list):
+                article["author"] = creator[0] if creator else None
+            elif isinstance(creator, str):
+                article["author"] = creator
+            else:
+                article["author"] = None
+
+            published = article.get("published")
+            dt = parser.parse(published)
+            if dt.tzinfo is None:
+                dt = pytz.utc.localize(dt)
+            else:
+                dt = dt.astimezone(pytz.utc)
+
+            article["published_dt"] = dt
+            article["published"] = dt.isoformat()
+            valid_articles.append(article)
+        except Exception as e:
+            print(f"⚠️ Skipping article due to date parse error: {e}")
 
-        if df is None or df.empty:
-            continue
+    if not valid_articles:
+        return []
 
-        # === Assign price to each article ===
-        for article in valid_articles:
-            try:
-                t_news = int(article["published_dt"].timestamp())
-                t_later = t_news + 3600 * 6
+    # === Use valid CoinGecko ID for price fetching ===
+    if not cg_id:
+        return attach_prices(valid_articles, [int(a["published_dt"].timestamp()) for a in valid_articles], None, at_column="price_at_news")
 
-                if not df.empty:
-                    price_now_df = df.iloc[(df["timestamp"] - t_news).abs().argsort()[:1]]
-                    price_later_df = df.iloc[(df["timestamp"] - t_later).abs().argsort()[:1]]
+    # === Price history for the batch (local market data store, CoinGecko only for gaps) ===
+    published = [int(a["published_dt"].timestamp()) for a in valid_articles]
+    df = price_series(cg_id, published)
 
-                    price_now = price_now_df["price"].values[0] if not price_now_df.empty else None
-                    price_later = price_later_df["price"].values[0] if not price_later_df.empty else None
+    if df is None or df.empty:
+        return []
 
-                    pct_change = ((price_later - price_now) / price_now * 100) if price_now and price_later else None
-                else:
-                    price_now, price_later, pct_change = None, None, None
+    # === Assign price to each article (one vectorized pass for the whole batch) ===
+    attach_prices(valid_articles, published, df, at_column="price_at_news")
 
-                article["price_at_news"] = price_now
-                article["price_6hr_after"] = price_later
-                article["price_change_pct"] = pct_change
+    return valid_articles
 
-            except Exception as e:
-                print(f"⚠️ Failed to match price for article: {e}")
-                article["price_at_news"] = None
-                article["price_6hr_after"] = None
-                article["price_change_pct"] = None
+# === All-In-One Fetch + Sentiment + Price ===
+def get_all_news_with_analysis(min_articles=100):
+    today = datetime.today().date()
+    yesterday = today - timedelta(days=1)
+    all_results = []
 
-        all_results.extend(valid_articles)
-        time.sleep(1.2)  # Avoid hitting CoinGecko too fast
+    # Coin names for news, CoinGecko IDs for price
+    coins = list(resolve_portfolio_coins().values())  # [ ('Bitcoin', 'bitcoin'), ('SPX6900', None), ... ]
+
+    # Every coin in parallel: a refresh takes about as long as the slowest coin
+    futures = [
+        news_coin_pool.submit(get_coin_news_with_analysis, coin, cg_id, yesterday, today, min_articles)
+        for coin, cg_id in coins
+    ]
+    for (coin, _), future in zip(coins, futures):
+        try:
+            all_results.extend(future.result())
+        except Exception as e:
+            print(f"❌ News pipeline failed for {coin}: {e}")
 
     return pd.DataFrame(all_results)
-
-
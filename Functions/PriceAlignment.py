@@ -0,0 +1,69 @@
+import os
+import numpy as np
+
+# -------------------------- Nearest-Timestamp Price Alignment -------------------------- #
+#
+# News articles and Reddit posts get the coin price at publish time and N hours later.
+# The price series is sorted once, then every lookup of the batch is a binary search
+# (np.searchsorted) followed by a pick between the two neighbouring points, so a batch
+# of n events against m prices costs O((n + m) log m) instead of one sort per event.
+
+# Hours after publishing to look up, e.g. "1,6,24"; the first horizon feeds `price_change_pct`
+PRICE_HORIZONS = tuple(int(h) for h in os.getenv("PRICE_ALIGNMENT_HORIZONS", "6").split(",") if h.strip())
+
+
+# Index of the price point closest to each query timestamp (ties go to the earlier point)
+def nearest_indices(price_timestamps, query_timestamps):
+    right = np.searchsorted(price_timestamps, query_timestamps, side="left")
+    right = np.clip(right, 0, len(price_timestamps) - 1)
+    left = np.clip(right - 1, 0, len(price_timestamps) - 1)
+
+    use_left = np.abs(query_timestamps - price_timestamps[left]) <= np.abs(price_timestamps[right] - query_timestamps)
+    return np.where(use_left, left, right)
+
+# Price columns for events at `event_timestamps` (epoch seconds) against (timestamp, price) pairs.
+# Returns {column: float array}; NaN where no price or no change can be computed.
+def align_prices(event_timestamps, price_timestamps, prices, at_column="price_at_news", horizons=PRICE_HORIZONS):
+    events = np.asarray(event_timestamps, dtype=np.int64)
+    price_timestamps = np.asarray(price_timestamps, dtype=np.int64)
+    prices = np.asarray(prices, dtype=float)
+
+    if len(price_timestamps) == 0:
+        empty = np.full(len(events), np.nan)
+        columns = {at_column: empty}
+        for n, hours in enumerate(horizons):
+            columns[f"price_{hours}hr_after"] = empty
+            columns["price_change_pct" if n == 0 else f"price_change_pct_{hours}hr"] = empty
+        return columns
+
+    if np.any(price_timestamps[1:] < price_timestamps[:-1]):
+        order = np.argsort(price_timestamps, kind="stable")
+        price_timestamps, prices = price_timestamps[order], prices[order]
+
+    price_now = prices[nearest_indices(price_timestamps, events)]
+    columns = {at_column: price_now}
+
+    for n, hours in enumerate(horizons):
+        price_later = prices[nearest_indices(price_timestamps, events + 3600 * hours)]
+        valid = (price_now != 0) & np.isfinite(price_now) & (price_later != 0) & np.isfinite(price_later)
+        pct_change = np.full(len(events), np.nan)
+        np.divide((price_later - price_now) * 100, price_now, out=pct_change, where=valid)
+
+        columns[f"price_{hours}hr_after"] = price_later
+        columns["price_change_pct" if n == 0 else f"price_change_pct_{hours}hr"] = pct_change
+
+    return columns
+
+# Set the aligned price columns on each record dict (None where there is no value)
+def attach_prices(records, event_timestamps, price_df, at_column="price_at_news", horizons=PRICE_HORIZONS):
+    if price_df is None or price_df.empty:
+        price_timestamps, prices = [], []
+    else:
+        price_timestamps, prices = price_df["timestamp"].to_numpy(), price_df["price"].to_numpy()
+
+    columns = align_prices(event_timestamps, price_timestamps, prices, at_column=at_column, horizons=horizons)
+    for column, values in columns.items():
+        for record, value in zip(records, values.tolist()):
+            record[column] = None if value != value else value  # NaN -> None
+
+    return records
@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from Functions.MongoDB import MarketData_Collection
+from Functions.TimeSeriesStore import BUCKET_WINDOWS, read_points, to_store_timestamp
+from Functions.CoinGecko import coingecko_get
+from Functions.PriceAlignment import PRICE_HORIZONS, nearest_indices
+
+# -------------------------- Local Price History -------------------------- #
+#
+# News and Reddit enrichment need "price of coin c at time t" (and t + 6h). The market
+# chart refreshes already keep that history in the MarketData store:
+#
+#   Hourly_MarketChartData   last 24 hours, 5 minute points (rewritten every cycle)
+#   Yearly_MarketChartData   last 365 days, one point per day
+#
+# A lookup time is covered when a point of either store lies within that store's
+# PRICE_HISTORY_MAX_GAP_SECONDS. Only the span of the uncovered lookup times is requested
+# from CoinGecko (market_chart/range), at most once per call.
+
+# Stores searched for price points, finest resolution first
+PRICE_HISTORY_DATASETS = ("Hourly_MarketChartData", "Yearly_MarketChartData")
+
+# Largest distance (seconds) between a lookup time and the stored point answering it, per
+# store: about one point spacing, so the daily yearly series covers the older lookups
+PRICE_HISTORY_MAX_GAP_SECONDS = {
+    "Hourly_MarketChartData": int(os.getenv("PRICE_HISTORY_HOURLY_MAX_GAP_SECONDS", "3600")),
+    "Yearly_MarketChartData": int(os.getenv("PRICE_HISTORY_YEARLY_MAX_GAP_SECONDS", "86400")),
+}
+
+# Margin (seconds) around the uncovered span requested from CoinGecko; one hour matches the
+# resolution market_chart/range returns for a few days of data
+PRICE_HISTORY_API_MARGIN_SECONDS = 3600
+
+price_history_lock = threading.Lock()
+price_history_counters = {"lookups": 0, "served_from_store": 0, "api_calls": 0, "api_errors": 0}
+
+
+# Stored (epoch seconds, price) points of one coin near the lookup times (epoch seconds),
+# one frame per store sorted by time; each store is read up to its own max gap around them
+def stored_prices(coin_id, lookups):
+    frames = {}
+    for dataset in PRICE_HISTORY_DATASETS:
+        collection = MarketData_Collection(dataset)
+        if collection is None:
+            continue
+
+        gap = PRICE_HISTORY_MAX_GAP_SECONDS[dataset]
+        rows = list(read_points(
+            collection,
+            coin_ids=[coin_id],
+            start=to_store_timestamp(int(lookups.min()) - gap),
+            end=to_store_timestamp(int(lookups.max()) + gap),
+            fields=["price"],
+            window=BUCKET_WINDOWS[dataset]
+        ))
+        if not rows:
+            continue
+
+        df = pd.DataFrame(rows, columns=["timestamp", "price"]).dropna(subset=["price"])
+        ist_times = pd.to_datetime(df["timestamp"]).dt.tz_localize("Asia/Kolkata")
+        df["timestamp"] = (ist_times - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)
+        frames[dataset] = df.sort_values("timestamp").reset_index(drop=True)
+
+    return frames
+
+# CoinGecko market_chart/range points between two epoch times; an empty range is widened and retried
+def api_prices(coin_id, start_ts, end_ts, attempts=5):
+    for attempt in range(attempts):
+        delta = attempt * 300  # 5 mins per retry
+        params = {"vs_currency": "usd", "from": start_ts - delta, "to": end_ts + delta}
+
+        with price_history_lock:
+            price_history_counters["api_calls"] += 1
+        try:
+            data = coingecko_get(f"/coins/{coin_id}/market_chart/range", params=params)
+        except Exception as e:
+            print(f"❌ Price history API error for {coin_id}: {e}")
+            with price_history_lock:
+                price_history_counters["api_errors"] += 1
+            break
+
+        if data and data.get("prices"):
+            df = pd.DataFrame(data["prices"], columns=["timestamp", "price"])
+            df["timestamp"] = df["timestamp"] // 1000
+            return df
+
+    return pd.DataFrame(columns=["timestamp", "price"])
+
+# Price points (epoch seconds, price) of `coin_id` able to price events at `event_timestamps`
+# and every horizon after them: from the local store first, CoinGecko for what it does not cover
+def price_series(coin_id, event_timestamps, horizons=PRICE_HORIZONS):
+    events = np.asarray(event_timestamps, dtype=np.int64)
+    if len(events) == 0:
+        return pd.DataFrame(columns=["timestamp", "price"])
+    lookups = np.concatenate([events] + [events + 3600 * hours for hours in horizons])
+
+    # Nobody has prices from the future (e.g. "6 hours after" a post from this morning)
+    lookups = np.minimum(lookups, int(time.time()))
+
+    frames = stored_prices(coin_id, lookups)
+    covered = np.zeros(len(lookups), dtype=bool)
+    for dataset, stored in frames.items():
+        stored_ts = stored["timestamp"].to_numpy(dtype=np.int64)
+        if len(stored_ts):
+            nearest = stored_ts[nearest_indices(stored_ts, lookups)]
+            covered |= np.abs(nearest - lookups) <= PRICE_HISTORY_MAX_GAP_SECONDS[dataset]
+    uncovered = lookups[~covered]
+
+    if frames:
+        df = pd.concat(frames.values()).drop_duplicates(subset="timestamp").sort_values("timestamp").reset_index(drop=True)
+    else:
+        df = pd.DataFrame(columns=["timestamp", "price"])
+
+    with price_history_lock:
+        price_history_counters["lookups"] += len(lookups)
+        price_history_counters["served_from_store"] += len(lookups) - len(uncovered)
+
+    if len(uncovered):
+        margin = PRICE_HISTORY_API_MARGIN_SECONDS
+        fetched = api_prices(coin_id, int(uncovered.min()) - margin, int(uncovered.max()) + margin)
+        if not fetched.empty:
+            df = pd.concat([df, fetched]).drop_duplicates(subset="timestamp").sort_values("timestamp").reset_index(drop=True)
+
+    return df
+
+# Lookup counters: how many were answered by the local store and how many API calls were still needed
+def price_history_metrics():
+    with price_history_lock:
+        return dict(price_history_counters)
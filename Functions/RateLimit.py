@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables (read below at import time, before any importer loads them)
+load_dotenv()
+
+# Requests per minute allowed per API host (free tier limits, override through .env)
+HOST_CALLS_PER_MINUTE = {
+    "api.coingecko.com": int(os.getenv("COINGECKO_CALLS_PER_MINUTE", "30")),
+    "pro-api.coingecko.com": int(os.getenv("COINGECKO_CALLS_PER_MINUTE", "500")),
+    "api.dexscreener.com": int(os.getenv("DEXSCREENER_CALLS_PER_MINUTE", "300")),
+    "min-api.cryptocompare.com": int(os.getenv("CRYPTOCOMPARE_CALLS_PER_MINUTE", "600")),
+    "newsapi.org": int(os.getenv("NEWSAPI_CALLS_PER_MINUTE", "30")),
+    "newsdata.io": int(os.getenv("NEWSDATA_CALLS_PER_MINUTE", "30")),
+    "api.mediastack.com": int(os.getenv("MEDIASTACK_CALLS_PER_MINUTE", "30")),
+    "contextualwebsearch-websearch-v1.p.rapidapi.com": int(os.getenv("CONTEXTUALWEB_CALLS_PER_MINUTE", "60")),
+}
+DEFAULT_CALLS_PER_MINUTE = 60
+
+# Default timeout for rate limited requests (seconds)
+REQUEST_TIMEOUT = 15
+
+
+# Thread-safe token bucket: `rate` tokens per second, bursts of up to `capacity`
+class TokenBucket:
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    # Stop handing out tokens for `seconds` (e.g. a Retry-After from the server)
+    def pause(self, seconds):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+    # Block until a token is available; returns the seconds spent waiting
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                else:
+                    # Tokens only refill once a pause is over
+                    self.tokens = min(self.capacity, self.tokens + (now - max(self.updated, self.blocked_until)) * self.rate)
+                    self.updated = now
+
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+
+                    wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+            waited += wait
+
+    # Build a bucket that never exceeds `calls_per_minute` in any 60 second window
+    @classmethod
+    def per_minute(cls, calls_per_minute):
+        burst = max(1, calls_per_minute // 10)
+        return cls(rate=max(calls_per_minute - burst, 1) / 60, capacity=burst)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+# Shared limiter for the host of a URL (one bucket per host for the whole process)
+def limiter_for(url):
+    host = urlparse(url).netloc or url
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = TokenBucket.per_minute(HOST_CALLS_PER_MINUTE.get(host, DEFAULT_CALLS_PER_MINUTE))
+        return _limiters[host]
+
+# requests.get that waits for its host's token first
+def limited_get(url, **kwargs):
+    limiter_for(url).acquire()
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    return requests.get(url, **kwargs)
@@ -1,8 +1,12 @@
 import os
 import razorpay
+import threading
 import time
 import requests
 from requests.auth import HTTPBasicAuth
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from Functions.MongoDB import PaymentOrders_Collection
 
 # 🔐 Razorpay credentials
 RAZORPAY_KEY = os.getenv('RAZORPAY_KEY')
@@ -11,9 +15,32 @@ RAZORPAY_SECRET = os.getenv('RAZORPAY_SECRET')
 if not RAZORPAY_KEY or not RAZORPAY_SECRET:
     raise ValueError("Razorpay credentials are missing. Set RAZORPAY_KEY and RAZORPAY_SECRET.")
 
+# Secret configured for the Razorpay webhook (Dashboard → Settings → Webhooks)
+RAZORPAY_WEBHOOK_SECRET = os.getenv('RAZORPAY_WEBHOOK_SECRET')
+
 # Initialize Razorpay client (ensure these are set properly in your app)
 razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY, RAZORPAY_SECRET))
 
+# Longest a status request is held open before answering "pending" (seconds)
+PAYMENT_LONG_POLL_SECONDS = int(os.getenv("PAYMENT_LONG_POLL_SECONDS", "25"))
+
+# How often a waiting request re-reads the order store (seconds); webhooks handled by
+# this process wake waiters immediately, the re-read picks up other workers' webhooks
+PAYMENT_STORE_POLL_SECONDS = 1
+
+# Ask Razorpay directly at most this often per order, in case a webhook was missed (seconds)
+PAYMENT_RECONCILE_SECONDS = int(os.getenv("PAYMENT_RECONCILE_SECONDS", "30"))
+
+# Webhook event -> order status
+PAYMENT_EVENT_STATUS = {
+    "payment.captured": "paid",
+    "order.paid": "paid",
+    "payment.failed": "failed",
+}
+
+# Woken whenever this process records a status change
+payment_status_changed = threading.Condition()
+
 # Function to get Razorpay balance
 def get_razorpay_balance():
     url = "https://api.razorpay.com/v1/balance"
@@ -29,123 +56,189 @@ def get_razorpay_balance():
         print("Failed to fetch balance:", response.status_code, response.text)
         return None
 
-# Function to check payment status for a given order ID
-def check_payment_status(order_id: str, timeout_minutes: int = 20, poll_interval: int = 5) -> dict:
-    import time
-
-    max_wait_seconds = timeout_minutes * 60
-    waited = 0
+# Payment method specific details of a Razorpay payment entity (amounts in INR)
+def payment_method_details(payment):
+    status = payment.get('status')
+    method = payment.get('method')
+
+    # Raw values in paise
+    amount_paise = payment.get("amount", 0) or 0
+    fee_paise = payment.get("fee", 0) or 0
+    tax_paise = payment.get("tax", 0) or 0
+
+    # Convert to INR
+    amount_inr = round(amount_paise / 100, 2)
+    fee_inr = round(fee_paise / 100, 2)
+    tax_inr = round(tax_paise / 100, 2)
+
+    # Method-specific fields
+    method_details = {
+        "method": method,
+        "email": payment.get("email"),
+        "contact": payment.get("contact"),
+        "amount": amount_inr,
+        "razorpay_fee": fee_inr,
+        "gst": tax_inr,
+        "total_fee": fee_inr,  # Razorpay fee includes GST
+        "status": status
+    }
+
+    # Extract payment method specific data
+    if method == "upi":
+        method_details["vpa"] = payment.get("vpa")
+        method_details["upi_transaction_id"] = payment.get("acquirer_data", {}).get("upi_transaction_id")
+
+    elif method == "card":
+        method_details["card_id"] = payment.get("card_id")
+        card = payment.get("card", {})
+        method_details["card_details"] = {
+            "last4": card.get("last4"),
+            "network": card.get("network"),
+            "type": card.get("type"),
+            "issuer": card.get("issuer"),
+            "international": card.get("international"),
+        }
 
+    elif method == "netbanking":
+        method_details["bank"] = payment.get("bank")
+
+    elif method == "wallet":
+        method_details["wallet"] = payment.get("wallet")
+
+    elif method == "emi":
+        method_details["emi_plan"] = payment.get("emi_plan")
+        method_details["emi_duration"] = payment.get("emi_duration")
+
+    elif method == "bank_transfer":
+        method_details["bank_reference"] = payment.get("acquirer_data", {}).get("bank_transaction_id")
+
+    elif method == "paylater":
+        method_details["provider"] = payment.get("provider")
+
+    elif method == "cardless_emi":
+        method_details["provider"] = payment.get("provider")
+
+    elif method == "cod":
+        method_details["description"] = "Cash on Delivery – manually collected"
+
+    return method_details
+
+# Status response for an order, in the shape /check-payment-status returns
+def payment_result(order_id, status, payment=None):
+    messages = {
+        "paid": "Payment successful.",
+        "failed": "Payment failed.",
+        "pending": "No payment activity yet.",
+    }
+    result = {
+        "success": True,
+        "status": status,
+        "message": messages.get(status, status),
+        "payment_id": payment.get('id') if payment else None,
+        "order_id": order_id
+    }
+    if payment:
+        result["payment_details"] = payment_method_details(payment)
+    return result
+
+# Record the status of an order. A paid order is final: late "failed" events of an
+# earlier attempt never overwrite it.
+def record_payment_status(order_id, status, payment=None, **fields):
+    result = payment_result(order_id, status, payment)
+    update = {"$set": {**fields, "status": status, "result": result, "updated_at": int(time.time())}}
     try:
-        while waited < max_wait_seconds:
-            try:
-                payments = razorpay_client.order.payments(order_id)
-            except Exception as fetch_err:
-                return {
-                    "success": False,
-                    "status": "error",
-                    "message": f"Error fetching payment details: {str(fetch_err)}",
-                    "payment_id": None,
-                    "order_id": order_id
-                }
-
-            for payment in payments.get('items', []):
-                status = payment.get('status')
-                payment_id = payment.get('id')
-                method = payment.get('method')
-
-                # Raw values in paise
-                amount_paise = payment.get("amount", 0) or 0
-                fee_paise = payment.get("fee", 0) or 0
-                tax_paise = payment.get("tax", 0) or 0
-
-                # Convert to INR
-                amount_inr = round(amount_paise / 100, 2)
-                fee_inr = round(fee_paise / 100, 2)
-                tax_inr = round(tax_paise / 100, 2)
-
-                # Method-specific fields
-                method_details = {
-                    "method": method,
-                    "email": payment.get("email"),
-                    "contact": payment.get("contact"),
-                    "amount": amount_inr,
-                    "razorpay_fee": fee_inr,
-                    "gst": tax_inr,
-                    "total_fee": fee_inr,  # Razorpay fee includes GST
-                    "status": status
-                }
-
-                # Extract payment method specific data
-                if method == "upi":
-                    method_details["vpa"] = payment.get("vpa")
-                    method_details["upi_transaction_id"] = payment.get("acquirer_data", {}).get("upi_transaction_id")
-
-                elif method == "card":
-                    method_details["card_id"] = payment.get("card_id")
-                    card = payment.get("card", {})
-                    method_details["card_details"] = {
-                        "last4": card.get("last4"),
-                        "network": card.get("network"),
-                        "type": card.get("type"),
-                        "issuer": card.get("issuer"),
-                        "international": card.get("international"),
-                    }
-
-                elif method == "netbanking":
-                    method_details["bank"] = payment.get("bank")
-
-                elif method == "wallet":
-                    method_details["wallet"] = payment.get("wallet")
-
-                elif method == "emi":
-                    method_details["emi_plan"] = payment.get("emi_plan")
-                    method_details["emi_duration"] = payment.get("emi_duration")
+        PaymentOrders_Collection().update_one({"_id": order_id, "status": {"$ne": "paid"}}, update, upsert=True)
+    except DuplicateKeyError:
+        pass  # already paid
+
+    with payment_status_changed:
+        payment_status_changed.notify_all()
+
+# Mark a paid order as fulfilled; True only for the first caller, so the portfolio entry
+# of an order is saved once even when the client asks for its status repeatedly
+def claim_payment_fulfilment(order_id):
+    order = PaymentOrders_Collection().find_one_and_update(
+        {"_id": order_id, "status": "paid", "fulfilled_at": {"$exists": False}},
+        {"$set": {"fulfilled_at": int(time.time())}},
+        return_document=ReturnDocument.AFTER
+    )
+    return order is not None
+
+# Undo a claim whose portfolio entry could not be saved, so the next status check fulfils the order again
+def release_payment_fulfilment(order_id):
+    PaymentOrders_Collection().update_one({"_id": order_id}, {"$unset": {"fulfilled_at": ""}})
+
+# Remember a newly created order so status requests can find it
+def register_payment_order(order_id, **fields):
+    record_payment_status(order_id, "pending", created_at=int(time.time()), **fields)
+
+# Verify the X-Razorpay-Signature of a webhook body
+def verify_webhook_signature(body, signature):
+    if not RAZORPAY_WEBHOOK_SECRET or not signature:
+        return False
+    try:
+        razorpay_client.utility.verify_webhook_signature(body, signature, RAZORPAY_WEBHOOK_SECRET)
+        return True
+    except razorpay.errors.SignatureVerificationError:
+        return False
+
+# Apply a verified webhook event to the order store; returns the order ID it updated (or None)
+def handle_payment_webhook(event):
+    status = PAYMENT_EVENT_STATUS.get(event.get("event"))
+    payload = event.get("payload", {})
+    payment = payload.get("payment", {}).get("entity", {})
+    order_id = payment.get("order_id") or payload.get("order", {}).get("entity", {}).get("id")
+
+    if not status or not order_id:
+        return None
 
-                elif method == "bank_transfer":
-                    method_details["bank_reference"] = payment.get("acquirer_data", {}).get("bank_transaction_id")
+    record_payment_status(order_id, status, payment or None)
+    return order_id
 
-                elif method == "paylater":
-                    method_details["provider"] = payment.get("provider")
+# Ask Razorpay for the payments of an order once and record the outcome
+def reconcile_payment_status(order_id):
+    payments = razorpay_client.order.payments(order_id)
+    items = payments.get('items', [])
 
-                elif method == "cardless_emi":
-                    method_details["provider"] = payment.get("provider")
+    for status in ("captured", "failed"):
+        for payment in items:
+            if payment.get('status') == status:
+                record_payment_status(order_id, "paid" if status == "captured" else "failed", payment)
+                return
+    PaymentOrders_Collection().update_one({"_id": order_id}, {"$set": {"reconciled_at": int(time.time())}}, upsert=True)
 
-                elif method == "cod":
-                    method_details["description"] = "Cash on Delivery – manually collected"
+# Long-poll the order store: returns as soon as the order is paid or failed, or with
+# status "pending" after `timeout_seconds` so the caller can simply ask again
+def wait_for_payment_status(order_id, timeout_seconds=PAYMENT_LONG_POLL_SECONDS):
+    deadline = time.monotonic() + timeout_seconds
 
-                # Final status responses
-                if status == 'captured':
+    try:
+        while True:
+            order = PaymentOrders_Collection().find_one({"_id": order_id}) or {}
+            if order.get("status") in ("paid", "failed"):
+                return order["result"]
+
+            # Webhook fallback: check with Razorpay when we have not done so recently
+            last_checked = max(order.get("reconciled_at", 0), order.get("updated_at", 0))
+            if time.time() - last_checked >= PAYMENT_RECONCILE_SECONDS:
+                try:
+                    reconcile_payment_status(order_id)
+                    continue
+                except Exception as fetch_err:
                     return {
-                        "success": True,
-                        "status": "paid",
-                        "message": "Payment successful.",
-                        "payment_id": payment_id,
-                        "order_id": order_id,
-                        "payment_details": method_details
+                        "success": False,
+                        "status": "error",
+                        "message": f"Error fetching payment details: {str(fetch_err)}",
+                        "payment_id": None,
+                        "order_id": order_id
                     }
 
-                elif status == 'failed':
-                    return {
-                        "success": True,
-                        "status": "failed",
-                        "message": "Payment failed.",
-                        "payment_id": payment_id,
-                        "order_id": order_id,
-                        "payment_details": method_details
-                    }
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return payment_result(order_id, "pending")
 
-            # Sleep before polling again
-            time.sleep(poll_interval)
-            waited += poll_interval
-
-        return {
-            "success": True,
-            "status": "timeout",
-            "message": "No payment activity within the timeout window.",
-            "payment_id": None,
-            "order_id": order_id
-        }
+            with payment_status_changed:
+                payment_status_changed.wait(min(PAYMENT_STORE_POLL_SECONDS, remaining))
 
     except Exception as e:
         return {
@@ -155,4 +248,3 @@ def check_payment_status(order_id: str, timeout_minutes: int = 20, poll_interval
             "payment_id": None,
             "order_id": order_id
         }
-
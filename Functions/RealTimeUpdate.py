@@ -4,6 +4,8 @@ import os
 import pandas as pd
 import pytz
 from Functions.MongoDB import connect_to_mongo  # Import the connect_to_mongo function
+from Functions.CoinGecko import coingecko_request
+from Functions.TimeSeriesStore import BUCKET_WINDOWS, has_points, write_points
 
 # Timezone
 ist = pytz.timezone("Asia/Kolkata")
@@ -24,16 +26,15 @@ def fetch_and_store_data(coin_id):
     try:
         print(f"Fetching data for coin: {coin_id}")
         
-        # MongoDB collections
-        yearly_market_chart_collection = client['Yearly_MarketChartData'][coin_id.lower()]
-        hourly_market_chart_collection = client['Hourly_MarketChartData'][coin_id.lower()]
-        yearly_candlestick_data_collection = client['Yearly_CandlestickData'][coin_id.lower()]
-        hourly_candlestick_data_collection = client['Hourly_CandlestickData'][coin_id.lower()]
+        # MongoDB collections (time-series buckets shared by all coins)
+        yearly_market_chart_collection = client['MarketData']['Yearly_MarketChartData']
+        hourly_market_chart_collection = client['MarketData']['Hourly_MarketChartData']
+        yearly_candlestick_data_collection = client['MarketData']['Yearly_CandlestickData']
+        hourly_candlestick_data_collection = client['MarketData']['Hourly_CandlestickData']
         
         # --- Fetch Yearly MarketChart Data ---
-        url_yearly = f"https://api.coingecko.com/api/v3/coins/{coin_id}/market_chart"
         params_yearly = {"vs_currency": "usd", "days": "365"}  # 365 days for yearly data
-        response_yearly = requests.get(url_yearly, params=params_yearly)
+        response_yearly = coingecko_request(f"/coins/{coin_id}/market_chart", params=params_yearly)
 
         if response_yearly.status_code == 200:
             data_yearly = response_yearly.json()
@@ -43,13 +44,10 @@ def fetch_and_store_data(coin_id):
 
             # Insert Yearly MarketChart Data into MongoDB
             if yearly_market_chart_collection is not None:  # Check if the collection exists
-                existing_data_yearly = yearly_market_chart_collection.find({"coin_id": coin_id})
-                
-                # Use len(list(cursor)) to count documents
-                if len(list(existing_data_yearly)) == 0:
-                    df_yearly["coin_id"] = coin_id
+                # Only seed the store when this coin has no points yet
+                if not has_points(yearly_market_chart_collection, coin_id):
                     records_yearly = df_yearly.to_dict(orient="records")
-                    yearly_market_chart_collection.insert_many(records_yearly)
+                    write_points(yearly_market_chart_collection, coin_id, records_yearly, BUCKET_WINDOWS["Yearly_MarketChartData"])
                     print(f"✅ Yearly MarketChart Data for '{coin_id}' inserted successfully.")
                 else:
                     print(f"⚠️ Yearly MarketChart Data for '{coin_id}' already exists.")
@@ -57,9 +55,8 @@ def fetch_and_store_data(coin_id):
             print(f"❌ Failed to fetch Yearly MarketChart data for '{coin_id}' with status code: {response_yearly.status_code}")
 
         # --- Fetch Hourly MarketChart Data ---
-        url_hourly = f"https://api.coingecko.com/api/v3/coins/{coin_id}/market_chart"
         params_hourly = {"vs_currency": "usd", "days": "1"}  # 1 day for hourly data
-        response_hourly = requests.get(url_hourly, params=params_hourly)
+        response_hourly = coingecko_request(f"/coins/{coin_id}/market_chart", params=params_hourly)
 
         if response_hourly.status_code == 200:
             data_hourly = response_hourly.json()
@@ -73,13 +70,10 @@ def fetch_and_store_data(coin_id):
 
             # Insert Hourly MarketChart Data into MongoDB
             if hourly_market_chart_collection is not None:  # Check if the collection exists
-                existing_data_hourly = hourly_market_chart_collection.find({"coin_id": coin_id})
-                
-                # Use len(list(cursor)) to count documents
-                if len(list(existing_data_hourly)) == 0:
-                    df_hourly["coin_id"] = coin_id
+                # Only seed the store when this coin has no points yet
+                if not has_points(hourly_market_chart_collection, coin_id):
                     records_hourly = df_hourly.to_dict(orient="records")
-                    hourly_market_chart_collection.insert_many(records_hourly)
+                    write_points(hourly_market_chart_collection, coin_id, records_hourly, BUCKET_WINDOWS["Hourly_MarketChartData"])
                     print(f"✅ Hourly MarketChart Data for '{coin_id}' inserted successfully.")
                 else:
                     print(f"⚠️ Hourly MarketChart Data for '{coin_id}' already exists.")
@@ -87,9 +81,8 @@ def fetch_and_store_data(coin_id):
             print(f"❌ Failed to fetch Hourly MarketChart data for '{coin_id}' with status code: {response_hourly.status_code}")
 
         # --- Fetch Yearly OHLC Data ---
-        url_yearly_ohlc = f"https://api.coingecko.com/api/v3/coins/{coin_id}/ohlc"
         params_yearly_ohlc = {"vs_currency": "usd", "days": "365"}  # 365 days for yearly OHLC data
-        response_yearly_ohlc = requests.get(url_yearly_ohlc, params=params_yearly_ohlc)
+        response_yearly_ohlc = coingecko_request(f"/coins/{coin_id}/ohlc", params=params_yearly_ohlc)
 
         if response_yearly_ohlc.status_code == 200:
             data_yearly_ohlc = response_yearly_ohlc.json()
@@ -99,13 +92,10 @@ def fetch_and_store_data(coin_id):
             
             # Insert Yearly OHLC Data into MongoDB
             if yearly_candlestick_data_collection is not None:  # Check if the collection exists
-                existing_data_yearly_ohlc = yearly_candlestick_data_collection.find({"coin_id": coin_id})
-                
-                # Use len(list(cursor)) to count documents
-                if len(list(existing_data_yearly_ohlc)) == 0:
-                    df_yearly_ohlc["coin_id"] = coin_id
+                # Only seed the store when this coin has no points yet
+                if not has_points(yearly_candlestick_data_collection, coin_id):
                     records_yearly_ohlc = df_yearly_ohlc.to_dict(orient="records")
-                    yearly_candlestick_data_collection.insert_many(records_yearly_ohlc)
+                    write_points(yearly_candlestick_data_collection, coin_id, records_yearly_ohlc, BUCKET_WINDOWS["Yearly_CandlestickData"])
                     print(f"✅ Yearly OHLC Data for '{coin_id}' inserted successfully.")
                 else:
                     print(f"⚠️ Yearly OHLC Data for '{coin_id}' already exists.")
@@ -113,9 +103,8 @@ def fetch_and_store_data(coin_id):
             print(f"❌ Failed to fetch Yearly OHLC data for '{coin_id}' with status code: {response_yearly_ohlc.status_code}")
 
         # --- Fetch Hourly OHLC Data ---
-        url_hourly_ohlc = f"https://api.coingecko.com/api/v3/coins/{coin_id}/ohlc"
         params_hourly_ohlc = {"vs_currency": "usd", "days": "1"}  # 1 day for hourly OHLC data
-        response_hourly_ohlc = requests.get(url_hourly_ohlc, params=params_hourly_ohlc)
+        response_hourly_ohlc = coingecko_request(f"/coins/{coin_id}/ohlc", params=params_hourly_ohlc)
 
         if response_hourly_ohlc.status_code == 200:
             data_hourly_ohlc = response_hourly_ohlc.json()
@@ -125,13 +114,10 @@ def fetch_and_store_data(coin_id):
             
             # Insert Hourly OHLC Data into MongoDB
             if hourly_candlestick_data_collection is not None:  # Check if the collection exists
-                existing_data_hourly_ohlc = hourly_candlestick_data_collection.find({"coin_id": coin_id})
-                
-                # Use len(list(cursor)) to count documents
-                if len(list(existing_data_hourly_ohlc)) == 0:
-                    df_hourly_ohlc["coin_id"] = coin_id
+                # Only seed the store when this coin has no points yet
+                if not has_points(hourly_candlestick_data_collection, coin_id):
                     records_hourly_ohlc = df_hourly_ohlc.to_dict(orient="records")
-                    hourly_candlestick_data_collection.insert_many(records_hourly_ohlc)
+                    write_points(hourly_candlestick_data_collection, coin_id, records_hourly_ohlc, BUCKET_WINDOWS["Hourly_CandlestickData"])
                     print(f"✅ Hourly OHLC Data for '{coin_id}' inserted successfully.")
                 else:
                     print(f"⚠️ Hourly OHLC Data for '{coin_id}' already exists.")
@@ -0,0 +1,353 @@
+import os
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+import praw
+from Functions.BlockMindsStatusBot import send_status_message
+from Functions.RateLimit import TokenBucket
+from Functions.Sentiment import score_texts
+from Functions.PriceAlignment import attach_prices
+
+# -------------------------- Reddit Sentiment Collection -------------------------- #
+#
+# Analysis() collects Reddit posts for every portfolio coin in one stage:
+#
+#   1. fetch    coins in parallel (REDDIT_WORKERS), every search page paced by one shared
+#               limiter so the whole stage stays within Reddit's API rate limit
+#   2. score    all titles of all coins in a single Sentiment.score_texts batch
+#   3. summarize metrics and per-post rows (with prices) per coin, in parallel
+#   4. write    every coin's posts through one bulk write at the end
+#
+# Pricing and the write are passed in (PriceHistory.price_series and
+# MongoDB.refresh_reddit_post_data in the app), so the stage also runs without MongoDB.
+#
+# Fixture mode makes runs replayable without network:
+#   REDDIT_FIXTURE_MODE=record   live searches are also saved to REDDIT_FIXTURE_DIR/<coin>.json
+#   REDDIT_FIXTURE_MODE=replay   searches are answered from those files (REDDIT_FIXTURE_LATENCY
+#                                seconds per page simulates the network, the limiter still applies)
+
+# Status TELEGRAM CHAT I'D
+Status_TELEGRAM_CHAT_ID = os.getenv("Status_TELEGRAM_CHAT_ID")
+
+# Subreddits searched for coin posts
+REDDIT_SUBREDDITS = "cryptocurrency+CryptoMarkets"
+
+# Coins fetched at the same time
+REDDIT_WORKERS = int(os.getenv("REDDIT_WORKERS", "4"))
+
+# Search requests per minute across all workers (Reddit allows 100 per minute per OAuth client)
+REDDIT_CALLS_PER_MINUTE = int(os.getenv("REDDIT_CALLS_PER_MINUTE", "60"))
+
+REDDIT_FIXTURE_MODE = os.getenv("REDDIT_FIXTURE_MODE", "").lower()
+REDDIT_FIXTURE_DIR = os.getenv("REDDIT_FIXTURE_DIR", "Fixtures/Reddit")
+REDDIT_FIXTURE_LATENCY = float(os.getenv("REDDIT_FIXTURE_LATENCY", "0"))
+
+# Post attributes kept in fixtures (everything the summary and the post rows read)
+FIXTURE_FIELDS = ("id", "title", "score", "num_comments", "created_utc", "permalink", "url", "selftext", "thumbnail", "preview")
+
+reddit_limiter = TokenBucket.per_minute(REDDIT_CALLS_PER_MINUTE)
+reddit_pool = ThreadPoolExecutor(max_workers=REDDIT_WORKERS, thread_name_prefix="reddit")
+reddit_local = threading.local()
+
+
+# PRAW is not thread safe, so every worker thread gets its own Reddit instance
+def reddit_client():
+    if not hasattr(reddit_local, "client"):
+        reddit_local.client = praw.Reddit(
+            client_id = "XQaZSF7aFd169cXHuQs4uA",
+            client_secret = "NCF7iHpFDgkSpwYOESMVRlcrHRx3_Q",
+            user_agent = "meme-coin-sentiment"
+        )
+    return reddit_local.client
+
+# Fixture file of a coin
+def fixture_path(query):
+    return os.path.join(REDDIT_FIXTURE_DIR, re.sub(r"[^a-z0-9]+", "-", query.lower()).strip("-") + ".json")
+
+# Save fetched posts as plain dicts; only attributes already loaded are read (no lazy PRAW fetches)
+def record_reddit_posts(query, posts):
+    records = []
+    for post in posts:
+        loaded = vars(post)
+        record = {field: loaded[field] for field in FIXTURE_FIELDS if field in loaded}
+        record["author"] = str(post.author)
+        record["subreddit"] = str(post.subreddit)
+        records.append(record)
+
+    os.makedirs(REDDIT_FIXTURE_DIR, exist_ok=True)
+    with open(fixture_path(query), "w", encoding="utf-8") as f:
+        json.dump(records, f)
+
+# Posts of a coin from its fixture file, paged and paced like live searches
+def replay_reddit_posts(query, total_posts=500, batch_size=100):
+    try:
+        with open(fixture_path(query), encoding="utf-8") as f:
+            records = json.load(f)[:total_posts]
+    except FileNotFoundError:
+        records = []
+
+    for _ in range(0, len(records), batch_size):
+        reddit_limiter.acquire()
+        time.sleep(REDDIT_FIXTURE_LATENCY)
+    return [SimpleNamespace(**record) for record in records]
+
+# Search up to `total_posts` posts about a coin
+def fetch_reddit_posts(query, total_posts=500, batch_size=100):
+    if REDDIT_FIXTURE_MODE == "replay":
+        return replay_reddit_posts(query, total_posts, batch_size)
+
+    posts = []
+    after = None
+    fetched_posts = 0
+
+    while fetched_posts < total_posts:
+        reddit_limiter.acquire()
+        search_results = reddit_client().subreddit(REDDIT_SUBREDDITS).search(
+            query, limit=batch_size, params={'after': after}
+        )
+        batch_posts = list(search_results)
+
+        if not batch_posts:
+            break
+
+        posts.extend(batch_posts)
+        fetched_posts += len(batch_posts)
+        after = batch_posts[-1].id
+
+        if len(batch_posts) < batch_size:
+            break
+
+    if REDDIT_FIXTURE_MODE == "record":
+        record_reddit_posts(query, posts)
+    return posts
+
+def prepare_reddit_post_df(posts, query, sentiments=None, price_lookup=None, coin_id=None):
+    records = []
+
+    # Post timestamps to price
+    timestamps = [datetime.utcfromtimestamp(p.created_utc) for p in posts]
+    if not timestamps:
+        return pd.DataFrame()
+
+    # Price history from `price_lookup(coin_id, timestamps)` (PriceHistory.price_series in the app),
+    # looked up by CoinGecko ID; coins without one get no prices
+    posted = [int(t.timestamp()) for t in timestamps]
+    price_df = price_lookup(coin_id, posted) if price_lookup and coin_id else None
+
+    # Scores computed by the caller are reused, otherwise the titles are scored as one batch
+    if sentiments is None:
+        sentiments = score_texts([post.title for post in posts])
+
+    # Loop through posts and collect data
+    for post, sentiment in zip(posts, sentiments):
+        compound = sentiment['compound']
+
+        t_post = datetime.utcfromtimestamp(post.created_utc)
+
+        records.append({
+            "coin": query.lower(),
+            "title": post.title,
+            "created_utc": t_post.isoformat(),
+            "permalink": f"https://www.reddit.com{post.permalink}",
+            "author": str(post.author),
+            "subreddit": str(post.subreddit),
+            "url": post.url,
+            "upvotes": post.score,
+            "comments": post.num_comments,
+            "sentiment_score": compound,
+        })
+
+    # Price at post time and after each horizon, for all posts in one pass
+    attach_prices(records, posted, price_df, at_column="price_at_post")
+
+    return pd.DataFrame(records)
+
+# Aggregated sentiment & engagement metrics of one coin's posts, plus the per-post DataFrame
+def summarize_reddit_posts(query, posts, sentiments, price_lookup=None, coin_id=None):
+    # For most upvoted post (full metadata)
+    top_post_data = {
+        "title": "",
+        "score": 0,
+        "num_comments": 0,
+        "created_utc": "",
+        "permalink": "",
+        "author": "",
+        "subreddit": "",
+        "url": "",
+        "selftext": "",
+        "sentiment_score": 0,
+        "image_url": ""
+    }
+
+    created_times = []
+
+    # Aggregation variables
+    sentiment_score = 0
+    total_upvotes = 0
+    total_comments = 0
+    post_volumes = 0
+    sentiment_trends = []
+    positive_mentions = 0
+    neutral_mentions = 0
+    negative_mentions = 0
+
+    for post, sentiment in zip(posts, sentiments):
+        compound = sentiment['compound']
+        sentiment_score += compound
+        sentiment_trends.append(compound)
+
+        upvotes = post.score
+        comments = post.num_comments
+        total_upvotes += upvotes
+        total_comments += comments
+        post_volumes += 1
+
+        # Save the most upvoted post with full metadata
+        if upvotes > top_post_data["score"]:
+            # Try to extract image URL
+            image_url = ""
+            if post.url.lower().endswith((".jpg", ".jpeg", ".png", ".gif")):
+                image_url = post.url
+            elif hasattr(post, "preview"):
+                try:
+                    image_url = post.preview["images"][0]["source"]["url"].replace("&amp;", "&")
+                except:
+                    image_url = ""
+            elif hasattr(post, "thumbnail") and post.thumbnail.startswith("http"):
+                image_url = post.thumbnail
+
+            top_post_data = {
+                "title": post.title,
+                "score": upvotes,
+                "num_comments": comments,
+                "created_utc": datetime.utcfromtimestamp(post.created_utc).strftime("%Y-%m-%d %H:%M:%S"),
+                "permalink": f"https://www.reddit.com{post.permalink}",
+                "author": str(post.author),
+                "subreddit": str(post.subreddit),
+                "url": post.url,
+                "selftext": post.selftext[:500] if hasattr(post, "selftext") else "",
+                "sentiment_score": compound,
+                "image_url": image_url
+            }
+
+        # Sentiment breakdown
+        if compound >= 0.05:
+            positive_mentions += 1
+        elif compound <= -0.05:
+            negative_mentions += 1
+        else:
+            neutral_mentions += 1
+
+        # Mention date tracking
+        if hasattr(post, "created_utc"):
+            created_times.append(datetime.utcfromtimestamp(post.created_utc))
+
+    # Basic metrics
+    count = max(post_volumes, 1)
+    avg_sentiment = sentiment_score / count
+    avg_upvotes = total_upvotes / count
+    avg_comments = total_comments / count
+    sentiment_trend = np.mean(sentiment_trends) if sentiment_trends else 0
+    engagement_rate = (total_upvotes + total_comments) / count
+    positive_pct = positive_mentions / count
+    negative_pct = negative_mentions / count
+
+    # Mentions per day
+    if created_times:
+        days_range = max((max(created_times) - min(created_times)).days, 1)
+        mentions_per_day = post_volumes / days_range
+    else:
+        mentions_per_day = 0
+
+    # Trending logic
+    trending = "Yes" if sentiment_trend > 0.2 or engagement_rate > 10 else "No"
+    
+    # Return the aggregated metrics
+    metrics = {
+        # Base metrics
+        "Avg Sentiment": avg_sentiment,
+        "Post Volume": post_volumes,
+        "Avg Upvotes": avg_upvotes,
+        "Avg Comments": avg_comments,
+        "Sentiment Trend": sentiment_trend,
+        "Positive Mentions": positive_mentions,
+        "Neutral Mentions": neutral_mentions,
+        "Negative Mentions": negative_mentions,
+
+        # Engagement & trend insights
+        "Engagement Rate": engagement_rate,
+        "Positive %": positive_pct,
+        "Negative %": negative_pct,
+        "Mentions per Day": mentions_per_day,
+        "Trending": trending,
+
+        # Top post metadata
+        "Top Post Title": top_post_data["title"],
+        "Top Post Upvotes": top_post_data["score"],
+        "Top Post Comments": top_post_data["num_comments"],
+        "Top Post Date": top_post_data["created_utc"],
+        "Top Post Link": top_post_data["permalink"],
+        "Top Post Author": top_post_data["author"],
+        "Top Post Subreddit": top_post_data["subreddit"],
+        "Top Post URL": top_post_data["url"],
+        "Top Post Body": top_post_data["selftext"],
+        "Top Post Sentiment": top_post_data["sentiment_score"],
+        "Top Post Image URL": top_post_data["image_url"]
+    }
+
+    # Prepare DataFrame from posts
+    return metrics, prepare_reddit_post_df(posts, query, sentiments, price_lookup, coin_id)
+
+# Reddit metrics for every (coin name, CoinGecko ID) pair: {(name, id): metrics}. Posts are
+# searched by name and priced by ID; the posts of all coins are written with one
+# `write_posts(df)` call at the end.
+def collect_reddit_sentiment(coins, price_lookup=None, write_posts=None, total_posts=500):
+    coins = list(dict.fromkeys(coins))
+    coin_names = list(dict.fromkeys(coin_name for coin_name, _ in coins))
+
+    # 1. Fetch every coin concurrently; the shared limiter paces the search requests
+    fetches = {coin: reddit_pool.submit(fetch_reddit_posts, coin, total_posts) for coin in coin_names}
+    posts = {}
+    for coin, future in fetches.items():
+        try:
+            posts[coin] = future.result()
+        except Exception as e:
+            send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error fetching Reddit posts for {coin}: {e}")
+            posts[coin] = []
+
+    # 2. One sentiment batch for all titles, split back per coin
+    scores = score_texts([post.title for coin in coin_names for post in posts[coin]])
+    sentiments = {}
+    offset = 0
+    for coin in coin_names:
+        sentiments[coin] = scores[offset:offset + len(posts[coin])]
+        offset += len(posts[coin])
+
+    # 3. Metrics and priced post rows per coin
+    summaries = {
+        (coin, coin_id): reddit_pool.submit(summarize_reddit_posts, coin, posts[coin], sentiments[coin], price_lookup, coin_id)
+        for coin, coin_id in coins
+    }
+    metrics = {}
+    frames = []
+    for (coin, coin_id), future in summaries.items():
+        try:
+            metrics[(coin, coin_id)], post_df = future.result()
+        except Exception as e:
+            # One coin failing must not abort the analysis; it reports no Reddit activity
+            send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error summarizing Reddit posts for {coin}: {e}")
+            metrics[(coin, coin_id)], post_df = summarize_reddit_posts(coin, [], [])
+        if not post_df.empty:
+            frames.append(post_df)
+
+    # 4. One write for all coins
+    if write_posts and frames:
+        write_posts(pd.concat(frames, ignore_index=True))
+
+    return metrics
@@ -0,0 +1,179 @@
+import os
+import hashlib
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import nltk
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+from textblob import TextBlob
+from pymongo import UpdateOne
+
+# -------------------------- Sentiment Engine -------------------------- #
+#
+# One scorer for news titles and Reddit posts. Texts are scored in batches:
+#
+#   1. in-process LRU keyed by a hash of the text
+#   2. optional MongoDB cache (SENTIMENT_CACHE_BACKEND=mongo), shared by every worker and run
+#   3. VADER + TextBlob for the rest, on a process pool when the batch is large
+#
+# A score is {"compound": VADER compound, "polarity": TextBlob polarity, "label": ...};
+# the label is the VADER / TextBlob agreement used by the news pipeline.
+
+nltk.download("vader_lexicon", quiet=True)
+
+# Bump when the scoring changes so cached scores of the old scorer are not reused
+SENTIMENT_MODEL_VERSION = "vader+textblob-1"
+
+# Scores kept in memory (least recently used are evicted)
+SENTIMENT_CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", "50000"))
+
+# "memory" or "mongo" (memory plus a persistent cache collection)
+SENTIMENT_CACHE_BACKEND = os.getenv("SENTIMENT_CACHE_BACKEND", "memory").lower()
+
+# Days a persisted score is kept before MongoDB's TTL monitor removes it
+SENTIMENT_CACHE_TTL_DAYS = int(os.getenv("SENTIMENT_CACHE_TTL_DAYS", "30"))
+
+# Uncached texts needed before scoring moves to the process pool, and its size
+SENTIMENT_PROCESS_THRESHOLD = int(os.getenv("SENTIMENT_PROCESS_THRESHOLD", "2000"))
+SENTIMENT_PROCESS_WORKERS = int(os.getenv("SENTIMENT_PROCESS_WORKERS", str(os.cpu_count() or 2)))
+
+sentiment_cache = OrderedDict()  # text hash -> score
+sentiment_lock = threading.Lock()
+sentiment_counters = {"texts": 0, "memory_hits": 0, "mongo_hits": 0, "scored": 0, "process_batches": 0}
+sentiment_pool = None
+sentiment_collection = None
+_analyzer = None
+
+
+# Cache key of a text (includes the scorer version)
+def text_hash(text):
+    return hashlib.sha1(f"{SENTIMENT_MODEL_VERSION}\0{text}".encode("utf-8")).hexdigest()
+
+# Build the VADER analyzer once per process (also the process pool's worker initializer)
+def init_sentiment_worker():
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = SentimentIntensityAnalyzer()
+
+# Score texts in this process (also the process pool's task, so it stays module level)
+def score_uncached(texts):
+    init_sentiment_worker()
+
+    scores = []
+    for text in texts:
+        compound = _analyzer.polarity_scores(text)["compound"]
+        vader_sentiment = "positive" if compound > 0.05 else "negative" if compound < -0.05 else "neutral"
+
+        polarity = TextBlob(text).sentiment.polarity
+        textblob_sentiment = "positive" if polarity > 0 else "negative" if polarity < 0 else "neutral"
+
+        # Combine both results for better accuracy (Take the majority sentiment or mixed)
+        label = vader_sentiment if vader_sentiment == textblob_sentiment else "mixed"
+        scores.append({"compound": compound, "polarity": polarity, "label": label})
+    return scores
+
+# Score texts, spreading large batches over the process pool
+def score_batch(texts):
+    global sentiment_pool
+    if len(texts) < SENTIMENT_PROCESS_THRESHOLD or SENTIMENT_PROCESS_WORKERS < 2:
+        return score_uncached(texts)
+
+    try:
+        with sentiment_lock:
+            if sentiment_pool is None:
+                # Spawned, not forked: forking the threaded Flask/bot process can copy locks
+                # held by other threads (Mongo client, logging, sentiment_lock) into the workers
+                sentiment_pool = ProcessPoolExecutor(
+                    max_workers=SENTIMENT_PROCESS_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_sentiment_worker
+                )
+            sentiment_counters["process_batches"] += 1
+
+        chunk = -(-len(texts) // SENTIMENT_PROCESS_WORKERS)
+        scores = []
+        for part in sentiment_pool.map(score_uncached, [texts[i:i + chunk] for i in range(0, len(texts), chunk)]):
+            scores.extend(part)
+        return scores
+    except Exception as e:
+        print(f"⚠️ Sentiment process pool failed, scoring in-process: {e}")
+        with sentiment_lock:
+            sentiment_pool = None
+        return score_uncached(texts)
+
+# Persistent cache collection (None when the Mongo backend is off or unavailable)
+def sentiment_cache_collection():
+    global sentiment_collection
+    if SENTIMENT_CACHE_BACKEND != "mongo":
+        return None
+    if sentiment_collection is None:
+        # Imported here so process pool workers do not open a MongoDB connection on import
+        from Functions.MongoDB import SentimentCache_Collection
+        collection = SentimentCache_Collection()
+        if collection is not None:
+            collection.create_index("scored_at", expireAfterSeconds=SENTIMENT_CACHE_TTL_DAYS * 86400, name="scored_at_ttl")
+        sentiment_collection = collection
+    return sentiment_collection
+
+# Score a batch of texts; returns one score dict per text, in order
+def score_texts(texts):
+    texts = [text or "" for text in texts]
+    hashes = [text_hash(text) for text in texts]
+    scores = {}
+
+    # 1. Memory
+    with sentiment_lock:
+        sentiment_counters["texts"] += len(texts)
+        for key in hashes:
+            if key in sentiment_cache:
+                sentiment_cache.move_to_end(key)
+                scores[key] = sentiment_cache[key]
+        sentiment_counters["memory_hits"] += sum(1 for key in hashes if key in scores)
+
+    # Each distinct uncached text is scored once, however often it repeats in the batch
+    missing = {key: text for key, text in zip(hashes, texts) if key not in scores}
+
+    # 2. Persistent cache
+    collection = sentiment_cache_collection() if missing else None
+    found = {}
+    if collection is not None:
+        try:
+            for doc in collection.find({"_id": {"$in": list(missing)}}, {"score": 1}):
+                found[doc["_id"]] = doc["score"]
+        except Exception as e:
+            print(f"⚠️ Sentiment cache lookup failed: {e}")
+        for key in found:
+            del missing[key]
+
+    # 3. Score the rest
+    scored = dict(zip(missing, score_batch(list(missing.values())))) if missing else {}
+
+    if collection is not None and scored:
+        now = datetime.now(timezone.utc)
+        try:
+            collection.bulk_write([
+                UpdateOne({"_id": key}, {"$setOnInsert": {"score": score, "scored_at": now}}, upsert=True)
+                for key, score in scored.items()
+            ], ordered=False)
+        except Exception as e:
+            print(f"⚠️ Sentiment cache write failed: {e}")
+
+    with sentiment_lock:
+        sentiment_counters["mongo_hits"] += len(found)
+        sentiment_counters["scored"] += len(scored)
+        for key, score in {**found, **scored}.items():
+            sentiment_cache[key] = score
+            sentiment_cache.move_to_end(key)
+        while len(sentiment_cache) > SENTIMENT_CACHE_SIZE:
+            sentiment_cache.popitem(last=False)
+
+    scores.update(found)
+    scores.update(scored)
+    return [scores[key] for key in hashes]
+
+# Hit / scored counters of the engine
+def sentiment_metrics():
+    with sentiment_lock:
+        return {**sentiment_counters, "cached": len(sentiment_cache), "backend": SENTIMENT_CACHE_BACKEND}
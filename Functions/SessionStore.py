@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+# -------------------------- Pending Payment Session Store -------------------------- #
+#
+# Short-lived sessions keyed by an ID (e.g. the pending payment of "<email>_<mobile>").
+# Both backends expose put / get / delete with O(1) lookups and drop expired sessions:
+#
+#   MemorySessionStore  one process only, bounded LRU with per-entry TTL
+#   MongoSessionStore   shared by every gunicorn worker, survives restarts; a TTL index
+#                       on `expires_at` lets MongoDB delete expired sessions
+
+
+# In-process backend: least recently used sessions are evicted past `max_entries`
+class MemorySessionStore:
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.sessions = OrderedDict()  # key -> (expires_at epoch seconds, session)
+        self.lock = threading.Lock()
+
+    def put(self, key, session, ttl):
+        with self.lock:
+            self.sessions[key] = (time.time() + ttl, session)
+            self.sessions.move_to_end(key)
+            while len(self.sessions) > self.max_entries:
+                self.sessions.popitem(last=False)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.sessions.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self.sessions[key]
+                return None
+            self.sessions.move_to_end(key)
+            return entry[1]
+
+    def delete(self, key):
+        with self.lock:
+            self.sessions.pop(key, None)
+
+
+# MongoDB backend: one document per session, `_id` is the session key
+class MongoSessionStore:
+    def __init__(self, collection):
+        self.collection = collection
+        # Expired documents are removed by MongoDB's TTL monitor (runs about once a minute)
+        self.collection.create_index("expires_at", expireAfterSeconds=0, name="expires_at_ttl")
+
+    def put(self, key, session, ttl):
+        expires_at = datetime.fromtimestamp(time.time() + ttl, tz=timezone.utc)
+        self.collection.replace_one({"_id": key}, {"session": session, "expires_at": expires_at}, upsert=True)
+
+    def get(self, key):
+        # The TTL monitor is lazy, so filter on expiry as well
+        doc = self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}})
+        return doc["session"] if doc else None
+
+    def delete(self, key):
+        self.collection.delete_one({"_id": key})
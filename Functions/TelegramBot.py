@@ -3,8 +3,9 @@ import requests
 import google.generativeai as genai
 from dotenv import load_dotenv
 import pandas as pd
+import threading
 from Functions.GeminiAI import AI_Generated_Answer
-from Functions.MongoDB import CryptoCoins_Data, UserPortfolio_Data
+from Functions.MongoDB import CryptoCoins_Data, UserPortfolio_Data, telegram_username_coins
 import time
 start_time = time.time()
 
@@ -64,98 +65,139 @@ def format_large_number(num):
     else:
         return str(num)  # No conversion needed for small numbers
 
-def Coin_Updates(username):
-    messages = []  # To store messages for all rows
-    
-    # Get the current USD to INR exchange rate
-    url = "https://open.er-api.com/v6/latest/USD"
-    response = requests.get(url)
-
-    if response.status_code == 200:
-        usd = response.json()
-        usd_to_inr = usd.get('rates', {}).get('INR', None)
-        if usd_to_inr is None:
-            raise ValueError("INR exchange rate not found in API response.")
-    else:
-        raise ConnectionError(f"Failed to fetch exchange rates. Status code: {response.status_code}")
+# How long a fetched USD→INR rate is reused (seconds)
+FX_RATE_TTL = int(os.getenv("FX_RATE_TTL", "3600"))
 
-        messages = []
+# Cached USD→INR rate, refreshed when older than FX_RATE_TTL
+fx_rate = {"usd_to_inr": None, "fetched_at": 0}
 
-    try:
-        user_data = UserPortfolio_Data()
-        if not user_data:
-            return "⚠️ No user portfolio data found."
+# /bestcoin snapshots: telegram username -> ready-to-send coin update message
+coin_update_snapshots = {}
+coin_update_messages = {}  # coin name -> formatted message
+coin_update_snapshots_lock = threading.Lock()
+coin_update_snapshots_stale = True
 
-        # ✅ Step A: Find all fields like 'telegram_username_1', 'telegram_username_2', etc.
-        username_columns = [col for col in user_df.columns if col.startswith('telegram_username')]
+# Get the current USD to INR exchange rate (cached; a failed refresh keeps the last known rate)
+def get_usd_to_inr():
+    if fx_rate["usd_to_inr"] is not None and time.time() - fx_rate["fetched_at"] < FX_RATE_TTL:
+        return fx_rate["usd_to_inr"]
 
-        # ✅ Step B: Filter rows where the username exists in any of those columns
-        mask = user_df[username_columns].apply(lambda row: username in row.values, axis=1)
-        user_df = user_df[mask]
-
-        # ✅ Step C: Handle case when no matching username is found
-        if user_df.empty:
-            return f"⚠️ No coin data found for username: {username}"
-
-
-        coin_list = user_df['coin_name'].to_list()
+    try:
+        url = "https://open.er-api.com/v6/latest/USD"
+        response = requests.get(url, timeout=15)
+
+        if response.status_code == 200:
+            usd = response.json()
+            usd_to_inr = usd.get('rates', {}).get('INR', None)
+            if usd_to_inr is None:
+                raise ValueError("INR exchange rate not found in API response.")
+            fx_rate.update(usd_to_inr=usd_to_inr, fetched_at=time.time())
+        else:
+            raise ConnectionError(f"Failed to fetch exchange rates. Status code: {response.status_code}")
+    except Exception:
+        if fx_rate["usd_to_inr"] is None:
+            raise
+    return fx_rate["usd_to_inr"]
+
+# Index: telegram username -> coin names of the portfolio entries it subscribed to
+def build_username_index(user_data):
+    index = {}
+    for asset in user_data:
+        for username in asset.get('telegram_usernames') or []:
+            index.setdefault(username, []).append(asset.get('coin_name'))
+    return index
+
+# Join coin names with the formatted coin messages of the last rebuild
+def compose_coin_updates(coin_list):
+    messages = [coin_update_messages[coin] for coin in dict.fromkeys(coin_list) if coin in coin_update_messages]
+    return '\n'.join(messages) if messages else "⚠️ No matching coins found in analyzed crypto data."
+
+# Coin update message of one analyzed coin (prices converted to INR)
+def format_coin_update(row, usd_to_inr):
+    coin_name = row.get("Coin Name", "N/A")
+    current_price = row.get("Current Price", 0)
+    market_cap = row.get("Market Cap", 0)
+    rank = row.get("Market Cap Rank", "N/A")
+    high_price = row.get("24h High Price", 0)
+    low_price = row.get("24h Low Price", 0)
+    price_change = row.get("24h Price Change", 0)
+    price_change_percentage = row.get("24h Price Change Percentage (%)", 0)
+    market_cap_change = row.get("24h Market Cap Change", 0)
+    market_cap_change_percentage = row.get("24h Market Cap Change Percentage (%)", 0)
+    all_time_high_price = row.get("All-Time High Price", 0)
+    all_time_high_price_percentage = row.get("All-Time High Change Percentage (%)", 0)
+
+    # Format price change
+    if price_change is not None:
+        if price_change < 0:
+            price_change = f"-₹{abs(price_change):,.2f}"
+        else:
+            price_change = f"+₹{price_change:,.2f}"
+    else:
+        price_change = "N/A"
 
-        crypto_data = CryptoCoins_Data()
-        if not crypto_data:
-            return "⚠️ No crypto data available right now. Please try again later."
+    # Format market cap change
+    try:
+        mc_prefix = "-" if market_cap_change < 0 else "+"
+        formatted_mc = f"{mc_prefix}₹{format_large_number(abs(market_cap_change * usd_to_inr))}"
+    except Exception:
+        formatted_mc = "N/A"
+
+    return (
+        f"Coin Name: {coin_name}\n"
+        f"💰 Current Price: ₹{(current_price * usd_to_inr):,.2f}\n"
+        f"Market Cap: ₹{format_large_number(market_cap * usd_to_inr)} (Rank #{rank})\n"
+        f"24h High / Low: ₹{(high_price * usd_to_inr):.2f} / ₹{(low_price * usd_to_inr):.2f}\n"
+        f"24h Price Change: {price_change} ({price_change_percentage:.2f}%)\n"
+        f"24h Market Cap Change: {formatted_mc} ({market_cap_change_percentage:.2f}%)\n"
+        f"All-Time High (ATH): ₹{(all_time_high_price * usd_to_inr):.2f} (📉 {all_time_high_price_percentage}% from ATH)\n"
+    )
 
-        df = pd.DataFrame(crypto_data)
-        df = df[df['Coin Name'].isin(coin_list)]
-        if df.empty:
-            return "⚠️ No matching coins found in analyzed crypto data."
+# Rebuild every subscriber's /bestcoin message (after each analyzed data refresh)
+def rebuild_coin_update_snapshots():
+    global coin_update_snapshots, coin_update_messages, coin_update_snapshots_stale
+    with coin_update_snapshots_lock:
+        usd_to_inr = get_usd_to_inr()
+        username_index = build_username_index(UserPortfolio_Data() or [])
+        crypto_data = CryptoCoins_Data() or []
+
+        # Each coin is formatted once, however many users hold it
+        coin_messages = {}
+        for row in crypto_data:
+            try:
+                coin_messages.setdefault(row.get("Coin Name"), format_coin_update(row, usd_to_inr))
+            except Exception as e:
+                print(f"❌ Error while generating message for {row.get('Coin Name')}: {e}")
+
+        coin_update_messages = coin_messages
+        coin_update_snapshots = {
+            username: compose_coin_updates(coin_list)
+            for username, coin_list in username_index.items()
+        }
+        coin_update_snapshots_stale = False
+        print(f"✅ /bestcoin snapshots rebuilt for {len(coin_update_snapshots)} Telegram users.")
 
-        try:
-            for index, row in df.iterrows():
-                coin_name = row.get("Coin Name", "N/A")
-                current_price = row.get("Current Price", 0)
-                market_cap = row.get("Market Cap", 0)
-                rank = row.get("Market Cap Rank", "N/A")
-                high_price = row.get("24h High Price", 0)
-                low_price = row.get("24h Low Price", 0)
-                price_change = row.get("24h Price Change", 0)
-                price_change_percentage = row.get("24h Price Change Percentage (%)", 0)
-                market_cap_change = row.get("24h Market Cap Change", 0)
-                market_cap_change_percentage = row.get("24h Market Cap Change Percentage (%)", 0)
-                all_time_high_price = row.get("All-Time High Price", 0)
-                all_time_high_price_percentage = row.get("All-Time High Change Percentage (%)", 0)
-
-                # Format price change
-                if price_change is not None:
-                    if price_change < 0:
-                        price_change = f"-₹{abs(price_change):,.2f}"
-                    else:
-                        price_change = f"+₹{price_change:,.2f}"
-                else:
-                    price_change = "N/A"
-
-                # Format market cap change
-                try:
-                    mc_prefix = "-" if market_cap_change < 0 else "+"
-                    formatted_mc = f"{mc_prefix}₹{format_large_number(abs(market_cap_change * usd_to_inr))}"
-                except Exception:
-                    formatted_mc = "N/A"
-
-                message = (
-                    f"Coin Name: {coin_name}\n"
-                    f"💰 Current Price: ₹{(current_price * usd_to_inr):,.2f}\n"
-                    f"Market Cap: ₹{format_large_number(market_cap * usd_to_inr)} (Rank #{rank})\n"
-                    f"24h High / Low: ₹{(high_price * usd_to_inr):.2f} / ₹{(low_price * usd_to_inr):.2f}\n"
-                    f"24h Price Change: {price_change} ({price_change_percentage:.2f}%)\n"
-                    f"24h Market Cap Change: {formatted_mc} ({market_cap_change_percentage:.2f}%)\n"
-                    f"All-Time High (ATH): ₹{(all_time_high_price * usd_to_inr):.2f} (📉 {all_time_high_price_percentage}% from ATH)\n"
-                )
-
-                messages.append(message)
-            return '\n'.join(messages)
+# Mark the snapshots outdated (e.g. a new subscription); the next /bestcoin rebuilds them
+def invalidate_coin_update_snapshots():
+    global coin_update_snapshots_stale
+    coin_update_snapshots_stale = True
 
-        except Exception as e:
-            print(f"❌ Error while generating messages: {e}")
-            return f"⚠️ Error fetching best coin due to {e}. Try again later."
+# /bestcoin: the precomputed coin update message of a Telegram user
+def Coin_Updates(username):
+    try:
+        if coin_update_snapshots_stale:
+            rebuild_coin_update_snapshots()
+
+        message = coin_update_snapshots.get(username)
+        if message is None:
+            # Not in the last snapshot: indexed lookup of the username's coins
+            coin_list = telegram_username_coins(username)
+            if not coin_list:
+                return f"⚠️ No coin data found for username: {username}"
+            # Same lock as the rebuild, so the entry lands in the current snapshot dict
+            with coin_update_snapshots_lock:
+                message = coin_update_snapshots.setdefault(username, compose_coin_updates(coin_list))
+        return message
 
     except Exception as e:
         return f"⚠️ Error fetching best coin due to {e}. Try again later."
@@ -222,6 +264,25 @@ def handle_message(chat_id, user_message, df=None, username=None, full_name=None
         print(f"📩 Sending AI Response to chat ID: {chat_id}")
         send_telegram_message(chat_id, response)
 
+# Handle one Telegram update (runs on the update worker pool, see TelegramUpdates.py)
+def handle_update(update):
+    message = update["message"]
+    chat_id = message["chat"]["id"]
+    text = message.get("text", "").strip().lower()
+
+    # Extract user info
+    user_info = message.get("from", {})
+    first_name = user_info.get("first_name", "")
+    last_name = user_info.get("last_name", "")
+    username = user_info.get("username", "")
+    full_name = f"{first_name} {last_name}"
+    print(f"Received message from {full_name} with the username as '{username}' in chat {chat_id}: {text}")
+
+    if text == "/start":
+        handle_start(chat_id, full_name)
+    else:
+        handle_message(chat_id, text, username=username, full_name=full_name)
+
 def set_webhook():
     """Registers the Telegram webhook dynamically."""
     webhook_url = os.getenv("WEBHOOK_URL")  # Set this in .env
@@ -0,0 +1,98 @@
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+# -------------------------- Telegram Update Queue -------------------------- #
+#
+# /webhook only enqueues the update and answers 200 straight away; a pool of worker
+# threads runs the handler. Updates are sharded by chat_id, so every chat is handled
+# by one worker and its messages are answered in the order they arrived. Telegram
+# re-delivers updates it considers unacknowledged, so update_ids already seen are skipped.
+
+# Worker threads handling updates
+TELEGRAM_UPDATE_WORKERS = int(os.getenv("TELEGRAM_UPDATE_WORKERS", "4"))
+
+# Updates waiting per worker; when a shard is full the webhook answers 503 and Telegram retries later
+TELEGRAM_UPDATE_QUEUE_SIZE = int(os.getenv("TELEGRAM_UPDATE_QUEUE_SIZE", "200"))
+
+# How many recent update_ids are remembered for de-duplication
+SEEN_UPDATE_IDS = 10000
+
+update_queues = [queue.Queue(maxsize=TELEGRAM_UPDATE_QUEUE_SIZE) for _ in range(TELEGRAM_UPDATE_WORKERS)]
+update_workers = []
+seen_update_ids = OrderedDict()
+update_lock = threading.Lock()
+update_latencies = deque(maxlen=500)  # seconds from enqueue to handled, most recent updates
+update_metrics = {"received": 0, "duplicates": 0, "rejected": 0, "handled": 0, "errors": 0}
+
+
+# Queue an update for `handler`; returns "queued", "duplicate" or "full"
+def enqueue_update(update, handler):
+    update_id = update.get("update_id")
+    chat_id = update.get("message", {}).get("chat", {}).get("id")
+
+    with update_lock:
+        update_metrics["received"] += 1
+        if update_id is not None:
+            if update_id in seen_update_ids:
+                update_metrics["duplicates"] += 1
+                return "duplicate"
+            seen_update_ids[update_id] = True
+            if len(seen_update_ids) > SEEN_UPDATE_IDS:
+                seen_update_ids.popitem(last=False)
+
+    start_update_workers()
+    shard = update_queues[hash(chat_id) % TELEGRAM_UPDATE_WORKERS]
+    try:
+        shard.put_nowait((time.monotonic(), update, handler))
+        return "queued"
+    except queue.Full:
+        with update_lock:
+            update_metrics["rejected"] += 1
+            # Let Telegram's retry of this update through
+            seen_update_ids.pop(update_id, None)
+        return "full"
+
+# Start the worker pool once per process
+def start_update_workers():
+    if len(update_workers) == TELEGRAM_UPDATE_WORKERS:
+        return
+    with update_lock:
+        while len(update_workers) < TELEGRAM_UPDATE_WORKERS:
+            worker = threading.Thread(target=update_worker_loop, args=(update_queues[len(update_workers)],), daemon=True)
+            worker.start()
+            update_workers.append(worker)
+
+def update_worker_loop(shard):
+    while True:
+        enqueued_at, update, handler = shard.get()
+        try:
+            handler(update)
+            outcome = "handled"
+        except Exception as e:
+            print(f"❌ Error handling Telegram update {update.get('update_id')}: {e}")
+            outcome = "errors"
+        finally:
+            shard.task_done()
+
+        with update_lock:
+            update_metrics[outcome] += 1
+            update_latencies.append(time.monotonic() - enqueued_at)
+
+# Queue depth and enqueue-to-handled latency of the update workers
+def update_queue_metrics():
+    with update_lock:
+        latencies = sorted(update_latencies)
+        metrics = dict(update_metrics)
+
+    metrics["queue_depth"] = sum(shard.qsize() for shard in update_queues)
+    metrics["queue_depth_per_worker"] = [shard.qsize() for shard in update_queues]
+    if latencies:
+        metrics["latency_seconds"] = {
+            "avg": round(sum(latencies) / len(latencies), 3),
+            "p95": round(latencies[int(0.95 * (len(latencies) - 1))], 3),
+            "max": round(latencies[-1], 3),
+        }
+    return metrics
@@ -0,0 +1,211 @@
+import os
+import numpy as np
+import pandas as pd
+from pymongo import ASCENDING, ReplaceOne, UpdateOne
+
+# -------------------------- Time-Series Bucket Store -------------------------- #
+#
+# Market chart and candlestick data is stored as one document per coin and time
+# window (a "bucket") instead of one collection per coin. Each bucket keeps its
+# points column-wise:
+#
+#   {
+#       "coin_id": "bitcoin",
+#       "timestamp": "2025-03-01 00:00:00",   # start of the bucket window
+#       "end": "2025-03-31 05:30:00",         # last point stored in the bucket
+#       "count": 31,
+#       "columns": {"timestamp": [...], "price": [...]}
+#   }
+#
+# The compound (coin_id, timestamp) index lets readers fetch any number of coins
+# with one indexed query. Every function takes the collection as its first
+# argument, so the store works the same against Atlas, a local mongod or mongomock.
+
+# Timestamp format used by every market data record (IST, lexicographically sortable)
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Bucket window used by each market dataset
+BUCKET_WINDOWS = {
+    "Yearly_MarketChartData": "month",
+    "Yearly_CandlestickData": "month",
+    "Hourly_MarketChartData": "day",
+    "Hourly_CandlestickData": "day",
+}
+
+# Bucket upserts sent per bulk_write round-trip
+WRITE_BATCH_SIZE = int(os.getenv("MARKET_DATA_WRITE_BATCH_SIZE", "500"))
+
+
+# Create the (coin_id, timestamp) index that every query relies on
+def ensure_indexes(collection):
+    collection.create_index(
+        [("coin_id", ASCENDING), ("timestamp", ASCENDING)],
+        unique=True,
+        name="coin_id_timestamp"
+    )
+
+# Start of the bucket window a timestamp falls into
+def bucket_start(timestamp, window):
+    if window == "month":
+        return f"{timestamp[:7]}-01 00:00:00"
+    if window == "day":
+        return f"{timestamp[:10]} 00:00:00"
+    if window == "hour":
+        return f"{timestamp[:13]}:00:00"
+    raise ValueError(f"Unsupported bucket window: {window}")
+
+# Normalize a user supplied timestamp (ISO string, date or epoch seconds) to TIMESTAMP_FORMAT in IST
+def to_store_timestamp(value, end_of_day=False):
+    if value is None or value == "":
+        return None
+
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.strip().isdigit()):
+        ts = pd.Timestamp(int(value), unit="s", tz="UTC")
+    else:
+        value = str(value).strip()
+        ts = pd.Timestamp(value)
+        # A bare date as an upper bound covers the whole day
+        if end_of_day and len(value) == 10:
+            ts = ts + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("Asia/Kolkata")
+    return ts.tz_convert("Asia/Kolkata").strftime(TIMESTAMP_FORMAT)
+
+# Convert NaN / numpy scalars into plain values MongoDB can store
+def _clean_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+# Group flat records into {bucket_start: {timestamp: row}}
+def _group_by_bucket(records, window):
+    buckets = {}
+    for record in records:
+        timestamp = record.get("timestamp")
+        if not timestamp:
+            continue
+        row = {key: _clean_value(value) for key, value in record.items() if key not in ("timestamp", "coin_id")}
+        buckets.setdefault(bucket_start(timestamp, window), {}).setdefault(timestamp, {}).update(row)
+    return buckets
+
+# Expand a stored bucket back into {timestamp: row}
+def _bucket_rows(bucket):
+    if not bucket:
+        return {}
+    columns = bucket.get("columns", {})
+    fields = [field for field in columns if field != "timestamp"]
+    rows = {}
+    for i, timestamp in enumerate(columns.get("timestamp", [])):
+        rows[timestamp] = {field: columns[field][i] for field in fields}
+    return rows
+
+# Build the stored (column-wise) body of a bucket from {timestamp: row}
+def _build_bucket(rows):
+    timestamps = sorted(rows)
+    fields = []
+    for timestamp in timestamps:
+        for field in rows[timestamp]:
+            if field not in fields:
+                fields.append(field)
+
+    columns = {"timestamp": timestamps}
+    for field in fields:
+        columns[field] = [rows[timestamp].get(field) for timestamp in timestamps]
+
+    return {"end": timestamps[-1], "count": len(timestamps), "columns": columns}
+
+# Upsert records for one coin, merging them into existing buckets by timestamp.
+# Bucket upserts go out as unordered bulk_write batches of `batch_size` operations.
+def write_points(collection, coin_id, records, window, batch_size=WRITE_BATCH_SIZE):
+    buckets = _group_by_bucket(records, window)
+    if not buckets:
+        return 0
+
+    existing = {
+        doc["timestamp"]: doc
+        for doc in collection.find({"coin_id": coin_id, "timestamp": {"$in": list(buckets)}})
+    }
+
+    operations = []
+    for start, points in buckets.items():
+        rows = _bucket_rows(existing.get(start))
+        for timestamp, row in points.items():
+            rows.setdefault(timestamp, {}).update(row)
+
+        operations.append(UpdateOne(
+            {"coin_id": coin_id, "timestamp": start},
+            {"$set": _build_bucket(rows)},
+            upsert=True
+        ))
+
+    for i in range(0, len(operations), batch_size):
+        collection.bulk_write(operations[i:i + batch_size], ordered=False)
+
+    return sum(len(points) for points in buckets.values())
+
+# Replace every stored point of one coin with the given records.
+# Each bucket is swapped in place and stale buckets are removed afterwards, so
+# readers see either the old or the new version of a bucket but never a hole.
+def replace_points(collection, coin_id, records, window, batch_size=WRITE_BATCH_SIZE):
+    buckets = _group_by_bucket(records, window)
+    documents = [
+        {"coin_id": coin_id, "timestamp": start, **_build_bucket(points)}
+        for start, points in sorted(buckets.items())
+    ]
+
+    operations = [
+        ReplaceOne({"coin_id": coin_id, "timestamp": doc["timestamp"]}, doc, upsert=True)
+        for doc in documents
+    ]
+    for i in range(0, len(operations), batch_size):
+        collection.bulk_write(operations[i:i + batch_size], ordered=False)
+
+    # Drop the buckets that fell out of the new window
+    collection.delete_many({"coin_id": coin_id, "timestamp": {"$nin": [doc["timestamp"] for doc in documents]}})
+
+    return sum(doc["count"] for doc in documents)
+
+# Watermark: timestamp of the newest point stored for a coin (None when nothing is stored)
+def latest_timestamp(collection, coin_id):
+    bucket = collection.find_one({"coin_id": coin_id}, {"end": 1}, sort=[("timestamp", -1)])
+    return bucket.get("end") if bucket else None
+
+# Check whether any point is stored for a coin
+def has_points(collection, coin_id):
+    return collection.find_one({"coin_id": coin_id}, {"_id": 1}) is not None
+
+# Stream flat rows for the requested coins, time range and fields
+# (all coins / the whole history / every field when the filter is None)
+def read_points(collection, coin_ids=None, start=None, end=None, fields=None, window=None, batch_size=None):
+    query = {}
+    if coin_ids is not None:
+        query["coin_id"] = {"$in": list(coin_ids)}
+
+    # Range filter on bucket boundaries; the (coin_id, timestamp) index serves both bounds
+    # when the bucket window is known, "end" drops buckets that finish before the range
+    if start is not None:
+        query["end"] = {"$gte": start}
+        if window:
+            query["timestamp"] = {"$gte": bucket_start(start, window)}
+    if end is not None:
+        query.setdefault("timestamp", {})["$lte"] = end
+
+    # Only ship the requested columns over the wire
+    projection = {"_id": 0}
+    if fields is not None:
+        projection.update({"coin_id": 1, "timestamp": 1, "columns.timestamp": 1})
+        projection.update({f"columns.{field}": 1 for field in fields})
+
+    cursor = collection.find(query, projection).sort([("coin_id", ASCENDING), ("timestamp", ASCENDING)])
+    if batch_size:
+        cursor = cursor.batch_size(batch_size)
+    for bucket in cursor:
+        coin_id = bucket.get("coin_id")
+        for timestamp, row in _bucket_rows(bucket).items():
+            # Buckets on the edge of the range hold points outside of it
+            if (start is not None and timestamp < start) or (end is not None and timestamp > end):
+                continue
+            yield {"timestamp": timestamp, **row, "coin_id": coin_id}
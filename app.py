@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta
-from flask import Flask, jsonify, request, render_template, url_for, Response, make_response
+from flask import Flask, jsonify, request, render_template, url_for, Response, make_response, stream_with_context
 import json
 from flask_cors import CORS
 import pandas as pd
@@ -12,12 +12,19 @@ import time
 import threading
 from user_agents import parse as parse_ua
 from Functions.Fetch_Data import fetch_and_store_hourly_data, fetch_and_store_yearly_data
-from Functions.MongoDB import Reddit_Post_Data, Crypto_News_Data ,fetch_and_store_all_coin_ids, UserPortfolio_Data, UserMetadata_Data, refersh_analyzed_data, CryptoCoins_Data, is_valid_crypto_symbol, validate_crypto_payload, CryptoCoinList_Data, validate_crypto_payload, UserMetadata_Collection, UserPortfolioCoin_Collection, Hourly_MarketChartData_Data, Yearly_MarketChartData_Data, Hourly_CandlestickData_Data, Yearly_CandlestickData_Data, is_user_portfolio_exist
-from Functions.TelegramBot import handle_start, handle_message, set_webhook
-from Functions.BlockMindsStatusBot import send_status_message
+from Functions.MongoDB import Reddit_Post_Data, Crypto_News_Data ,fetch_and_store_all_coin_ids, UserPortfolio_Data, UserMetadata_Data, refersh_analyzed_data, CryptoCoins_Data, is_valid_crypto_symbol, validate_crypto_payload, CryptoCoinList_Data, validate_crypto_payload, UserMetadata_Collection, UserPortfolioCoin_Collection, Hourly_MarketChartData_Data, Yearly_MarketChartData_Data, Hourly_CandlestickData_Data, Yearly_CandlestickData_Data, is_user_portfolio_exist, stream_market_data, PaymentSessions_Collection, subscribe_telegram_username
+from Functions.TelegramBot import handle_update, set_webhook, rebuild_coin_update_snapshots, invalidate_coin_update_snapshots
+from Functions.TelegramUpdates import enqueue_update, update_queue_metrics
+from Functions.BlockMindsStatusBot import send_status_message, status_notifier_metrics
 from Functions.Analysis import Analysis
 from Functions.UserMetaData import user_metadata
-from Functions.RazorPay import check_payment_status
+from Functions.RazorPay import wait_for_payment_status, register_payment_order, verify_webhook_signature, handle_payment_webhook, claim_payment_fulfilment, release_payment_fulfilment
+from Functions.TimeSeriesStore import to_store_timestamp
+from Functions.CoinGecko import coingecko_metrics
+from Functions.PriceHistory import price_history_metrics
+from Functions.Sentiment import sentiment_metrics
+from Functions.DataCache import cache_metrics, invalidate_cache
+from Functions.SessionStore import MemorySessionStore, MongoSessionStore
 import razorpay
 import time
 
@@ -46,8 +53,15 @@ if not RAZORPAY_KEY or not RAZORPAY_SECRET:
 # Razorpay client setup
 razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY, RAZORPAY_SECRET))
 
-# In-memory store (replace with DB in production)
-pending_users = {}
+# Pending payment sessions: "mongo" is shared by all gunicorn workers and survives restarts,
+# "memory" keeps a bounded LRU in this process only
+PAYMENT_SESSION_BACKEND = os.getenv("PAYMENT_SESSION_BACKEND", "mongo").lower()
+PAYMENT_SESSION_TTL = 120  # 2 min
+
+if PAYMENT_SESSION_BACKEND == "memory":
+    pending_users = MemorySessionStore(max_entries=int(os.getenv("PAYMENT_SESSION_MAX_ENTRIES", "1000")))
+else:
+    pending_users = MongoSessionStore(PaymentSessions_Collection())
 
 # Set timezone for status messages
 ist = pytz.timezone('Asia/Kolkata')
@@ -61,6 +75,9 @@ def load_data():
             raise ValueError("Analysis() returned an empty DataFrame.")
         
         refersh_analyzed_data(df=df)
+
+        # Precompute the /bestcoin replies from the fresh data
+        rebuild_coin_update_snapshots()
         
     except Exception as e:
         send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error loading crypto analysis data: {e}")
@@ -235,6 +252,7 @@ def receive_crypto_coins_detail_from_power_app():
                     # Create a proper UserDetail dictionary 
                     UserDetail = user_metadata(cleaned_data['user_mail'])
                     UserMetaDataCollection.insert_one(UserDetail)
+                    invalidate_cache("UserMetadata")
                     print("User MetaData inserted successfully.")
                 except Exception as e:
                     print(f"⚠️ Skipping User Metadata insertion due to error: {e}")
@@ -249,6 +267,7 @@ def receive_crypto_coins_detail_from_power_app():
         # Step 7: Insert into MongoDB
         UserPortfolioCollection = UserPortfolioCoin_Collection()
         result = UserPortfolioCollection.insert_one(cleaned_data)
+        invalidate_cache("UserPortfolio")
         print(f"✅ Data inserted with ID: {result.inserted_id}")
         print(f"Inserted data: {cleaned_data}")
 
@@ -398,11 +417,12 @@ def start_payment():
             }
 
             order = razorpay_client.order.create(order_data)
+            register_payment_order(order['id'], user_id=user_id, email=email, amount=amount)
 
             created_at = int(time.time())
-            expires_at = created_at + 120  # 2 min TTL
+            expires_at = created_at + PAYMENT_SESSION_TTL
 
-            pending_users[user_id] = {
+            pending_users.put(user_id, {
                 'name': name,
                 'email': email,
                 'mobile': mobile,
@@ -412,7 +432,7 @@ def start_payment():
                 'razorpay_payment_id': None,
                 'created_at': created_at,
                 'expires_at': expires_at
-            }
+            }, PAYMENT_SESSION_TTL)
 
             payment_url = url_for('start_payment', user_id=user_id, _external=True)
             return jsonify({
@@ -434,15 +454,12 @@ def start_payment():
 
     # GET: Render payment.html
     user_id = request.args.get('user_id')
-    if user_id in pending_users:
-        now = int(time.time())
-        if now > pending_users[user_id]['expires_at']:
-            return "Payment session expired", 410
-
+    session = pending_users.get(user_id) if user_id else None
+    if session:
         return render_template('payment.html',
-                               user=pending_users[user_id],
+                               user=session,
                                user_id=user_id,
-                               order_id=pending_users[user_id]['razorpay_order_id'],
+                               order_id=session['razorpay_order_id'],
                                razorpay_key=RAZORPAY_KEY)
     else:
         return "Invalid or expired session", 404
@@ -476,8 +493,6 @@ def check_payment_status_via_route():
             }), 200
 
         # Step 2: Extract parameters
-        timeout_minutes = 20
-        poll_interval = 5
         order_id = data.get("order_id", "").strip()
 
         print(f"🔍 Checking payment status for order_id: {order_id}")
@@ -492,10 +507,9 @@ def check_payment_status_via_route():
                 "payment_id": None
             }), 200
 
-        print(f"🔍 Checking payment status for order_id: {order_id}, timeout={timeout_minutes} min, interval={poll_interval}s")
-
-        # Call the core function with all parameters
-        result = check_payment_status(order_id, timeout_minutes, poll_interval)
+        # Long-poll the order status store (updated by the Razorpay webhook); answers "pending"
+        # after PAYMENT_LONG_POLL_SECONDS so the caller asks again instead of holding a worker
+        result = wait_for_payment_status(order_id)
 
         print(f"✅ Payment check result: {result['status']} for order_id: {order_id}")
         
@@ -540,6 +554,7 @@ def check_payment_status_via_route():
                         # Create a proper UserDetail dictionary 
                         UserDetail = user_metadata(cleaned_data['user_mail'])
                         UserMetaDataCollection.insert_one(UserDetail)
+                        invalidate_cache("UserMetadata")
                         print("User MetaData inserted successfully.")
                     except Exception as e:
                         print(f"⚠️ Skipping User Metadata insertion due to error: {e}")
@@ -551,10 +566,31 @@ def check_payment_status_via_route():
             if not is_valid:
                 return jsonify({"success": 'False', "message": msg}), 200
 
-            # Step 7: Insert into MongoDB
+            # Step 7: Insert into MongoDB (once per paid order, repeated status checks skip it)
+            if not claim_payment_fulfilment(order_id):
+                return jsonify({
+                    "success": 'True',
+                    "message": "Crypto investment data already saved for this order."
+                }), 200
+
             UserPortfolioCollection = UserPortfolioCoin_Collection()
-            result = UserPortfolioCollection.insert_one(cleaned_data)
-            print(f"✅ Data inserted with ID: {result.inserted_id}")
+            try:
+                # Keyed on the order, so fulfilling the same order again never saves a second entry
+                result = UserPortfolioCollection.update_one(
+                    {"payment_details.order_id": order_id},
+                    {"$setOnInsert": cleaned_data},
+                    upsert=True
+                )
+            except Exception:
+                # Give the claim back so the next status check retries the insert
+                release_payment_fulfilment(order_id)
+                raise
+            invalidate_cache("UserPortfolio")
+
+            entry_id = result.upserted_id
+            if entry_id is None:
+                entry_id = UserPortfolioCollection.find_one({"payment_details.order_id": order_id}, {"_id": 1})["_id"]
+            print(f"✅ Data inserted with ID: {entry_id}")
             print(f"Inserted data: {cleaned_data}")
 
             # Step 8: Return success response
@@ -562,12 +598,33 @@ def check_payment_status_via_route():
             return jsonify({
                 "success": 'True',
                 "message": "Crypto investment data saved successfully.",
-                "id": str(result.inserted_id)
+                "id": str(entry_id)
             }), 200
 
+        else:
+            # pending (long poll timed out, the client asks again), failed or error
+            return jsonify({**result, "success": 'False'}), 200
+
     except Exception as e:
             return jsonify({"success": 'False', "message": str(e)}), 200
 
+# Flask route to receive Razorpay payment events (payment.captured, payment.failed, order.paid)
+@app.route('/razorpay-webhook', methods=['POST'])
+def razorpay_webhook():
+    body = request.get_data(as_text=True)
+    if not verify_webhook_signature(body, request.headers.get("X-Razorpay-Signature")):
+        return jsonify({"success": False, "message": "Invalid signature."}), 400
+
+    try:
+        event = json.loads(body)
+        order_id = handle_payment_webhook(event)
+        if order_id:
+            print(f"💳 Razorpay webhook '{event.get('event')}' recorded for order_id: {order_id}")
+        return jsonify({"success": True}), 200
+    except Exception as e:
+        send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error handling Razorpay webhook: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
 # Flask route to get analyzed data
 @app.route('/get-analyzed-data', methods=['GET'])
 def get_analyzed_data():
@@ -580,37 +637,93 @@ def get_analyzed_data():
 
     return jsonify(response)
 
+# Read the coin_ids / start / end / fields filters of the market data routes from the query string
+# e.g. /get-yearly-market-chart-data?coin_ids=bitcoin,ethereum&start=2025-03-01&end=2025-03-07&fields=price
+def market_data_filters():
+    def split_arg(name):
+        values = []
+        for raw in request.args.getlist(name):
+            values.extend(value.strip() for value in raw.split(",") if value.strip())
+        return values or None
+
+    start = request.args.get("start") or None
+    end = request.args.get("end") or None
+
+    # Fail fast on timestamps that cannot be parsed
+    try:
+        to_store_timestamp(start)
+        to_store_timestamp(end, end_of_day=True)
+    except Exception:
+        raise ValueError("Invalid 'start' or 'end'. Use YYYY-MM-DD, YYYY-MM-DD HH:MM:SS or epoch seconds.")
+
+    return {
+        "coin_ids": split_arg("coin_ids"),
+        "start": start,
+        "end": end,
+        "fields": split_arg("fields")
+    }
+
 # Flask route to get hourly marketchart data
 @app.route('/get-hourly-market-chart-data', methods=['GET'])
 def get_hourly_market_chart_data():
     try:
-        market_data = Hourly_MarketChartData_Data()
+        market_data = Hourly_MarketChartData_Data(**market_data_filters())
 
         return jsonify({"Hourly Market Chart Data": market_data})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Rows per chunk written to the client by the streaming market data routes
+MARKET_DATA_STREAM_BATCH_SIZE = int(os.getenv("MARKET_DATA_STREAM_BATCH_SIZE", "1000"))
+
+# Convert timestamps + replace NaN with None
+def sanitize_row(record):
+    for key, value in record.items():
+        if isinstance(value, pd.Timestamp) or isinstance(value, datetime):
+            record[key] = value.isoformat()
+        elif isinstance(value, float) and (pd.isna(value) or np.isnan(value)):
+            record[key] = None
+    return record
+
+# Stream {"<key>": [rows...]} chunk by chunk straight from the Mongo cursor,
+# so memory per request is bounded by the batch size and the first byte goes out immediately
+def stream_market_data_response(key, dataset, filters, batch_size=MARKET_DATA_STREAM_BATCH_SIZE):
+    def generate():
+        yield json.dumps(key, ensure_ascii=False).join(["{", ": ["])
+
+        batch = []
+        first = True
+        try:
+            for row in stream_market_data(dataset, batch_size=batch_size, **filters):
+                batch.append(json.dumps(sanitize_row(row), ensure_ascii=False))
+                if len(batch) >= batch_size:
+                    yield ("" if first else ",") + ",".join(batch)
+                    first = False
+                    batch = []
+
+            if batch:
+                yield ("" if first else ",") + ",".join(batch)
+            yield "]}"
+
+        except Exception as e:
+            # Headers are already sent, so close the array and report the error in the body
+            send_status_message(Status_TELEGRAM_CHAT_ID, f"❌ Error streaming '{dataset}': {e}")
+            yield "], " + json.dumps({"error": str(e)})[1:]
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
 # Flask route to get yearly marketchart data
 @app.route('/get-yearly-market-chart-data', methods=['GET'])
 def get_yearly_market_chart_data():
     try:
-        market_data = Yearly_MarketChartData_Data()
-
-        # Step 1: Convert timestamps + replace NaN with None
-        def sanitize_row(record):
-            for key, value in record.items():
-                if isinstance(value, pd.Timestamp) or isinstance(value, datetime):
-                    record[key] = value.isoformat()
-                elif isinstance(value, float) and (pd.isna(value) or np.isnan(value)):
-                    record[key] = None
-            return record
+        return stream_market_data_response("Yearly Market Chart Data", "Yearly_MarketChartData", market_data_filters())
 
-        cleaned_data = [sanitize_row(row) for row in market_data]
-
-        # Step 2: Clean JSON dump
-        response = make_response(json.dumps({"Yearly Market Chart Data": cleaned_data}, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json'
-        return response
+    except ValueError as e:
+        error_response = make_response(json.dumps({"error": str(e)}))
+        error_response.headers['Content-Type'] = 'application/json'
+        return error_response, 400
 
     except Exception as e:
         error_response = make_response(json.dumps({"error": str(e)}))
@@ -621,23 +734,12 @@ def get_yearly_market_chart_data():
 @app.route('/get-hourly-candlestick-data', methods=['GET'])
 def get_hourly_candlestick_data():
     try:
-        candlestick_data = Hourly_CandlestickData_Data()
-
-        # Step 1: Convert timestamps + replace NaN with None
-        def sanitize_row(record):
-            for key, value in record.items():
-                if isinstance(value, pd.Timestamp) or isinstance(value, datetime):
-                    record[key] = value.isoformat()
-                elif isinstance(value, float) and (pd.isna(value) or np.isnan(value)):
-                    record[key] = None
-            return record
-
-        cleaned_data = [sanitize_row(row) for row in candlestick_data]
+        return stream_market_data_response("Candlestick Data", "Hourly_CandlestickData", market_data_filters())
 
-        # Step 2: Clean JSON dump
-        response = make_response(json.dumps({"Candlestick Data": cleaned_data}, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json'
-        return response
+    except ValueError as e:
+        error_response = make_response(json.dumps({"error": str(e)}))
+        error_response.headers['Content-Type'] = 'application/json'
+        return error_response, 400
 
     except Exception as e:
         error_response = make_response(json.dumps({"error": str(e)}))
@@ -648,23 +750,12 @@ def get_hourly_candlestick_data():
 @app.route('/get-yearly-candlestick-data', methods=['GET'])
 def get_yearly_candlestick_data():
     try:
-        candlestick_data = Yearly_CandlestickData_Data()  # Replace with your actual data fetching function
-
-        # Step 1: Convert timestamps + replace NaN with None
-        def sanitize_row(record):
-            for key, value in record.items():
-                if isinstance(value, pd.Timestamp) or isinstance(value, datetime):
-                    record[key] = value.isoformat()
-                elif isinstance(value, float) and (pd.isna(value) or np.isnan(value)):
-                    record[key] = None
-            return record
+        return stream_market_data_response("Yearly Candlestick Data", "Yearly_CandlestickData", market_data_filters())
 
-        cleaned_data = [sanitize_row(row) for row in candlestick_data]
-
-        # Step 2: Clean JSON dump
-        response = make_response(json.dumps({"Yearly Candlestick Data": cleaned_data}, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json'
-        return response
+    except ValueError as e:
+        error_response = make_response(json.dumps({"error": str(e)}))
+        error_response.headers['Content-Type'] = 'application/json'
+        return error_response, 400
 
     except Exception as e:
         error_response = make_response(json.dumps({"error": str(e)}))
@@ -744,24 +835,13 @@ def telegram_webhook():
     if not update or "message" not in update:
         return jsonify({"status": "ignored"}), 400
 
-    message = update["message"]
-    chat_id = message["chat"]["id"]
-    text = message.get("text", "").strip().lower()
-
-    # Extract user info
-    user_info = message.get("from", {})
-    first_name = user_info.get("first_name", "")
-    last_name = user_info.get("last_name", "")
-    username = user_info.get("username", "")
-    full_name = f"{first_name} {last_name}"
-    print(f"Received message from {full_name} with the username as '{username}' in chat {chat_id}: {text}")
+    # Acknowledge right away; the update is handled on the worker pool
+    status = enqueue_update(update, handle_update)
+    if status == "full":
+        # Telegram re-delivers the update later
+        return jsonify({"status": "busy"}), 503
 
-    if text == "/start":
-        handle_start(chat_id, full_name)
-    else:
-        handle_message(chat_id, text, username=username, full_name=full_name)
-
-    return jsonify({"status": "ok"}), 200
+    return jsonify({"status": status}), 200
 
 # Flask route to add Telegram username
 @app.route('/subscribe', methods=['POST'])
@@ -778,45 +858,25 @@ def add_telegram_username():
                 "message": "Both 'email' and 'telegram_username' are required."
             }), 400
 
-        portfolio_collection = UserPortfolioCoin_Collection()
-        users = list(portfolio_collection.find({"user_mail": email}))
+        # One indexed update adds the username to every portfolio entry of the email
+        matched, added = subscribe_telegram_username(email, new_username)
 
-        if len(users) == 0:
+        if matched == 0:
             print(f"❌ No user portfolio found for email: {email}")
             return jsonify({
                 "success": False,
                 "message": f"No user portfolio found for email: {email}"
             }), 404
 
-        updated = False
-        for user in users:
-            # Collect existing telegram_username_* fields
-            username_fields = {k: v for k, v in user.items() if k.startswith("telegram_username")}
-            existing_usernames = list(username_fields.values())
-
-            if new_username in existing_usernames:
-                print(f"⚠️ Username '{new_username}' already exists for email: {email}. Skipping.")
-                continue
-
-            # Find the next available field name
-            index = 1
-            while f"telegram_username_{index}" in user:
-                index += 1
-
-            new_field = f"telegram_username_{index}"
-            portfolio_collection.update_one(
-                {"_id": user["_id"]},
-                {"$set": {new_field: new_username}}
-            )
-            print(f"✅ Added '{new_username}' to field '{new_field}' for email: {email}")
-            updated = True
-
-        if updated:
+        if added:
+            print(f"✅ Added '{new_username}' to {added} portfolio entries for email: {email}")
+            invalidate_coin_update_snapshots()
             return jsonify({
                 "success": True,
-                "message": f"✅ Telegram username '{new_username}' added in a new field for email '{email}'."
+                "message": f"✅ Telegram username '{new_username}' added for email '{email}'."
             }), 200
         else:
+            print(f"⚠️ Username '{new_username}' already exists for email: {email}. Skipping.")
             return jsonify({
                 "success": True,
                 "message": f"⚠️ Telegram username '{new_username}' already exists for email '{email}'. No update needed."
@@ -829,6 +889,36 @@ def add_telegram_username():
             "message": str(e)
         }), 500
 
+# Flask route to get CoinGecko client metrics (calls, 429s, retries, wait time)
+@app.route('/coingecko-metrics', methods=['GET'])
+def get_coingecko_metrics():
+    return jsonify(coingecko_metrics()), 200
+
+# Flask route to get the dataset cache counters (hits, misses, invalidations)
+@app.route('/cache-metrics', methods=['GET'])
+def get_cache_metrics():
+    return jsonify(cache_metrics()), 200
+
+# Flask route to get the status notifier counters (queued, sent, dropped, queue depth)
+@app.route('/status-notifier-metrics', methods=['GET'])
+def get_status_notifier_metrics():
+    return jsonify(status_notifier_metrics()), 200
+
+# Flask route to get the Telegram update queue counters (queue depth, handling latency)
+@app.route('/telegram-update-metrics', methods=['GET'])
+def get_telegram_update_metrics():
+    return jsonify(update_queue_metrics()), 200
+
+# Flask route to get the price history counters (lookups served from the local store vs CoinGecko calls)
+@app.route('/price-history-metrics', methods=['GET'])
+def get_price_history_metrics():
+    return jsonify(price_history_metrics()), 200
+
+# Flask route to get the sentiment engine counters (cache hits, texts scored)
+@app.route('/sentiment-metrics', methods=['GET'])
+def get_sentiment_metrics():
+    return jsonify(sentiment_metrics()), 200
+
 # Flask route to handle keepalive pings
 @app.route('/keepalive')
 def keep_alive():
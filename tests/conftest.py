@@ -0,0 +1,47 @@
+import os
+import sys
+import types
+
+import mongomock
+import pytest
+
+# Make `Functions` importable when pytest is run from any directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Functions.MongoDB connects to Atlas on import; the tests get the same accessors backed by
+# one in-memory client instead. Other names only need to exist for `from ... import`.
+mongo_client = mongomock.MongoClient()
+
+
+def not_in_tests(name):
+    def stub(*args, **kwargs):
+        raise AssertionError(f"Functions.MongoDB.{name} is not available in tests")
+    return stub
+
+
+mongo_stub = types.ModuleType("Functions.MongoDB")
+mongo_stub.client = mongo_client
+mongo_stub.PaymentOrders_Collection = lambda: mongo_client["CryptoCoins"]["PaymentOrders"]
+mongo_stub.PaymentSessions_Collection = lambda: mongo_client["CryptoCoins"]["PaymentSessions"]
+mongo_stub.UserPortfolioCoin_Collection = lambda: mongo_client["CryptoCoins"]["UserPortfolio"]
+mongo_stub.UserMetadata_Collection = lambda: mongo_client["CryptoCoins"]["UserMetadata"]
+mongo_stub.MarketData_Collection = lambda dataset: mongo_client["MarketData"][dataset]
+mongo_stub.__getattr__ = not_in_tests
+sys.modules.setdefault("Functions.MongoDB", mongo_stub)
+
+os.environ.setdefault("RAZORPAY_KEY", "rzp_test_key")
+os.environ.setdefault("RAZORPAY_SECRET", "rzp_test_secret")
+
+
+# Razorpay replaced by FakeRazorpay, an empty order store and a fast long poll
+@pytest.fixture
+def razorpay(monkeypatch):
+    import Functions.RazorPay as RazorPay
+    from fake_razorpay import FakeRazorpay, WEBHOOK_SECRET
+
+    mongo_stub.PaymentOrders_Collection().delete_many({})
+    fake = FakeRazorpay()
+    monkeypatch.setattr(RazorPay, "razorpay_client", fake)
+    monkeypatch.setattr(RazorPay, "RAZORPAY_WEBHOOK_SECRET", WEBHOOK_SECRET)
+    monkeypatch.setattr(RazorPay, "PAYMENT_STORE_POLL_SECONDS", 0.05)
+    return fake
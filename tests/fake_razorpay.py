@@ -0,0 +1,34 @@
+import hashlib
+import hmac
+import types
+
+import Functions.RazorPay as RazorPay
+
+WEBHOOK_SECRET = "whsec_test"
+
+
+# Fake Razorpay client: order.payments() answers from `payments`, signatures use the real utility
+class FakeRazorpay:
+    def __init__(self):
+        self.payments = {}
+        self.calls = 0
+        self.utility = RazorPay.razorpay_client.utility
+        self.order = types.SimpleNamespace(payments=self.order_payments)
+
+    def order_payments(self, order_id):
+        self.calls += 1
+        return {"items": self.payments.get(order_id, [])}
+
+
+def payment_event(event, order_id, payment_id="pay_1", status="captured"):
+    return {
+        "event": event,
+        "payload": {"payment": {"entity": {
+            "id": payment_id, "order_id": order_id, "status": status,
+            "method": "upi", "amount": 50000, "vpa": "user@upi",
+        }}},
+    }
+
+
+def sign(body):
+    return hmac.new(WEBHOOK_SECRET.encode(), body.encode(), hashlib.sha256).hexdigest()
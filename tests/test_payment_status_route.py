@@ -0,0 +1,75 @@
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+import Functions.RazorPay as RazorPay
+from Functions.MongoDB import UserMetadata_Collection, UserPortfolioCoin_Collection
+from fake_razorpay import payment_event
+
+# app.py imports the Telegram bot (Gemini, webhook registration), the analysis pipeline and
+# the user metadata client (token request); the payment route uses none of them
+for name, attributes in {
+    "Functions.TelegramBot": ["handle_update", "set_webhook", "rebuild_coin_update_snapshots", "invalidate_coin_update_snapshots"],
+    "Functions.Analysis": ["Analysis"],
+    "Functions.UserMetaData": ["user_metadata"],
+}.items():
+    module = types.ModuleType(name)
+    for attribute in attributes:
+        setattr(module, attribute, lambda *args, **kwargs: None)
+    sys.modules.setdefault(name, module)
+
+import app as app_module
+
+ORDER_FIELDS = {
+    "user_mail": "user@example.com", "name": "User", "email": "user@example.com", "mobile": "9999999999",
+    "amount": 500, "coin_name": "Bitcoin", "Coin_symbol": "BTC", "purchase_date": "2025-03-04",
+}
+
+
+@pytest.fixture
+def client(razorpay, monkeypatch):
+    UserPortfolioCoin_Collection().delete_many({})
+    UserMetadata_Collection().delete_many({})
+    UserMetadata_Collection().insert_one({"mail_address": ORDER_FIELDS["user_mail"]})
+
+    # Coin validation reads CoinsList; the long poll is shortened to keep the pending path fast
+    monkeypatch.setattr(app_module, "validate_crypto_payload", lambda data: (True, "Valid"))
+    monkeypatch.setattr(app_module, "wait_for_payment_status", lambda order_id: RazorPay.wait_for_payment_status(order_id, timeout_seconds=0.3))
+    return app_module.app.test_client()
+
+
+def test_unpaid_order_answers_pending(client):
+    RazorPay.register_payment_order("order_r1", amount=500)
+
+    response = client.post("/check-payment-status", json={**ORDER_FIELDS, "order_id": "order_r1"})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["success"] == "False"
+    assert body["status"] == "pending"
+    assert body["order_id"] == "order_r1"
+    assert UserPortfolioCoin_Collection().count_documents({}) == 0
+
+
+def test_paid_order_saves_portfolio_entry_once(client):
+    RazorPay.register_payment_order("order_r2", amount=500)
+    threading.Timer(0.1, RazorPay.handle_payment_webhook, args=[payment_event("payment.captured", "order_r2")]).start()
+
+    started = time.monotonic()
+    response = client.post("/check-payment-status", json={**ORDER_FIELDS, "order_id": "order_r2"})
+    assert time.monotonic() - started < 0.3  # woken by the webhook, not the poll timeout
+
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body["success"] == "True"
+    entry = UserPortfolioCoin_Collection().find_one({"payment_details.order_id": "order_r2"})
+    assert str(entry["_id"]) == body["id"]
+    assert entry["payment_details"]["payment_id"] == "pay_1"
+
+    # The client polling again after success does not save a second entry
+    again = client.post("/check-payment-status", json={**ORDER_FIELDS, "order_id": "order_r2"}).get_json()
+    assert again["success"] == "True"
+    assert UserPortfolioCoin_Collection().count_documents({}) == 1
@@ -0,0 +1,50 @@
+import pytest
+
+import Functions.PriceHistory as PriceHistory
+from Functions.MongoDB import MarketData_Collection
+from Functions.TimeSeriesStore import BUCKET_WINDOWS, to_store_timestamp, write_points
+
+DAY = 86400
+MARCH_1 = 1740787200  # 2025-03-01 00:00 UTC
+
+
+@pytest.fixture
+def api_calls(monkeypatch):
+    calls = []
+
+    def coingecko_get(path, params=None):
+        calls.append(params)
+        return {"prices": [[(params["from"] + 60) * 1000, 42.0]]}
+
+    for dataset in PriceHistory.PRICE_HISTORY_DATASETS:
+        MarketData_Collection(dataset).delete_many({})
+    monkeypatch.setattr(PriceHistory, "coingecko_get", coingecko_get)
+    return calls
+
+
+def store(dataset, coin_id, epochs):
+    records = [{"timestamp": to_store_timestamp(ts), "price": float(i)} for i, ts in enumerate(epochs)]
+    write_points(MarketData_Collection(dataset), coin_id, records, BUCKET_WINDOWS[dataset])
+
+
+def test_daily_points_cover_lookups_between_them(api_calls):
+    store("Yearly_MarketChartData", "shiba-inu", [MARCH_1 + day * DAY for day in range(10)])
+
+    # 10 hours after a daily point, and its 6 hour horizon, are both answered by the yearly store
+    df = PriceHistory.price_series("shiba-inu", [MARCH_1 + 3 * DAY + 10 * 3600], horizons=(6,))
+
+    assert api_calls == []
+    assert df["timestamp"].tolist() == [MARCH_1 + 3 * DAY, MARCH_1 + 4 * DAY]
+
+
+def test_only_uncovered_span_is_requested(api_calls):
+    store("Yearly_MarketChartData", "shiba-inu", [MARCH_1 + day * DAY for day in range(10)])
+    store("Hourly_MarketChartData", "shiba-inu", [MARCH_1 + 20 * DAY + minutes * 300 for minutes in range(12)])
+
+    covered = MARCH_1 + 20 * DAY + 1800  # within the hourly points
+    uncovered = MARCH_1 + 15 * DAY       # days away from either store
+    df = PriceHistory.price_series("shiba-inu", [covered, uncovered], horizons=())
+
+    margin = PriceHistory.PRICE_HISTORY_API_MARGIN_SECONDS
+    assert api_calls == [{"vs_currency": "usd", "from": uncovered - margin, "to": uncovered + margin}]
+    assert (uncovered - margin + 60) in df["timestamp"].tolist()
@@ -0,0 +1,71 @@
+import json
+import threading
+import time
+
+import Functions.RazorPay as RazorPay
+from fake_razorpay import payment_event, sign
+
+
+def test_webhook_signature(razorpay):
+    body = json.dumps(payment_event("payment.captured", "order_1"))
+    assert RazorPay.verify_webhook_signature(body, sign(body))
+    assert not RazorPay.verify_webhook_signature(body + " ", sign(body))
+    assert not RazorPay.verify_webhook_signature(body, None)
+
+
+def test_long_poll_is_woken_by_webhook(razorpay):
+    RazorPay.register_payment_order("order_2", amount=500)
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(RazorPay.wait_for_payment_status("order_2", timeout_seconds=5)))
+
+    started = time.monotonic()
+    waiter.start()
+    time.sleep(0.2)
+    assert RazorPay.handle_payment_webhook(payment_event("payment.captured", "order_2")) == "order_2"
+    waiter.join(5)
+
+    assert time.monotonic() - started < 1.5
+    assert results[0]["status"] == "paid"
+    assert results[0]["payment_id"] == "pay_1"
+    assert results[0]["payment_details"]["vpa"] == "user@upi"
+    # A freshly registered order is not reconciled against Razorpay
+    assert razorpay.calls == 0
+
+
+def test_long_poll_answers_pending_on_timeout(razorpay):
+    RazorPay.register_payment_order("order_3")
+    started = time.monotonic()
+    result = RazorPay.wait_for_payment_status("order_3", timeout_seconds=0.3)
+    assert result["status"] == "pending"
+    assert 0.3 <= time.monotonic() - started < 1
+
+
+def test_missed_webhook_is_reconciled(razorpay, monkeypatch):
+    monkeypatch.setattr(RazorPay, "PAYMENT_RECONCILE_SECONDS", 0)
+    RazorPay.register_payment_order("order_4")
+    razorpay.payments["order_4"] = [{"id": "pay_4", "order_id": "order_4", "status": "captured", "method": "card"}]
+
+    result = RazorPay.wait_for_payment_status("order_4", timeout_seconds=2)
+    assert result["status"] == "paid"
+    assert razorpay.calls == 1
+
+
+def test_late_failure_does_not_downgrade_paid_order(razorpay):
+    RazorPay.register_payment_order("order_5")
+    RazorPay.handle_payment_webhook(payment_event("payment.captured", "order_5"))
+    RazorPay.handle_payment_webhook(payment_event("payment.failed", "order_5", payment_id="pay_0", status="failed"))
+
+    assert RazorPay.wait_for_payment_status("order_5", timeout_seconds=0)["status"] == "paid"
+
+
+def test_fulfilment_is_claimed_once_and_can_be_released(razorpay):
+    RazorPay.register_payment_order("order_6")
+    assert not RazorPay.claim_payment_fulfilment("order_6")  # not paid yet
+
+    RazorPay.handle_payment_webhook(payment_event("order.paid", "order_6"))
+    assert RazorPay.claim_payment_fulfilment("order_6")
+    assert not RazorPay.claim_payment_fulfilment("order_6")
+
+    # A failed portfolio insert gives the claim back for the next status check
+    RazorPay.release_payment_fulfilment("order_6")
+    assert RazorPay.claim_payment_fulfilment("order_6")
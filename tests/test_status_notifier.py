@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+import Functions.BlockMindsStatusBot as StatusBot
+from Functions.RateLimit import TokenBucket
+
+
+# Local stand-in for the Telegram Bot API: answers with the queued (status, headers, body)
+# responses, then 200, and records every sendMessage form it receives
+class TelegramStub:
+    def __init__(self):
+        self.requests = []
+        self.responses = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+                stub.requests.append(form)
+                status, headers, body = stub.responses.pop(0) if stub.responses else (200, {}, json.dumps({"ok": True}))
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body.encode())
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def telegram(monkeypatch):
+    stub = TelegramStub()
+    monkeypatch.setattr(StatusBot, "STATUS_TELEGRAM_API_URL", stub.url)
+    monkeypatch.setattr(StatusBot, "STATUS_DIGEST_SECONDS", 0.2)
+    monkeypatch.setattr(StatusBot, "status_limiter", TokenBucket(rate=1000, capacity=100))
+    yield stub
+    StatusBot.flush_status_messages(5)
+    stub.server.shutdown()
+
+
+def test_burst_is_sent_as_one_digest_without_blocking(telegram):
+    started = time.perf_counter()
+    for _ in range(3):
+        StatusBot.send_status_message("chat-1", "⚠️ CoinGecko rate limited")
+    StatusBot.send_status_message("chat-1", "❌ Error:", ValueError("boom"))
+    assert time.perf_counter() - started < 0.1
+
+    assert StatusBot.flush_status_messages(5)
+    assert len(telegram.requests) == 1
+    text = telegram.requests[0]["text"]
+    assert "⚠️ CoinGecko rate limited (×3)" in text
+    assert "❌ Error: boom" in text
+
+
+def test_non_json_429_falls_back_to_retry_after_header(telegram):
+    telegram.responses.append((429, {"Retry-After": "0"}, "Too Many Requests"))
+    StatusBot.send_status_message("chat-2", "hello")
+
+    assert StatusBot.flush_status_messages(5)
+    assert [form["text"] for form in telegram.requests] == ["hello", "hello"]
+
+
+def test_json_429_retry_after_is_used(telegram):
+    body = json.dumps({"ok": False, "parameters": {"retry_after": 0}})
+    telegram.responses.append((429, {}, body))
+    StatusBot.send_status_message("chat-3", "hello")
+
+    assert StatusBot.flush_status_messages(5)
+    assert len(telegram.requests) == 2
+
+
+def test_markdown_rejection_is_resent_as_plain_text(telegram):
+    telegram.responses.append((400, {}, json.dumps({"ok": False, "description": "can't parse entities"})))
+    StatusBot.send_status_message("chat-4", "unbalanced *markdown")
+
+    assert StatusBot.flush_status_messages(5)
+    assert telegram.requests[0]["parse_mode"] == "Markdown"
+    assert "parse_mode" not in telegram.requests[1]
@@ -0,0 +1,103 @@
+import mongomock
+import pandas as pd
+import pytest
+
+from Functions.TimeSeriesStore import (
+    bucket_start, ensure_indexes, latest_timestamp, read_points, replace_points, to_store_timestamp, write_points,
+)
+
+
+@pytest.fixture
+def collection():
+    collection = mongomock.MongoClient()["MarketData"]["Yearly_MarketChartData"]
+    ensure_indexes(collection)
+    return collection
+
+
+# One point per day at 05:30 IST (00:00 UTC), as the daily 365 day series stores them
+def daily_points(start, days, price=100.0):
+    return [
+        {"timestamp": day.strftime("%Y-%m-%d 05:30:00"), "price": price + i, "market_cap": 1000 + i}
+        for i, day in enumerate(pd.date_range(start, periods=days, freq="D"))
+    ]
+
+
+def test_bucket_start():
+    assert bucket_start("2025-03-17 14:25:00", "month") == "2025-03-01 00:00:00"
+    assert bucket_start("2025-03-17 14:25:00", "day") == "2025-03-17 00:00:00"
+    assert bucket_start("2025-03-17 14:25:00", "hour") == "2025-03-17 14:00:00"
+    with pytest.raises(ValueError):
+        bucket_start("2025-03-17 14:25:00", "week")
+
+
+def test_to_store_timestamp():
+    assert to_store_timestamp(None) is None
+    assert to_store_timestamp("") is None
+    # Epoch seconds (number or digits) and aware times are converted to IST
+    assert to_store_timestamp(1741046400) == "2025-03-04 05:30:00"
+    assert to_store_timestamp("1741046400") == "2025-03-04 05:30:00"
+    assert to_store_timestamp("2025-03-04T00:00:00Z") == "2025-03-04 05:30:00"
+    # Naive times are already IST; a bare date as an upper bound covers the whole day
+    assert to_store_timestamp("2025-03-04 10:00") == "2025-03-04 10:00:00"
+    assert to_store_timestamp("2025-03-04") == "2025-03-04 00:00:00"
+    assert to_store_timestamp("2025-03-04", end_of_day=True) == "2025-03-04 23:59:59"
+
+
+def test_write_points_merges_into_buckets(collection):
+    # Two months of points in batches of one upsert per round-trip
+    assert write_points(collection, "bitcoin", daily_points("2025-02-27", 4), "month", batch_size=1) == 4
+    assert collection.count_documents({"coin_id": "bitcoin"}) == 2
+
+    # A second write updates an existing point and adds a field, a NaN is stored as None
+    write_points(collection, "bitcoin", [
+        {"timestamp": "2025-03-01 05:30:00", "price": 7.0, "total_volume": float("nan")},
+        {"timestamp": "2025-03-03 05:30:00", "price": 9.0, "coin_id": "ignored"},
+    ], "month")
+
+    march = collection.find_one({"coin_id": "bitcoin", "timestamp": "2025-03-01 00:00:00"})
+    assert march["count"] == 3
+    assert march["end"] == "2025-03-03 05:30:00"
+    assert march["columns"]["timestamp"] == ["2025-03-01 05:30:00", "2025-03-02 05:30:00", "2025-03-03 05:30:00"]
+    assert march["columns"]["price"] == [7.0, 103.0, 9.0]
+    assert march["columns"]["market_cap"] == [1002, 1003, None]
+    assert march["columns"]["total_volume"] == [None, None, None]
+    assert latest_timestamp(collection, "bitcoin") == "2025-03-03 05:30:00"
+    assert latest_timestamp(collection, "ethereum") is None
+
+
+def test_replace_points_drops_stale_points_and_buckets(collection):
+    write_points(collection, "bitcoin", daily_points("2025-01-30", 2) + daily_points("2025-02-27", 3), "month")
+    write_points(collection, "ethereum", daily_points("2025-01-30", 2), "month")
+
+    replaced = replace_points(collection, "bitcoin", daily_points("2025-03-01", 2, price=5.0), "month")
+
+    assert replaced == 2
+    rows = list(read_points(collection, coin_ids=["bitcoin"]))
+    assert [row["timestamp"] for row in rows] == ["2025-03-01 05:30:00", "2025-03-02 05:30:00"]
+    assert [row["price"] for row in rows] == [5.0, 6.0]
+    # Other coins are untouched
+    assert len(list(read_points(collection, coin_ids=["ethereum"]))) == 2
+
+
+def test_read_points_filters(collection):
+    write_points(collection, "bitcoin", daily_points("2025-02-26", 6), "month")
+    write_points(collection, "ethereum", daily_points("2025-02-26", 6, price=10.0), "month")
+    write_points(collection, "solana", daily_points("2025-02-26", 6), "month")
+
+    rows = list(read_points(collection, coin_ids=["ethereum", "bitcoin"]))
+    assert [row["coin_id"] for row in rows] == ["bitcoin"] * 6 + ["ethereum"] * 6
+
+    # The range cuts through both month buckets; points outside it are dropped
+    start, end = to_store_timestamp("2025-02-27"), to_store_timestamp("2025-03-01", end_of_day=True)
+    rows = list(read_points(collection, coin_ids=["bitcoin"], start=start, end=end, window="month"))
+    assert [row["timestamp"] for row in rows] == ["2025-02-27 05:30:00", "2025-02-28 05:30:00", "2025-03-01 05:30:00"]
+
+    # Without the window the same range is answered from the "end" bound alone
+    assert list(read_points(collection, coin_ids=["bitcoin"], start=start, end=end)) == rows
+
+    # Only the requested columns are returned
+    rows = list(read_points(collection, coin_ids=["ethereum"], start="2025-03-02 00:00:00", fields=["price"], window="month"))
+    assert rows == [
+        {"timestamp": "2025-03-02 05:30:00", "price": 14.0, "coin_id": "ethereum"},
+        {"timestamp": "2025-03-03 05:30:00", "price": 15.0, "coin_id": "ethereum"},
+    ]